@@ -1,5 +1,6 @@
 import os
-from flask import Flask, request, render_template
+from flask import Flask, request, render_template, g
+from markupsafe import Markup
 from .extensions import db, migrate, login_manager, csrf, cache, socketio
 from .tasks import init_celery
 from .config import get_config
@@ -11,6 +12,7 @@ from .blueprints.admin.routes import admin_bp
 from .blueprints.payments.routes import payments_bp
 from .blueprints.wishlist.routes import wishlist_bp
 from .api import api_bp
+from .utils import catalog_changes  # noqa: F401  registers the catalog change-log listeners
 from .blueprints.account.routes import account_bp
 
 
@@ -18,18 +20,10 @@ def create_app():
     app = Flask(__name__, template_folder="../templates", static_folder="../static")
     app.config.from_object(get_config())
     # Load admin instance settings to override config (if present)
+    from .utils import config_files
     try:
-        import json
         os.makedirs(app.instance_path, exist_ok=True)
-        sfile = os.path.join(app.instance_path, 'admin_settings.json')
-        if os.path.exists(sfile):
-            with open(sfile, 'r', encoding='utf-8') as f:
-                data = json.load(f) or {}
-                if isinstance(data, dict):
-                    # Flatten known keys onto app.config
-                    for k, v in data.items():
-                        key = str(k).upper()
-                        app.config[key] = v
+        config_files.sync_admin_settings(app)
     except Exception:
         pass
     # Ensure default WhatsApp number if not configured and compute wa.me-friendly digits
@@ -50,6 +44,15 @@ def create_app():
         app.config['WHATSAPP_NUMBER_WA'] = _wa_digits(app.config.get('WHATSAPP_NUMBER'))
     except Exception:
         pass
+
+    @app.before_request
+    def reload_admin_settings():
+        # Pick up admin_settings.json saved by another worker (stat is rate limited)
+        try:
+            if config_files.sync_admin_settings(app):
+                app.config['WHATSAPP_NUMBER_WA'] = _wa_digits(app.config.get('WHATSAPP_NUMBER'))
+        except Exception:
+            pass
     
     # Add dict filter to Jinja2 environment
     @app.template_filter('dict')
@@ -62,7 +65,21 @@ def create_app():
             return dict(value)
         return kwargs
 
+    # Current URL with the listing cursor swapped; other filters/sort args are kept
+    @app.template_global('page_url')
+    def page_url(cursor=None):
+        from flask import request, url_for
+        args = request.args.to_dict()
+        args.pop('page', None)
+        args.pop('cursor', None)
+        if cursor:
+            args['cursor'] = cursor
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    from .utils import db_engine
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', db_engine.engine_options(app.config))
     db.init_app(app)
+    db_engine.install(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
@@ -77,10 +94,13 @@ def create_app():
         enabled = app.config.get('SOCKETIO_ENABLED', True)
         if enabled:
             mode = app.config.get('SOCKETIO_ASYNC_MODE')
+            options = {}
+            if app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+                options['message_queue'] = app.config['SOCKETIO_MESSAGE_QUEUE']
             if mode:
-                socketio.init_app(app, async_mode=mode)
+                socketio.init_app(app, async_mode=mode, **options)
             else:
-                socketio.init_app(app)
+                socketio.init_app(app, **options)
         # if disabled, skip init
     except Exception:
         pass
@@ -119,11 +139,11 @@ def create_app():
     @app.context_processor
     def nav_context():
         from flask_login import current_user
-        from .models import CartItem
+        from .utils.cart_count import get_cart_count
         cart_count = 0
-        if getattr(current_user, 'is_authenticated', False):
+        if getattr(current_user, 'is_authenticated', False) and not g.get('shared_page'):
             try:
-                cart_count = db.session.query(db.func.coalesce(db.func.sum(CartItem.quantity), 0)).filter_by(user_id=current_user.id).scalar() or 0
+                cart_count = get_cart_count(current_user.id)
             except Exception:
                 cart_count = 0
         # Pull dynamic site settings with sensible fallbacks
@@ -173,15 +193,7 @@ def create_app():
             'Save more this season with our daily offers and discounts!'
         ]
         try:
-            import json
-            inst = app.instance_path if hasattr(app, 'instance_path') else os.path.join(os.getcwd(), 'instance')
-            os.makedirs(inst, exist_ok=True)
-            p = os.path.join(inst, 'announcements.json')
-            if os.path.exists(p):
-                with open(p, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, list) and data:
-                        promo_messages = [str(x) for x in data if str(x).strip()]
+            promo_messages = config_files.read_announcements(promo_messages)
         except Exception:
             pass
         return {"csrf_token": generate_csrf, "cl_transform": cl_transform, "datetime": datetime, "timedelta": timedelta, "promo_messages": promo_messages}
@@ -196,6 +208,22 @@ def create_app():
         )
         return {"stripe_enabled": stripe_enabled, "mpesa_enabled": mpesa_enabled}
 
+    @app.context_processor
+    def shared_page_context():
+        # Pages cached for all users render as an anonymous visitor; per-user
+        # markup is emitted hidden and revealed by app.js from /api/session
+        if not g.get('shared_page'):
+            return {"shared_page": False, "auth_only_attr": "", "guest_only_attr": "", "admin_only_attr": ""}
+        return {
+            "shared_page": True,
+            "current_user": login_manager.anonymous_user(),
+            "cart_count": 0,
+            "get_flashed_messages": lambda *a, **k: [],
+            "auth_only_attr": Markup('data-auth-only hidden'),
+            "guest_only_attr": Markup('data-guest-only'),
+            "admin_only_attr": Markup('data-admin-only hidden'),
+        }
+
     @app.errorhandler(404)
     def not_found(e):
         # Use render_template so all context processors (including socials, config, etc.) are applied
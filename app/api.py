@@ -1,4 +1,7 @@
-from flask import Blueprint, jsonify, request, abort
+import hashlib
+from datetime import datetime, timezone
+
+from flask import Blueprint, jsonify, request, abort, url_for
 from .models import Product, Category, Order, User
 from .extensions import db
 
@@ -44,18 +47,151 @@ def health():
     return jsonify(data), 200
 
 
+@api_bp.route('/session', methods=['GET'])
+def session_state():
+    """Per-user fragments for pages served from the shared page cache."""
+    from flask import render_template, get_flashed_messages
+    from flask_login import current_user
+    from flask_wtf.csrf import generate_csrf
+    from .models import WishlistItem
+    from .utils.cart_count import get_cart_count
+    data = {
+        'authenticated': bool(getattr(current_user, 'is_authenticated', False)),
+        'is_admin': bool(getattr(current_user, 'is_admin', False)),
+        'cart_count': 0,
+        'wishlist': [],
+    }
+    if data['authenticated']:
+        try:
+            data['cart_count'] = get_cart_count(current_user.id)
+        except Exception:
+            data['cart_count'] = 0
+        try:
+            data['wishlist'] = [pid for (pid,) in db.session.query(WishlistItem.product_id).filter_by(user_id=current_user.id).all()]
+        except Exception:
+            data['wishlist'] = []
+    data['nav_html'] = render_template('partials/nav_user.html')
+    data['csrf_token'] = generate_csrf()
+    data['flashes'] = [{'category': c, 'message': m} for c, m in get_flashed_messages(with_categories=True)]
+    resp = jsonify(data)
+    resp.headers['Cache-Control'] = 'private, no-store'
+    return resp
+
+
+# Columns /api/products can return; ``fields=`` picks from these
+PRODUCT_FIELDS = {
+    'id': Product.id,
+    'name': Product.name,
+    'slug': Product.slug,
+    'description': Product.description,
+    'price': Product.price,
+    'old_price': Product.old_price,
+    'stock': Product.stock,
+    'image_url': Product.image_url,
+    'category': Category.name.label('category'),
+    'category_id': Product.category_id,
+    'is_active': Product.is_active,
+    'rating_avg': Product.rating_avg,
+    'rating_count': Product.rating_count,
+    'created_at': Product.created_at,
+    'updated_at': Product.updated_at,
+}
+DEFAULT_PRODUCT_FIELDS = ('id', 'name', 'price', 'stock', 'image_url', 'category', 'slug')
+MAX_PRODUCTS_LIMIT = 500
+
+
+def _error(message, status=400):
+    resp = jsonify({'error': message})
+    resp.status_code = status
+    return resp
+
+
+def _json_value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
 @api_bp.route('/products', methods=['GET'])
 def get_products():
-    products = Product.query.all()
-    return jsonify([{
-        'id': p.id,
-        'name': p.name,
-        'price': p.price,
-        'stock': p.stock,
-        'image_url': p.image_url,
-        'category': p.category.name if p.category else None,
-        'slug': p.slug
-    } for p in products])
+    """
+    Catalog page as a JSON list, ``limit`` rows at a time (default 100).
+
+    Query args: ``fields`` (comma list of PRODUCT_FIELDS), ``category`` (id or
+    slug), ``updated_since`` (ISO timestamp, inclusive; pages then run in
+    ``updated_at`` order so a sync can resume) and ``cursor``. The next page is
+    in the ``Link: <...>; rel="next"`` and ``X-Next-Cursor`` headers. Responses
+    carry ``ETag``/``Last-Modified`` and answer conditional requests with 304.
+    """
+    from .utils.keyset import Key, paginate
+    fields = [f.strip() for f in (request.args.get('fields') or '').split(',') if f.strip()] or list(DEFAULT_PRODUCT_FIELDS)
+    unknown = [f for f in fields if f not in PRODUCT_FIELDS]
+    if unknown:
+        return _error(f"Unknown field(s): {', '.join(unknown)}")
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_PRODUCTS_LIMIT)
+
+    since = None
+    if request.args.get('updated_since'):
+        try:
+            since = datetime.fromisoformat(request.args['updated_since'].replace('Z', '+00:00'))
+        except ValueError:
+            return _error('updated_since must be an ISO 8601 timestamp')
+        if since.tzinfo:
+            # Stored timestamps are naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    if since:
+        keys = [Key(Product.updated_at), Key(Product.id)]
+    else:
+        keys = [Key(Product.id)]
+    # Key and validator columns are always selected; only the requested fields are returned
+    selected = list(dict.fromkeys(fields + [k.column.key for k in keys] + ['updated_at']))
+    query = db.session.query(*[PRODUCT_FIELDS[f] for f in selected]).select_from(Product)
+    if 'category' in selected:
+        query = query.outerjoin(Category, Category.id == Product.category_id)
+
+    category = request.args.get('category')
+    if category:
+        if category.isdigit():
+            query = query.filter(Product.category_id == int(category))
+        else:
+            cat_id = db.session.query(Category.id).filter(Category.slug == category).scalar()
+            if cat_id is None:
+                return _error('Unknown category', 404)
+            query = query.filter(Product.category_id == cat_id)
+    if since:
+        query = query.filter(Product.updated_at >= since)
+
+    page = paginate(query, keys, cursor=request.args.get('cursor'), per_page=limit, count=False)
+    resp = jsonify([{f: _json_value(getattr(row, f)) for f in fields} for row in page.items])
+    if page.has_next:
+        args = request.args.to_dict()
+        args['cursor'] = page.next_cursor
+        resp.headers['Link'] = f'<{url_for("api.get_products", _external=True, **args)}>; rel="next"'
+        resp.headers['X-Next-Cursor'] = page.next_cursor
+    stamps = [row.updated_at for row in page.items if row.updated_at]
+    if stamps:
+        resp.last_modified = max(stamps).replace(tzinfo=timezone.utc)
+    # The ETag covers the body and the next link, so any change to the page is a new tag
+    resp.set_etag(hashlib.sha1(resp.get_data() + resp.headers.get('Link', '').encode()).hexdigest())
+    resp.headers['Cache-Control'] = 'public, no-cache'
+    return resp.make_conditional(request)
+
+
+@api_bp.route('/catalog/changes', methods=['GET'])
+def catalog_changes():
+    """
+    Catalog deltas since ``since`` (the ``next`` token of the previous call; omit
+    it for a full snapshot). Keep calling with ``next`` while ``has_more``; on
+    ``reset`` drop the local catalog before applying the changes.
+    """
+    from .utils import catalog_changes as changes
+    try:
+        feed = changes.changes_since(request.args.get('since'), limit=request.args.get('limit', type=int))
+    except ValueError:
+        return _error('since must be a token returned by this feed')
+    resp = jsonify(feed)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
 
 @api_bp.route('/categories', methods=['GET'])
 def get_categories():
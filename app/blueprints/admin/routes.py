@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, abort, current_app
+from flask import stream_template, stream_with_context
 import json
 import os
 import pathlib
@@ -6,14 +7,23 @@ import requests
 from urllib.parse import urlparse
 from flask_login import login_required, current_user
 from ...extensions import db, cache
+from ...utils import cache_tags
+from ...utils.cache_tags import invalidate, product_tag, category_tag
 from werkzeug.security import generate_password_hash, check_password_hash
 from ...utils.media import upload_image
 from ...models import Product, Category, Order, HomePageBanner, Payment, User, Review, DeliveryZone, CategoryHeroImage, FlashSale, Coupon, AdminEvent
 from ...models import ReviewPhoto
 from ...models import Post
-from ...utils.search import index_product
+from ...utils.search import index_product, remove_product, reindex_all
+from ...utils import config_files
+from ...utils import reports
+from ...utils import sales_rollup
+from ...utils import sales_stats
+from ...utils.ratings import refresh_product_rating
+from ...utils import reservations
+from ...utils.keyset import newest_first, paginate
+from ...utils import notifications
 from ...models import Notification
-from ...utils.email import send_email
 from ...extensions import csrf
 from ...extensions import socketio
 from werkzeug.security import generate_password_hash
@@ -40,21 +50,13 @@ def dashboard():
     import calendar
     import json
     product_count = Product.query.count()
-    order_count = Order.query.count()
+    order_count, total_sales = sales_rollup.totals()
     user_count = db.session.query(db.func.count()).select_from(User).scalar()
-    total_sales = db.session.query(db.func.sum(Order.total_amount)).scalar() or 0
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
     recent_payments = Payment.query.order_by(Payment.created_at.desc()).limit(5).all()
     latest_reviews = Review.query.order_by(Review.created_at.desc()).limit(5).all()
     # Revenue by zone (top 5)
-    revenue_by_zone = (
-        db.session.query(DeliveryZone.name, db.func.sum(Order.total_amount))
-        .join(DeliveryZone, DeliveryZone.id == Order.delivery_zone_id)
-        .group_by(DeliveryZone.name)
-        .order_by(db.func.sum(Order.total_amount).desc())
-        .limit(5)
-        .all()
-    )
+    revenue_by_zone = sales_rollup.revenue_by_zone(5)
     # Build last 12 months analytics series for charts
     def month_range(d: date):
         start = d.replace(day=1)
@@ -71,24 +73,17 @@ def dashboard():
             y -= 1
         months.append(date(y, m, 1))
     labels = [d.strftime('%b %Y') for d in months]
-    sales_series = []
-    orders_series = []
-    users_series = []
-    products_series = []
-    for d in months:
-        start, end = month_range(d)
-        sales = db.session.query(db.func.coalesce(db.func.sum(Order.total_amount), 0)) \
-            .filter(Order.created_at >= start, Order.created_at < end).scalar() or 0
-        sales_series.append(float(sales))
-        oc = db.session.query(db.func.count(Order.id)) \
-            .filter(Order.created_at >= start, Order.created_at < end).scalar() or 0
-        orders_series.append(int(oc))
-        uc = db.session.query(db.func.count(User.id)) \
-            .filter(User.created_at >= start, User.created_at < end).scalar() or 0
-        users_series.append(int(uc))
-        pc = db.session.query(db.func.count(Product.id)) \
-            .filter(Product.created_at >= start, Product.created_at < end).scalar() or 0
-        products_series.append(int(pc))
+    # Sales/orders from the daily rollup; signups and new products in one GROUP BY each
+    monthly = sales_rollup.monthly_sales(months)
+    range_start = datetime.combine(month_range(months[0])[0], datetime.min.time())
+    range_end = datetime.combine(month_range(months[-1])[1], datetime.min.time())
+    from ...utils.analytics import grouped_counts
+    new_users = grouped_counts(User, 'm', range_start, range_end)
+    new_products = grouped_counts(Product, 'm', range_start, range_end)
+    sales_series = [round(monthly[d][0], 2) for d in months]
+    orders_series = [monthly[d][1] for d in months]
+    users_series = [new_users.get(d.strftime('%Y-%m-%d'), 0) for d in months]
+    products_series = [new_products.get(d.strftime('%Y-%m-%d'), 0) for d in months]
     # Active homepage banners preview
     active_banners = HomePageBanner.query.filter_by(is_active=True).order_by(HomePageBanner.sort_order.asc(), HomePageBanner.created_at.desc()).all()
     # Announcement messages (best-effort load from instance file)
@@ -100,14 +95,7 @@ def dashboard():
         'Save more this season with our daily offers and discounts!'
     ]
     try:
-        inst = current_app.instance_path if hasattr(current_app, 'instance_path') else os.path.join(os.getcwd(), 'instance')
-        os.makedirs(inst, exist_ok=True)
-        p = os.path.join(inst, 'announcements.json')
-        if os.path.exists(p):
-            with open(p, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list) and data:
-                    promo_messages = [str(x) for x in data if str(x).strip()]
+        promo_messages = config_files.read_announcements(promo_messages)
     except Exception:
         pass
     return render_template(
@@ -327,41 +315,15 @@ def analytics_series():
                 cur = date(cur.year+1, 1, 1)
             else:
                 cur = date(cur.year, cur.month+1, 1)
-    # Fetch data in one go and bucket in Python
-    orders_q = Order.query.filter(Order.created_at >= buckets[0][0], Order.created_at < buckets[-1][1]).all() if buckets else []
-    users_q = User.query.filter(User.created_at >= buckets[0][0], User.created_at < buckets[-1][1]).all() if buckets else []
-    products_q = Product.query.filter(Product.created_at >= buckets[0][0], Product.created_at < buckets[-1][1]).all() if buckets else []
-    sales = [0.0 for _ in buckets]
-    orders = [0 for _ in buckets]
-    users = [0 for _ in buckets]
-    products = [0 for _ in buckets]
-    def find_bucket(dt):
-        for i,(s,e) in enumerate(buckets):
-            if s <= dt < e:
-                return i
-        return None
-    for o in orders_q:
-        if not o.created_at: continue
-        i = find_bucket(o.created_at)
-        if i is None: continue
-        try:
-            sales[i] += float(o.total_amount or 0)
-        except Exception:
-            pass
-        try:
-            orders[i] += 1
-        except Exception:
-            pass
-    for u in users_q:
-        if not u.created_at: continue
-        i = find_bucket(u.created_at)
-        if i is None: continue
-        users[i] += 1
-    for p in products_q:
-        if not p.created_at: continue
-        i = find_bucket(p.created_at)
-        if i is None: continue
-        products[i] += 1
+    # Per-bucket counts/sums via GROUP BY; closed buckets come from the cache
+    from ...utils.analytics import bucket_totals
+    totals = bucket_totals(buckets, mode if mode in ('d', 'w') else 'm', now=now)
+    empty = {'sales': 0.0, 'orders': 0, 'users': 0, 'products': 0}
+    rows = [totals.get(s.strftime('%Y-%m-%d'), empty) for s, _e in buckets]
+    sales = [r['sales'] for r in rows]
+    orders = [r['orders'] for r in rows]
+    users = [r['users'] for r in rows]
+    products = [r['products'] for r in rows]
     # Derived metrics
     aov = [ (sales[i]/orders[i]) if orders[i] else 0 for i in range(len(buckets)) ]
     # conversion approximated as orders/new users; avoid div by zero
@@ -508,14 +470,9 @@ def posts():
 @login_required
 @admin_required
 def settings():
-    inst = current_app.instance_path if hasattr(current_app, 'instance_path') else os.path.join(os.getcwd(), 'instance')
-    os.makedirs(inst, exist_ok=True)
-    path = os.path.join(inst, 'admin_settings.json')
-    data = {}
+    path = config_files.instance_file(config_files.ADMIN_SETTINGS_FILE)
     try:
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f) or {}
+        data = config_files.read_admin_settings()
     except Exception:
         data = {}
     if request.method == 'POST':
@@ -553,8 +510,9 @@ def settings():
             # M-Pesa
             for key in ['mpesa_consumer_key','mpesa_consumer_secret','mpesa_short_code','mpesa_passkey','mpesa_callback_url','mpesa_base_url','mpesa_till_number','mpesa_transaction_type']:
                 data[key] = request.form.get(key) or ''
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            config_files.write_json(path, data)
+            try: invalidate(cache_tags.SETTINGS)
+            except Exception: pass
             try:
                 current_app.config.update({
                     'SITE_NAME': data.get('site_name') or current_app.config.get('SITE_NAME'),
@@ -683,15 +641,7 @@ def delete_post(post_id):
         'Save more this season with our daily offers and discounts!'
     ]
     try:
-        import os, json
-        inst = current_app.instance_path if hasattr(current_app, 'instance_path') else os.path.join(os.getcwd(), 'instance')
-        os.makedirs(inst, exist_ok=True)
-        p = os.path.join(inst, 'announcements.json')
-        if os.path.exists(p):
-            with open(p, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list) and data:
-                    promo_messages = [str(x) for x in data if str(x).strip()]
+        promo_messages = config_files.read_announcements(promo_messages)
     except Exception:
         pass
 
@@ -728,27 +678,17 @@ def announcements():
         'Save more this season with our daily offers and discounts!'
     ]
     try:
-        import os, json
-        inst = current_app.instance_path if hasattr(current_app, 'instance_path') else os.path.join(os.getcwd(), 'instance')
-        os.makedirs(inst, exist_ok=True)
-        path = os.path.join(inst, 'announcements.json')
+        path = config_files.instance_file(config_files.ANNOUNCEMENTS_FILE)
         if request.method == 'POST':
             raw = (request.form.get('messages') or '').splitlines()
             msgs = [s.strip() for s in raw if s and s.strip()]
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(msgs, f, ensure_ascii=False, indent=2)
-            try: cache.clear()
+            config_files.write_json(path, msgs)
+            try: invalidate(cache_tags.SETTINGS)
             except Exception: pass
             flash('Announcements saved', 'success')
             return redirect(url_for('admin.announcements'))
         else:
-            if os.path.exists(path):
-                with open(path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        msgs = [str(x) for x in data]
-            if not msgs:
-                msgs = default_msgs
+            msgs = config_files.read_announcements(default_msgs)
     except Exception:
         msgs = default_msgs
     return render_template('admin/announcements.html', messages=msgs)
@@ -756,16 +696,15 @@ def announcements():
 @login_required
 @admin_required
 def analytics():
-    sales_by_day = db.session.query(db.func.date(Order.created_at), db.func.sum(Order.total_amount)).group_by(db.func.date(Order.created_at)).all()
+    sales_by_day = [(day, total) for day, total, _count in sales_rollup.daily_sales()]
     user_growth = db.session.query(db.func.date(User.created_at), db.func.count(User.id)).group_by(db.func.date(User.created_at)).all()
     return render_template("admin/analytics.html", sales_by_day=sales_by_day, user_growth=user_growth)
 @admin_bp.route("/reports/advanced")
 @login_required
 @admin_required
 def advanced_reports():
-    from ...models import OrderItem
-    sales_by_category = db.session.query(Category.name, db.func.sum(OrderItem.unit_price * OrderItem.quantity)).join(Product, Product.category_id == Category.id).join(OrderItem, OrderItem.product_id == Product.id).group_by(Category.name).all()
-    top_products = db.session.query(Product.name, db.func.sum(OrderItem.quantity)).join(OrderItem, OrderItem.product_id == Product.id).group_by(Product.name).order_by(db.func.sum(OrderItem.quantity).desc()).limit(10).all()
+    sales_by_category = sales_rollup.sales_by_category()
+    top_products = sales_rollup.top_products(10)
     return render_template("admin/advanced_reports.html", sales_by_category=sales_by_category, top_products=top_products)
 
 
@@ -825,20 +764,18 @@ def products():
             index_product(p)
         except Exception:
             pass
-        try: cache.clear()
+        try: invalidate(cache_tags.CATALOG, category_tag(p.category_id) if p.category_id else None)
         except Exception: pass
         flash("Product added", "success")
     categories = Category.query.all()
     q = (request.args.get('q') or '').strip()
-    page = max(1, request.args.get('page', type=int, default=1))
     per_page = request.args.get('per_page', type=int, default=50)
     query = Product.query
     if q:
         like = f"%{q}%"
         query = query.filter(db.or_(Product.name.ilike(like), Product.slug.ilike(like)))
-    total = query.count()
-    products = query.order_by(Product.created_at.desc()).offset((page-1)*per_page).limit(per_page).all()
-    return render_template("admin/products.html", products=products, categories=categories, total=total, page=page, per_page=per_page, q=q)
+    pagination = paginate(query, newest_first(Product), cursor=request.args.get('cursor'), per_page=per_page)
+    return render_template("admin/products.html", products=pagination.items, categories=categories, pagination=pagination, per_page=per_page, q=q)
 
 
 @admin_bp.route('/products/top-picks', methods=['GET'])
@@ -866,7 +803,6 @@ def top_picks_page():
 @admin_required
 def orders():
     q = (request.args.get('q') or '').strip()
-    page = max(1, request.args.get('page', type=int, default=1))
     per_page = request.args.get('per_page', type=int, default=50)
     query = Order.query
     if q:
@@ -877,14 +813,14 @@ def orders():
             User.email.ilike(like),
             Order.status.ilike(like)
         ))
-    total = query.count()
-    orders = query.order_by(Order.created_at.desc()).offset((page-1)*per_page).limit(per_page).all()
+    pagination = paginate(query, newest_first(Order), cursor=request.args.get('cursor'), per_page=per_page)
+    orders = pagination.items
     try:
         from ...models import Rider
         riders = Rider.query.filter_by(is_active=True).order_by(Rider.name.asc()).all()
     except Exception:
         riders = []
-    return render_template("admin/orders.html", orders=orders, riders=riders, total=total, page=page, per_page=per_page, q=q)
+    return render_template("admin/orders.html", orders=orders, riders=riders, pagination=pagination, per_page=per_page, q=q)
 
 
 @admin_bp.route("/orders/<int:order_id>/status", methods=["POST"])
@@ -904,78 +840,20 @@ def update_order_status(order_id):
     old_status = order.status
     order.status = new_status
     db.session.add(OrderStatusLog(order_id=order.id, status=new_status, notes=f"Admin updated from {old_status} to {new_status}"))
+    counted_change = (old_status in sales_rollup.EXCLUDED_STATUSES) != (new_status in sales_rollup.EXCLUDED_STATUSES)
+    if counted_change:
+        sign = -1 if new_status in sales_rollup.EXCLUDED_STATUSES else 1
+        sales_stats.record_order(order, sign)
+        sales_rollup.record_order(order, sign)
+    if new_status == 'cancelled':
+        reservations.release_order(order.id)
+    # Customer email/WhatsApp/SMS go through the outbox so this request never waits on a provider
+    notifications.enqueue_order_status(order, old_status, new_status)
+    if order.user_id:
+        db.session.add(Notification(user_id=order.user_id, title=f"Order #{order.id} status updated", message=f"Your order status is now {order.status.replace('_',' ')}", type='order_update'))
     db.session.commit()
-
     try:
-        if order.user and order.user.email:
-            send_email(
-                to=order.user.email,
-                subject=f"Your order #{order.id} is now {new_status.replace('_',' ').title()}",
-                body=f"Hello,\n\nYour order #{order.id} status has changed from {old_status} to {new_status}.\n\nThank you for shopping with us."
-            )
-    except Exception:
-        pass
-
-    try:
-        dest_phone = getattr(order.user, 'phone', None)
-        if dest_phone:
-            from flask import current_app
-            msg = f"Order #{order.id} status: {new_status.replace('_',' ').title()}"
-            try:
-                sid = current_app.config.get('TWILIO_ACCOUNT_SID')
-                tok = current_app.config.get('TWILIO_AUTH_TOKEN')
-                wa_from = current_app.config.get('TWILIO_WHATSAPP_FROM')  # e.g. 'whatsapp:+14155238886'
-                if sid and tok and wa_from and dest_phone:
-                    try:
-                        from twilio.rest import Client  # type: ignore
-                        client = Client(sid, tok)
-                        to_wa = dest_phone
-                        if to_wa.startswith('+'):
-                            to_wa = to_wa
-                        elif to_wa.startswith('0'):
-                            to_wa = '+254' + to_wa[1:]
-                        elif to_wa.startswith('254'):
-                            to_wa = '+' + to_wa
-                        client.messages.create(from_=wa_from, to='whatsapp:' + to_wa, body=msg)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-            try:
-                at_user = current_app.config.get('AFRICASTALKING_USERNAME')
-                at_key = current_app.config.get('AFRICASTALKING_API_KEY')
-                sender = current_app.config.get('SMS_SENDER_ID') or current_app.config.get('TWILIO_SMS_FROM')
-                if at_user and at_key and sender:
-                    try:
-                        import africastalking  # type: ignore
-                        africastalking.initialize(at_user, at_key)
-                        sms = africastalking.SMS
-                        to_sms = dest_phone
-                        if to_sms.startswith('+'):
-                            to_sms = to_sms
-                        elif to_sms.startswith('0'):
-                            to_sms = '+254' + to_sms[1:]
-                        elif to_sms.startswith('254'):
-                            to_sms = '+' + to_sms
-                        sms.send(msg, [to_sms], sender)
-                    except Exception:
-                        pass
-                elif current_app.config.get('TWILIO_ACCOUNT_SID') and current_app.config.get('TWILIO_AUTH_TOKEN') and current_app.config.get('TWILIO_SMS_FROM'):
-                    try:
-                        from twilio.rest import Client  # type: ignore
-                        client = Client(current_app.config['TWILIO_ACCOUNT_SID'], current_app.config['TWILIO_AUTH_TOKEN'])
-                        to_sms = dest_phone
-                        if to_sms.startswith('+'):
-                            to_sms = to_sms
-                        elif to_sms.startswith('0'):
-                            to_sms = '+254' + to_sms[1:]
-                        elif to_sms.startswith('254'):
-                            to_sms = '+' + to_sms
-                        client.messages.create(from_=current_app.config['TWILIO_SMS_FROM'], to=to_sms, body=msg)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
+        notifications.kick()
     except Exception:
         pass
 
@@ -986,12 +864,6 @@ def update_order_status(order_id):
                 'order_id': order.id,
                 'status': order.status,
             }, namespace='/', room=f'user_{order.user_id}')
-            # Add notification entry
-            try:
-                db.session.add(Notification(user_id=order.user_id, title=f"Order #{order.id} status updated", message=f"Your order status is now {order.status.replace('_',' ')}", type='order_update'))
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
     except Exception:
         pass
 
@@ -1006,6 +878,10 @@ def edit_product(product_id):
     if not p:
         abort(404)
     if request.method == "POST":
+        before = (p.name, p.price, p.old_price, p.category_id, bool(p.is_top_pick), bool(p.is_new_arrival_featured))
+        # Columns that catalog listings and search results show, filter or sort by
+        listed = ('name', 'slug', 'price', 'old_price', 'stock', 'is_active', 'image_url', 'category_id')
+        listed_before = [getattr(p, col) for col in listed]
         p.name = request.form.get("name") or p.name
         p.slug = request.form.get("slug") or p.slug
         p.price = request.form.get("price") or p.price
@@ -1026,7 +902,16 @@ def edit_product(product_id):
         except Exception:
             pass
         db.session.commit()
-        try: cache.clear()
+        _product_edit_tags = {product_tag(p.id), category_tag(before[3]) if before[3] else None, category_tag(p.category_id) if p.category_id else None}
+        if listed_before != [getattr(p, col) for col in listed]:
+            _product_edit_tags.add(cache_tags.CATALOG)
+        if before[1] != p.price or before[2] != p.old_price:
+            _product_edit_tags.add(cache_tags.DEALS)
+        if before[4] != bool(p.is_top_pick):
+            _product_edit_tags.add(cache_tags.TOP_PICKS)
+        if before[5] != bool(p.is_new_arrival_featured):
+            _product_edit_tags.add(cache_tags.NEW_ARRIVALS)
+        try: invalidate(*_product_edit_tags)
         except Exception: pass
         flash("Product updated", "success")
         try:
@@ -1047,14 +932,7 @@ def delete_product(product_id):
         abort(404)
     # If admin read-only, require passphrase
     try:
-        inst = current_app.instance_path
-        import json
-        sfile = os.path.join(inst, 'admin_settings.json')
-        if os.path.exists(sfile):
-            with open(sfile, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-        else:
-            settings = {}
+        settings = config_files.read_admin_settings()
         if settings.get('read_only'):
             from werkzeug.security import check_password_hash
             passphrase = request.form.get('confirm_passphrase') or ''
@@ -1063,9 +941,11 @@ def delete_product(product_id):
                 return redirect(url_for('admin.products'))
     except Exception:
         pass
+    deleted_category_id = p.category_id
     db.session.delete(p)
     db.session.commit()
-    try: cache.clear()
+    remove_product(product_id)
+    try: invalidate(cache_tags.CATALOG, product_tag(product_id), category_tag(deleted_category_id) if deleted_category_id else None)
     except Exception: pass
     flash("Product deleted", "info")
     return redirect(url_for("admin.products"))
@@ -1078,14 +958,7 @@ def bulk_delete_products():
     ids = request.form.getlist('ids') or request.form.getlist('ids[]')
     # If admin read-only mode is enabled, require passphrase
     try:
-        inst = current_app.instance_path
-        import json
-        sfile = os.path.join(inst, 'admin_settings.json')
-        if os.path.exists(sfile):
-            with open(sfile, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-        else:
-            settings = {}
+        settings = config_files.read_admin_settings()
         if settings.get('read_only'):
             from werkzeug.security import check_password_hash
             passphrase = request.form.get('confirm_passphrase') or ''
@@ -1103,9 +976,11 @@ def bulk_delete_products():
         flash("No products selected", "warning")
         return redirect(url_for("admin.products"))
     try:
+        deleted_rows = db.session.query(Product.id, Product.category_id).filter(Product.id.in_(id_list)).all()
         db.session.query(Product).filter(Product.id.in_(id_list)).delete(synchronize_session=False)
         db.session.commit()
-        try: cache.clear()
+        reindex_all()
+        try: invalidate(cache_tags.CATALOG, cache_tags.DEALS, *[product_tag(pid) for pid, _ in deleted_rows], *[category_tag(cid) for _, cid in deleted_rows if cid])
         except Exception: pass
         flash(f"Deleted {len(id_list)} products", "success")
     except Exception:
@@ -1121,14 +996,7 @@ def delete_all_products():
     confirm = (request.form.get('confirm') or '').lower() in {"1","true","yes","y"}
     # If read-only mode is enabled, require passphrase
     try:
-        inst = current_app.instance_path
-        import json
-        sfile = os.path.join(inst, 'admin_settings.json')
-        if os.path.exists(sfile):
-            with open(sfile, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-        else:
-            settings = {}
+        settings = config_files.read_admin_settings()
         if settings.get('read_only'):
             from werkzeug.security import check_password_hash
             passphrase = request.form.get('confirm_passphrase') or ''
@@ -1141,9 +1009,11 @@ def delete_all_products():
         flash("Confirmation required to delete all products", "warning")
         return redirect(url_for("admin.products"))
     try:
+        deleted_rows = db.session.query(Product.id, Product.category_id).all()
         db.session.query(Product).delete(synchronize_session=False)
         db.session.commit()
-        try: cache.clear()
+        reindex_all()
+        try: invalidate(cache_tags.CATALOG, cache_tags.DEALS, cache_tags.TOP_PICKS, cache_tags.NEW_ARRIVALS, *[product_tag(pid) for pid, _ in deleted_rows], *[category_tag(cid) for _, cid in deleted_rows if cid])
         except Exception: pass
         flash("All products deleted", "info")
     except Exception:
@@ -1168,7 +1038,7 @@ def toggle_top_pick(product_id):
             p.is_top_pick = bool(val)
         db.session.add(p)
         db.session.commit()
-        try: cache.clear()
+        try: invalidate(cache_tags.TOP_PICKS, product_tag(p.id))
         except Exception: pass
         return Response(json.dumps({'ok': True, 'is_top_pick': p.is_top_pick}), status=200, mimetype='application/json')
     except Exception:
@@ -1191,7 +1061,7 @@ def toggle_new_arrival(product_id):
             p.is_new_arrival_featured = bool(val)
         db.session.add(p)
         db.session.commit()
-        try: cache.clear()
+        try: invalidate(cache_tags.NEW_ARRIVALS, product_tag(p.id))
         except Exception: pass
         return Response(json.dumps({'ok': True, 'is_new_arrival_featured': p.is_new_arrival_featured}), status=200, mimetype='application/json')
     except Exception:
@@ -1219,7 +1089,7 @@ def bulk_toggle_top_pick():
             results[str(p.id)] = p.is_top_pick
             db.session.add(p)
         db.session.commit()
-        try: cache.clear()
+        try: invalidate(cache_tags.TOP_PICKS, *[product_tag(p.id) for p in products])
         except Exception: pass
         return Response(json.dumps({'ok': True, 'results': results}), status=200, mimetype='application/json')
     except Exception as e:
@@ -1250,7 +1120,7 @@ def bulk_set_top_pick():
             p.is_top_pick = val_bool
             db.session.add(p)
         db.session.commit()
-        try: cache.clear()
+        try: invalidate(cache_tags.TOP_PICKS, *[product_tag(p.id) for p in products])
         except Exception: pass
         results = {str(p.id): p.is_top_pick for p in products}
         return Response(json.dumps({'ok': True, 'results': results}), status=200, mimetype='application/json')
@@ -1278,7 +1148,7 @@ def bulk_set_top_pick():
                 results[str(p.id)] = p.is_new_arrival_featured
                 db.session.add(p)
             db.session.commit()
-            try: cache.clear()
+            try: invalidate(cache_tags.NEW_ARRIVALS, *[product_tag(p.id) for p in products])
             except Exception: pass
             return Response(json.dumps({'ok': True, 'results': results}), status=200, mimetype='application/json')
         except Exception:
@@ -1308,7 +1178,7 @@ def bulk_set_top_pick():
                 p.is_new_arrival_featured = val_bool
                 db.session.add(p)
             db.session.commit()
-            try: cache.clear()
+            try: invalidate(cache_tags.NEW_ARRIVALS, *[product_tag(p.id) for p in products])
             except Exception: pass
             results = {str(p.id): p.is_new_arrival_featured for p in products}
             return Response(json.dumps({'ok': True, 'results': results}), status=200, mimetype='application/json')
@@ -1331,7 +1201,7 @@ def categories():
             if not Category.query.filter_by(slug=slug).first():
                 db.session.add(Category(name=name, slug=slug))
                 db.session.commit()
-                try: cache.clear()
+                try: invalidate(cache_tags.CATEGORIES)
                 except Exception: pass
                 flash("Category added", "success")
             else:
@@ -1354,7 +1224,7 @@ def edit_category(cat_id):
     if slug:
         c.slug = slug
     db.session.commit()
-    try: cache.clear()
+    try: invalidate(cache_tags.CATEGORIES, category_tag(c.id))
     except Exception: pass
     flash("Category updated", "success")
     return redirect(url_for("admin.categories"))
@@ -1369,7 +1239,7 @@ def delete_category(cat_id):
         abort(404)
     db.session.delete(c)
     db.session.commit()
-    try: cache.clear()
+    try: invalidate(cache_tags.CATEGORIES, category_tag(cat_id))
     except Exception: pass
     flash("Category deleted", "info")
     return redirect(url_for("admin.categories"))
@@ -1379,13 +1249,8 @@ def delete_category(cat_id):
 @login_required
 @admin_required
 def admin_settings():
-    inst = current_app.instance_path
-    sfile = os.path.join(inst, 'admin_settings.json')
-    settings = {}
-    if os.path.exists(sfile):
-        with open(sfile, 'r', encoding='utf-8') as f:
-            try: settings = json.load(f)
-            except Exception: settings = {}
+    sfile = config_files.instance_file(config_files.ADMIN_SETTINGS_FILE)
+    settings = config_files.read_admin_settings()
     if request.method == 'POST':
         # Admin controls
         read_only = (request.form.get('read_only') or '').lower() in {'1','true','yes','on'}
@@ -1442,11 +1307,9 @@ def admin_settings():
         # Lipa na Till (Buy Goods) support
         settings['mpesa_till_number'] = (request.form.get('mpesa_till_number') or '').strip()
         settings['mpesa_transaction_type'] = (request.form.get('mpesa_transaction_type') or '').strip()  # CustomerPayBillOnline or CustomerBuyGoodsOnline
-        os.makedirs(current_app.instance_path, exist_ok=True)
-        with open(sfile, 'w', encoding='utf-8') as f:
-            json.dump(settings, f)
+        config_files.write_json(sfile, settings)
         flash('Admin settings saved', 'success')
-        try: cache.clear()
+        try: invalidate(cache_tags.SETTINGS)
         except Exception: pass
         return redirect(url_for('admin.admin_settings'))
     return render_template('admin/settings.html', settings=settings)
@@ -1486,13 +1349,7 @@ def admin_assign_rider(order_id):
 @login_required
 @admin_required
 def admin_readonly_status():
-    inst = current_app.instance_path
-    sfile = os.path.join(inst, 'admin_settings.json')
-    settings = {}
-    if os.path.exists(sfile):
-        with open(sfile, 'r', encoding='utf-8') as f:
-            try: settings = json.load(f)
-            except Exception: settings = {}
+    settings = config_files.read_admin_settings()
     return Response(json.dumps({'read_only': bool(settings.get('read_only'))}), status=200, mimetype='application/json')
 @admin_bp.route("/banners", methods=["GET", "POST"])
 @login_required
@@ -1521,7 +1378,7 @@ def banners():
         new_sort = int(max_sort) + 1
         db.session.add(HomePageBanner(title=title, image_url=image_url, link_url=link_url, is_active=True, sort_order=new_sort))
         db.session.commit()
-        try: cache.clear()
+        try: invalidate(cache_tags.BANNERS)
         except Exception: pass
         flash("Banner added", "success")
     banners = HomePageBanner.query.order_by(HomePageBanner.created_at.desc()).all()
@@ -1567,7 +1424,7 @@ def banners_reorder():
             b.sort_order = int(idx)
             db.session.add(b)
         db.session.commit()
-        try: cache.clear()
+        try: invalidate(cache_tags.BANNERS)
         except Exception: pass
         return ("OK", 200)
     except Exception as e:
@@ -1584,7 +1441,7 @@ def toggle_banner(banner_id):
     b.is_active = not b.is_active
     db.session.commit()
     try:
-        cache.clear()
+        invalidate(cache_tags.BANNERS)
     except Exception:
         pass
     flash("Banner updated", "success")
@@ -1600,7 +1457,7 @@ def delete_banner(banner_id):
     db.session.delete(b)
     db.session.commit()
     try:
-        cache.clear()
+        invalidate(cache_tags.BANNERS)
     except Exception:
         pass
     flash("Banner deleted", "info")
@@ -1681,7 +1538,7 @@ def flash_sales():
             db.session.add(fs)
             db.session.commit()
             try:
-                cache.clear()
+                invalidate(cache_tags.FLASH_SALES, cache_tags.DEALS, product_tag(p.id))
             except Exception:
                 pass
             flash('Flash sale created', 'success')
@@ -1729,6 +1586,7 @@ def edit_flash_sale(fs_id):
                 flash(f'Another active flash sale exists from {overlap_fs.starts_at} to {overlap_fs.ends_at}. Please adjust the time window or deactivate the other sale.', 'warning')
                 return redirect(url_for('admin.edit_flash_sale', fs_id=fs_id))
             # Update flash sale
+            previous_product_id = fs.product_id
             fs.product_id = product_id
             fs.discount_percent = int(discount_percent or 0)
             fs.starts_at = starts_at
@@ -1763,7 +1621,7 @@ def edit_flash_sale(fs_id):
             db.session.add(fs)
             db.session.commit()
             try:
-                cache.clear()
+                invalidate(cache_tags.FLASH_SALES, cache_tags.DEALS, product_tag(p.id), product_tag(previous_product_id))
             except Exception:
                 pass
             flash('Flash sale updated', 'success')
@@ -1796,10 +1654,11 @@ def delete_flash_sale(fs_id):
             db.session.add(p)
     except Exception:
         pass
+    fs_product_id = fs.product_id
     db.session.delete(fs)
     db.session.commit()
     try:
-        cache.clear()
+        invalidate(cache_tags.FLASH_SALES, cache_tags.DEALS, product_tag(fs_product_id))
     except Exception:
         pass
     flash('Flash sale deleted and product price restored', 'info')
@@ -1838,6 +1697,8 @@ def category_heroes():
                     pass
         db.session.add(chi)
         db.session.commit()
+        try: invalidate(category_tag(category_id))
+        except Exception: pass
         flash("Hero image added", "success")
         return redirect(url_for("admin.category_heroes"))
     items = CategoryHeroImage.query.order_by(CategoryHeroImage.category_id.asc(), CategoryHeroImage.sort_order.asc(), CategoryHeroImage.created_at.desc()).all()
@@ -1853,6 +1714,8 @@ def toggle_category_hero(item_id):
         abort(404)
     it.is_active = not it.is_active
     db.session.commit()
+    try: invalidate(category_tag(it.category_id))
+    except Exception: pass
     flash("Hero image updated", "success")
     return redirect(url_for("admin.category_heroes"))
 
@@ -1864,6 +1727,7 @@ def update_category_hero(item_id):
     it = db.session.get(CategoryHeroImage, item_id)
     if not it:
         abort(404)
+    previous_category_id = it.category_id
     it.sort_order = request.form.get("sort_order", type=int) or it.sort_order
     it.category_id = request.form.get("category_id", type=int) or it.category_id
     it.is_active = request.form.get("is_active") == '1'
@@ -1887,6 +1751,8 @@ def update_category_hero(item_id):
         if up:
             it.image_url = up
     db.session.commit()
+    try: invalidate(category_tag(previous_category_id), category_tag(it.category_id))
+    except Exception: pass
     flash("Hero image saved", "success")
     return redirect(url_for("admin.category_heroes"))
 
@@ -1898,8 +1764,11 @@ def delete_category_hero(item_id):
     it = db.session.get(CategoryHeroImage, item_id)
     if not it:
         abort(404)
+    hero_category_id = it.category_id
     db.session.delete(it)
     db.session.commit()
+    try: invalidate(category_tag(hero_category_id))
+    except Exception: pass
     flash("Hero image deleted", "info")
     return redirect(url_for("admin.category_heroes"))
 
@@ -1920,7 +1789,11 @@ def approve_review(review_id):
     if not r:
         abort(404)
     r.is_approved = True
+    db.session.flush()
+    refresh_product_rating(r.product_id)
     db.session.commit()
+    try: invalidate(product_tag(r.product_id))
+    except Exception: pass
     flash("Review approved", "success")
     return redirect(url_for("admin.reviews_moderation"))
 
@@ -1937,8 +1810,13 @@ def reject_review(review_id):
         ReviewPhoto.query.filter_by(review_id=review_id).delete()
     except Exception:
         pass
+    product_id = r.product_id
     db.session.delete(r)
+    db.session.flush()
+    refresh_product_rating(product_id)
     db.session.commit()
+    try: invalidate(product_tag(product_id))
+    except Exception: pass
     flash("Review rejected and removed", "info")
     return redirect(url_for("admin.reviews_moderation"))
 @admin_bp.route("/import", methods=["GET", "POST"])
@@ -2110,6 +1988,9 @@ def bulk_import():
                                                 db.session.add(ProductImage(product_id=p.id, image_url=url, is_primary=first))
                                                 first = False
                         db.session.commit()
+                        reindex_all()
+                        try: invalidate(cache_tags.CATALOG, cache_tags.CATEGORIES)
+                        except Exception: pass
                         flash(f"Imported {created} products", "success")
                         return redirect(url_for('admin.products'))
     # end POST handling
@@ -2117,15 +1998,22 @@ def bulk_import():
         return redirect(url_for('admin.products'))
     # If we didn't POST (or nothing scheduled) show the import page
     return render_template('admin/import.html')
+
+
+@admin_bp.route("/reports/orders.csv")
+@login_required
 @admin_required
 def orders_report_csv():
-    import csv, io
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["OrderID","User","Status","Total","DeliveryFee","Discount","Zone","CreatedAt"])
-    for o in Order.query.order_by(Order.created_at.desc()).all():
-        writer.writerow([o.id, (o.user.email if o.user else ''), o.status, o.total_amount, o.delivery_fee, o.discount_amount, (o.delivery_zone.name if o.delivery_zone else ''), o.created_at])
-    return Response(output.getvalue(), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=orders.csv'})
+    filters = reports.parse_filters(request.args)
+    return reports.csv_response(reports.orders_rows(filters), 'orders.csv', filters, request.headers.get('Accept-Encoding'))
+
+
+@admin_bp.route("/reports/order-items.csv")
+@login_required
+@admin_required
+def order_items_report_csv():
+    filters = reports.parse_filters(request.args)
+    return reports.csv_response(reports.order_items_rows(filters), 'order_items.csv', filters, request.headers.get('Accept-Encoding'))
 
 
 @admin_bp.route("/payments")
@@ -2181,27 +2069,8 @@ def update_rider_location(rider_id):
 @login_required
 @admin_required
 def payments_report_csv():
-    import csv, io
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["PaymentID","OrderID","Method","Reference","Amount","Status","CreatedAt"])
-    qparam = (request.args.get('q') or '').strip()
-    status = request.args.get('status')
-    q = Payment.query
-    if status:
-        q = q.filter_by(status=status)
-    if qparam:
-        like = f"%{qparam}%"
-        q = q.join(Order, isouter=True).filter(db.or_(
-            Payment.id.cast(db.String).ilike(like),
-            Payment.reference.ilike(like),
-            Payment.method.ilike(like),
-            Payment.status.ilike(like),
-            Order.id.cast(db.String).ilike(like)
-        ))
-    for p in q.order_by(Payment.created_at.desc()).all():
-        writer.writerow([p.id, (p.order_id or ''), p.method, (p.reference or ''), p.amount, p.status, p.created_at])
-    return Response(output.getvalue(), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=payments.csv'})
+    filters = reports.parse_filters(request.args)
+    return reports.csv_response(reports.payments_rows(filters), 'payments.csv', filters, request.headers.get('Accept-Encoding'))
 
 
 @admin_bp.route("/products/export")
@@ -2209,72 +2078,124 @@ def payments_report_csv():
 @admin_required
 def export_products_csv():
     import csv, io
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["name","slug","category_name","category_slug","price","list_price","image_url","images","stock","created_at"])
-    from ...models import ProductImage
-    for p in Product.query.join(Category, isouter=True).order_by(Product.created_at.desc()).all():
-        images = ProductImage.query.filter_by(product_id=p.id).order_by(ProductImage.is_primary.desc(), ProductImage.created_at.desc()).all()
-        images_str = '|'.join([img.image_url for img in images]) if images else ''
-        writer.writerow([
-            p.name,
-            p.slug,
-            (p.category.name if p.category else ''),
-            (p.category.slug if p.category else ''),
-            (p.price if p.price is not None else ''),
-            (p.old_price if getattr(p, 'old_price', None) is not None else ''),
-            (p.image_url or ''),
-            images_str,
-            p.stock,
-            p.created_at,
-        ])
-    return Response(output.getvalue(), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=products.csv'})
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+
+        def flush():
+            data = buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+            return data
+
+        writer.writerow(["name","slug","category_name","category_slug","price","list_price","image_url","images","stock","created_at"])
+        yield flush()
+        for row, images in _iter_product_export_rows():
+            writer.writerow([
+                row.name,
+                row.slug,
+                row.category_name or '',
+                row.category_slug or '',
+                (row.price if row.price is not None else ''),
+                (row.old_price if row.old_price is not None else ''),
+                (row.image_url or ''),
+                '|'.join(images),
+                row.stock,
+                row.created_at,
+            ])
+            yield flush()
+    return Response(stream_with_context(generate()), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=products.csv'})
 
 
 @admin_bp.route("/products/export.json")
 @login_required
 @admin_required
 def export_products_json():
-    products = []
-    from ...models import ProductImage
-    for p in Product.query.join(Category, isouter=True).order_by(Product.created_at.desc()).all():
-        images = ProductImage.query.filter_by(product_id=p.id).order_by(ProductImage.is_primary.desc(), ProductImage.created_at.desc()).all()
-        img_list = [i.image_url for i in images]
-        products.append({
-            'id': p.id,
-            'name': p.name,
-            'slug': p.slug,
-            'category_name': (p.category.name if p.category else ''),
-            'category_slug': (p.category.slug if p.category else ''),
-            'price': str(p.price) if p.price is not None else None,
-            'list_price': str(getattr(p, 'old_price', None)) if getattr(p, 'old_price', None) is not None else None,
-            'image_url': p.image_url,
-            'images': img_list,
-            'stock': p.stock,
-            'created_at': p.created_at.isoformat() if p.created_at else None,
-        })
-    return Response(json.dumps(products, ensure_ascii=False, indent=2), mimetype='application/json', headers={'Content-Disposition': 'attachment; filename=products.json'})
+    def generate():
+        yield '['
+        first = True
+        for row, images in _iter_product_export_rows():
+            item = {
+                'id': row.id,
+                'name': row.name,
+                'slug': row.slug,
+                'category_name': row.category_name or '',
+                'category_slug': row.category_slug or '',
+                'price': str(row.price) if row.price is not None else None,
+                'list_price': str(row.old_price) if row.old_price is not None else None,
+                'image_url': row.image_url,
+                'images': images,
+                'stock': row.stock,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+            }
+            yield ('\n  ' if first else ',\n  ') + json.dumps(item, ensure_ascii=False)
+            first = False
+        yield '\n]' if not first else ']'
+    return Response(stream_with_context(generate()), mimetype='application/json', headers={'Content-Disposition': 'attachment; filename=products.json'})
 
 
 @admin_bp.route('/products/print')
 @login_required
 @admin_required
 def products_print_view():
+    items = (
+        {
+            'id': row.id,
+            'name': row.name,
+            'slug': row.slug,
+            'category_name': row.category_name or '',
+            'category_slug': row.category_slug or '',
+            'price': row.price,
+            'image_url': row.image_url,
+            'images': images,
+        }
+        for row, images in _iter_product_export_rows()
+    )
+    return Response(stream_template('admin/products_print.html', products=items))
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _iter_product_export_rows(batch_size=None):
+    """Yield (row, image_urls) for every product, newest first, in constant memory.
+
+    Products are read in keyset pages of ``batch_size`` and each page's
+    gallery images with one grouped query. A page is fully fetched before
+    its images are queried, so no two result sets are open on the connection.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    query = (
+        db.session.query(
+            Product.id, Product.name, Product.slug, Product.price, Product.old_price,
+            Product.image_url, Product.stock, Product.created_at,
+            Category.name.label('category_name'), Category.slug.label('category_slug'),
+        )
+        .outerjoin(Category, Product.category_id == Category.id)
+    )
+    cursor = None
+    while True:
+        page = paginate(query, newest_first(Product), cursor=cursor, per_page=batch_size, count=False)
+        if page.items:
+            yield from _with_product_images(page.items)
+        cursor = page.next_cursor
+        if not cursor:
+            break
+
+
+def _with_product_images(rows):
     from ...models import ProductImage
-    items = []
-    for p in Product.query.join(Category, isouter=True).order_by(Product.created_at.desc()).all():
-        images = ProductImage.query.filter_by(product_id=p.id).order_by(ProductImage.is_primary.desc(), ProductImage.created_at.desc()).all()
-        items.append({
-            'id': p.id,
-            'name': p.name,
-            'slug': p.slug,
-            'category_name': (p.category.name if p.category else ''),
-            'category_slug': (p.category.slug if p.category else ''),
-            'price': p.price,
-            'image_url': p.image_url,
-            'images': [i.image_url for i in images],
-        })
-    return render_template('admin/products_print.html', products=items)
+    images = {}
+    image_rows = (
+        db.session.query(ProductImage.product_id, ProductImage.image_url)
+        .filter(ProductImage.product_id.in_([r.id for r in rows]))
+        .order_by(ProductImage.product_id, ProductImage.is_primary.desc(), ProductImage.created_at.desc())
+    )
+    for pid, url in image_rows:
+        images.setdefault(pid, []).append(url)
+    for r in rows:
+        yield r, images.get(r.id, [])
 
 
 # --- Reviews management ---
@@ -2283,15 +2204,13 @@ def products_print_view():
 @admin_required
 def reviews():
     q = (request.args.get('q') or '').strip()
-    page = max(1, request.args.get('page', type=int, default=1))
     per_page = request.args.get('per_page', type=int, default=50)
     query = Review.query.join(User, Review.user_id == User.id).join(Product, Review.product_id == Product.id)
     if q:
         like = f"%{q}%"
         query = query.filter(db.or_(User.email.ilike(like), Product.name.ilike(like), Review.comment.ilike(like)))
-    total = query.count()
-    items = query.order_by(Review.created_at.desc()).offset((page-1)*per_page).limit(per_page).all()
-    return render_template("admin/reviews.html", reviews=items, total=total, page=page, per_page=per_page, q=q)
+    pagination = paginate(query, newest_first(Review), cursor=request.args.get('cursor'), per_page=per_page)
+    return render_template("admin/reviews.html", reviews=pagination.items, pagination=pagination, per_page=per_page, q=q)
 
 @admin_bp.route("/reviews/<int:review_id>/delete", methods=["POST"])
 @login_required
@@ -2300,8 +2219,13 @@ def delete_review(review_id):
     r = db.session.get(Review, review_id)
     if not r:
         abort(404)
+    product_id = r.product_id
     db.session.delete(r)
+    db.session.flush()
+    refresh_product_rating(product_id)
     db.session.commit()
+    try: invalidate(product_tag(product_id))
+    except Exception: pass
     flash("Review deleted", "info")
     return redirect(url_for("admin.reviews"))
 
@@ -2327,15 +2251,13 @@ def users():
             flash("User created", "success")
         return redirect(url_for('admin.users'))
     q = (request.args.get('q') or '').strip()
-    page = max(1, request.args.get('page', type=int, default=1))
     per_page = request.args.get('per_page', type=int, default=50)
     query = User.query
     if q:
         like = f"%{q}%"
         query = query.filter(db.or_(User.email.ilike(like), User.name.ilike(like)))
-    total = query.count()
-    items = query.order_by(User.created_at.desc()).offset((page-1)*per_page).limit(per_page).all()
-    return render_template("admin/users.html", users=items, total=total, page=page, per_page=per_page, q=q)
+    pagination = paginate(query, newest_first(User), cursor=request.args.get('cursor'), per_page=per_page)
+    return render_template("admin/users.html", users=pagination.items, pagination=pagination, per_page=per_page, q=q)
 
 @admin_bp.route("/users/<int:user_id>/delete", methods=["POST"])
 @login_required
@@ -2374,7 +2296,7 @@ def delivery_zones():
                 zone = DeliveryZone(name=name, fee=fee, eta=eta)
                 db.session.add(zone)
                 db.session.commit()
-                try: cache.clear()
+                try: invalidate(cache_tags.DELIVERY_ZONES)
                 except Exception: pass
                 flash("Delivery zone added", "success")
         return redirect(url_for("admin.delivery_zones"))
@@ -2410,7 +2332,7 @@ def edit_delivery_zone(zone_id):
                 zone.fee = fee
                 zone.eta = eta
                 db.session.commit()
-                try: cache.clear()
+                try: invalidate(cache_tags.DELIVERY_ZONES)
                 except Exception: pass
                 flash("Delivery zone updated", "success")
                 return redirect(url_for("admin.delivery_zones"))
@@ -2433,7 +2355,7 @@ def delete_delivery_zone(zone_id):
 
     db.session.delete(zone)
     db.session.commit()
-    try: cache.clear()
+    try: invalidate(cache_tags.DELIVERY_ZONES)
     except Exception: pass
     flash("Delivery zone deleted", "info")
     return redirect(url_for("admin.delivery_zones"))
@@ -46,6 +46,8 @@ def login():
                                 db.session.add(CartItem(user_id=user.id, product_id=pid, quantity=min(99, qty)))
                     db.session.commit()
                     session.pop('cart', None)
+                    from ...utils.cart_count import refresh_cart_count
+                    refresh_cart_count(user.id)
             except Exception:
                 pass
             # Redirect admins to dashboard, others to the shop home
@@ -3,6 +3,8 @@ from flask_login import login_required, current_user
 from ...extensions import db, csrf
 from ...models import CartItem, Product, SavedItem
 from ...extensions import limiter
+from ...utils.cart_count import refresh_cart_count, set_cart_count
+from ...utils.cart import load_user_cart, load_session_cart
 
 cart_bp = Blueprint("cart", __name__, url_prefix="/cart")
 
@@ -10,10 +12,8 @@ cart_bp = Blueprint("cart", __name__, url_prefix="/cart")
 @cart_bp.route("/")
 @login_required
 def view_cart():
-    items = CartItem.query.filter_by(user_id=current_user.id).all()
-    # Use db.session.get to avoid SQLAlchemy 2.x deprecation warnings
-    total = sum(i.quantity * float(db.session.get(Product, i.product_id).price) for i in items)
-    return render_template("cart.html", items=items, total=total)
+    cart = load_user_cart(current_user.id)
+    return render_template("cart.html", items=cart.items, total=cart.subtotal)
 
 
 @cart_bp.route("/mini")
@@ -24,69 +24,11 @@ def mini_cart():
     forcing a login redirect.
     """
     if not getattr(current_user, 'is_authenticated', False):
-        # Build from session cart
-        cart = session.get('cart', {}) or {}
-        data_items = []
-        subtotal = 0.0
-        for pid_str, qty in cart.items():
-            try:
-                pid = int(pid_str)
-                qty = int(qty)
-            except Exception:
-                continue
-            p = db.session.get(Product, pid)
-            if not p:
-                continue
-            line_total = qty * float(p.price)
-            subtotal += line_total
-            data_items.append({
-                "item_id": None,
-                "product_id": p.id,
-                "name": p.name,
-                "slug": p.slug,
-                "price": float(p.price),
-                "quantity": int(qty),
-                "image_url": getattr(p, 'image_url', None),
-                "line_total": round(line_total, 2),
-            })
-        count = sum(int(v or 0) for v in cart.values())
-        return {
-            "ok": True,
-            "items": data_items,
-            "subtotal": round(subtotal, 2),
-            "count": int(count),
-        }
-    from sqlalchemy import func
-    items = CartItem.query.filter_by(user_id=current_user.id).all()
-    data_items = []
-    subtotal = 0.0
-    for it in items:
-        p = db.session.get(Product, it.product_id)
-        if not p:
-            continue
-        line_total = (it.quantity or 0) * float(p.price)
-        subtotal += line_total
-        data_items.append({
-            "item_id": it.id,
-            "product_id": p.id,
-            "name": p.name,
-            "slug": p.slug,
-            "price": float(p.price),
-            "quantity": int(it.quantity or 0),
-            "image_url": getattr(p, 'image_url', None),
-            "line_total": round(line_total, 2),
-        })
-    count = (request.args.get('count_only') == '1') and 0 or len(items)
-    try:
-        count = int(db.session.query(func.coalesce(func.sum(CartItem.quantity), 0)).filter_by(user_id=current_user.id).scalar() or 0)
-    except Exception:
-        count = len(items)
-    return {
-        "ok": True,
-        "items": data_items,
-        "subtotal": round(subtotal, 2),
-        "count": int(count),
-    }
+        return load_session_cart(session.get('cart')).as_dict()
+    cart = load_user_cart(current_user.id)
+    # Keep the navbar badge in step with what the widget shows
+    set_cart_count(current_user.id, cart.count)
+    return cart.as_dict()
 
 
 @cart_bp.route("/add/<int:product_id>")
@@ -100,6 +42,7 @@ def add(product_id):
             item = CartItem(user_id=current_user.id, product_id=product_id, quantity=1)
             db.session.add(item)
         db.session.commit()
+        refresh_cart_count(current_user.id)
     else:
         cart = session.get('cart', {}) or {}
         cart[str(product_id)] = int(cart.get(str(product_id), 0)) + 1
@@ -121,6 +64,7 @@ def remove(item_id):
         return redirect(url_for("cart.view_cart"))
     db.session.delete(item)
     db.session.commit()
+    refresh_cart_count(current_user.id)
     flash("Removed from cart", "info")
     return redirect(url_for("cart.view_cart"))
 
@@ -145,8 +89,7 @@ def add_json():
             item = CartItem(user_id=current_user.id, product_id=pid, quantity=1)
             db.session.add(item)
         db.session.commit()
-        from sqlalchemy import func
-        cart_count = db.session.query(func.coalesce(func.sum(CartItem.quantity), 0)).filter_by(user_id=current_user.id).scalar() or 0
+        cart_count = refresh_cart_count(current_user.id)
         return {"ok": True, "message": f"Added {product.name}", "cart_count": int(cart_count)}
     else:
         cart = session.get('cart', {}) or {}
@@ -179,21 +122,16 @@ def update_quantity():
         else:
             item.quantity = min(99, qty)
             db.session.commit()
-        # Recalculate totals
-        from sqlalchemy import func
-        item_subtotal = 0.0
-        if qty > 0:
-            p = db.session.get(Product, item.product_id)
-            item_subtotal = (item.quantity or 0) * float(p.price if p else 0)
-        cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        cart_subtotal = sum((ci.quantity or 0) * float(db.session.get(Product, ci.product_id).price) for ci in cart_items)
-        count = db.session.query(func.coalesce(func.sum(CartItem.quantity), 0)).filter_by(user_id=current_user.id).scalar() or 0
+        # Recalculate totals from one load of the cart
+        cart = load_user_cart(current_user.id)
+        line = cart.line_for(item_id=item_id) if qty > 0 else None
+        count = set_cart_count(current_user.id, cart.count)
         return {
             "ok": True,
             "item_id": item_id,
             "quantity": max(0, qty),
-            "item_subtotal": round(item_subtotal, 2),
-            "cart_subtotal": round(cart_subtotal, 2),
+            "item_subtotal": round(line.line_total if line else 0.0, 2),
+            "cart_subtotal": round(cart.subtotal, 2),
             "cart_count": int(count),
             "removed": qty <= 0,
         }
@@ -210,24 +148,15 @@ def update_quantity():
             cart[str(pid)] = min(99, qty)
         session['cart'] = cart
         # Totals
-        cart_items = []
-        subtotal = 0.0
-        for k, v in cart.items():
-            try:
-                p = db.session.get(Product, int(k))
-                line = int(v) * float(p.price if p else 0)
-                subtotal += line
-                if int(k) == pid:
-                    item_subtotal = line
-            except Exception:
-                pass
+        guest = load_session_cart(cart)
+        line = guest.line_for(product_id=pid)
         count = sum(int(v or 0) for v in cart.values())
         return {
             "ok": True,
             "product_id": pid,
             "quantity": max(0, qty),
-            "item_subtotal": round(locals().get('item_subtotal', 0.0), 2),
-            "cart_subtotal": round(subtotal, 2),
+            "item_subtotal": round(line.line_total if line else 0.0, 2),
+            "cart_subtotal": round(guest.subtotal, 2),
             "cart_count": int(count),
             "removed": qty <= 0,
         }
@@ -252,8 +181,6 @@ def save_for_later():
     # Remove from cart
     db.session.delete(item)
     db.session.commit()
-    from sqlalchemy import func
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    cart_subtotal = sum((ci.quantity or 0) * float(db.session.get(Product, ci.product_id).price) for ci in cart_items)
-    count = db.session.query(func.coalesce(func.sum(CartItem.quantity), 0)).filter_by(user_id=current_user.id).scalar() or 0
-    return {"ok": True, "message": "Saved for later", "cart_subtotal": round(cart_subtotal, 2), "cart_count": int(count)}
+    cart = load_user_cart(current_user.id)
+    count = set_cart_count(current_user.id, cart.count)
+    return {"ok": True, "message": "Saved for later", "cart_subtotal": round(cart.subtotal, 2), "cart_count": int(count)}
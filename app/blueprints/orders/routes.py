@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, abort
 from flask_login import login_required, current_user
 from ...extensions import db
-from ...utils.email import send_email, send_email_html
+from ...utils.cart_count import refresh_cart_count, set_cart_count
+from ...utils import sales_rollup, sales_stats
+from ...utils.cart import load_user_cart
+from ...utils.stock import decrement_stock, short_products
+from ...utils import reservations
+from ...utils.email import send_email_html_async
 from flask import render_template
 from ...models import CartItem, Order, OrderItem, DeliveryAddress, Product, DeliveryZone, Coupon, OrderStatusLog
 from datetime import datetime
@@ -13,7 +18,8 @@ orders_bp = Blueprint("orders", __name__, url_prefix="/orders")
 @orders_bp.route("/checkout", methods=["GET", "POST"])
 @login_required
 def checkout():
-    items = CartItem.query.filter_by(user_id=current_user.id).all()
+    cart = load_user_cart(current_user.id)
+    items = cart.items
     if not items:
         flash("Your cart is empty", "warning")
         return redirect(url_for("shop.shop"))
@@ -30,28 +36,19 @@ def checkout():
 
         # Validate stock
         try:
-            # Use DB transaction and row locking where supported, else perform a simple validation loop
+            # Lock the cart's product rows in one IN query where supported so prices stay
+            # fixed until commit; the guarded stock UPDATE below is what prevents overselling
             dialect_name = getattr(db.session.bind, 'dialect', None) and getattr(db.session.bind.dialect, 'name', '')
             if dialect_name and dialect_name not in ('sqlite',):
-                with db.session.begin():
-                    for i in items:
-                        # Use row locking if DB supports it
-                        q = db.session.query(Product).filter(Product.id == i.product_id)
-                        try:
-                            q = q.with_for_update()
-                        except Exception:
-                            pass
-                        p = q.one_or_none()
-                        if not p or (p.stock is not None and int(p.stock) < int(i.quantity)):
-                            flash(f"Insufficient stock for {p.name if p else 'item'}", "danger")
-                            return redirect(url_for("cart.view_cart"))
-            else:
-                # For SQLite or unsupported dialects, just validate without locking
-                for i in items:
-                    p = db.session.get(Product, i.product_id)
-                    if not p or (p.stock is not None and int(p.stock) < int(i.quantity)):
-                        flash(f"Insufficient stock for {p.name if p else 'item'}", "danger")
-                        return redirect(url_for("cart.view_cart"))
+                # Lock all cart products in one statement (refreshes the loaded rows)
+                db.session.query(Product).filter(Product.id.in_([i.product_id for i in items])) \
+                    .populate_existing().with_for_update().all()
+            # Fail fast with a friendly message before creating the order
+            for i in items:
+                p = i.product
+                if p.stock is not None and int(p.stock) < int(i.quantity):
+                    flash(f"Insufficient stock for {p.name}", "danger")
+                    return redirect(url_for("cart.view_cart"))
         except Exception:
             flash("A problem occurred while validating stock. Please try again.", "danger")
             return redirect(url_for("cart.view_cart"))
@@ -64,15 +61,21 @@ def checkout():
         )
         db.session.add(order)
         db.session.flush()
-        total = 0
-        for i in items:
-            p = db.session.query(Product).filter(Product.id == i.product_id).one_or_none()
-            oi = OrderItem(order_id=order.id, product_id=p.id, product_name=p.name, quantity=i.quantity, unit_price=p.price)
-            db.session.add(oi)
-            total += i.quantity * float(p.price)
-            # decrement stock
-            if p.stock is not None:
-                p.stock = max(0, int(p.stock) - int(i.quantity))
+        db.session.add_all([
+            OrderItem(order_id=order.id, product_id=i.product.id, product_name=i.product.name, quantity=i.quantity, unit_price=i.product.price)
+            for i in items
+        ])
+        total = sum(i.quantity * float(i.product.price) for i in items)
+        # One guarded UPDATE for all lines; a short row means another checkout won the race
+        if not decrement_stock((i.product_id, i.quantity) for i in items):
+            db.session.rollback()
+            short = short_products((i.product_id, i.quantity) for i in items)
+            names = ', '.join(p.name if p else 'item' for p in short) or 'item'
+            flash(f"Insufficient stock for {names}", "danger")
+            return redirect(url_for("cart.view_cart"))
+        if payment_method != 'cod':
+            # Units come back automatically if payment does not land in time
+            reservations.hold_order(order, [(i.product_id, i.quantity) for i in items])
         fee = 0
         if not is_pickup and zone_id:
             z = db.session.get(DeliveryZone, zone_id)
@@ -120,10 +123,13 @@ def checkout():
             db.session.add(OrderStatusLog(order_id=order.id, status="placed", notes="Order created"))
         except Exception:
             pass
+        sales_stats.record_order(order)
+        sales_rollup.record_order(order)
         db.session.commit()
+        set_cart_count(current_user.id, 0)
         try:
             html = render_template('emails/order_created.html', order=order, user=current_user)
-            send_email_html(to=current_user.email, subject=f"Order #{order.id} placed (COD)", html=html)
+            send_email_html_async(to=current_user.email, subject=f"Order #{order.id} placed (COD)", html=html)
         except Exception:
             pass
         # Decide next step based on payment method
@@ -135,15 +141,8 @@ def checkout():
             # Redirect to MPESA start by default so payment flows can be initiated.
             # The /payments/mpesa/start endpoint handles fallback when MPESA is not configured.
             return redirect(url_for("payments.start_mpesa", order_id=order.id))
-    # Compute subtotal for display and client-side calculations
-    subtotal = 0.0
-    for i in items:
-        try:
-            p = db.session.get(Product, i.product_id)
-            subtotal += (i.quantity or 0) * float(p.price if p else 0)
-        except Exception:
-            pass
-    return render_template("checkout.html", items=items, addresses=addresses, zones=zones, total=subtotal)
+    # Subtotal for display and client-side calculations
+    return render_template("checkout.html", items=items, addresses=addresses, zones=zones, total=cart.subtotal)
 
 
 @orders_bp.route("/apply-coupon", methods=["POST"])
@@ -262,6 +261,9 @@ def cancel_order(order_id):
         db.session.add(OrderStatusLog(order_id=order.id, status="cancelled", notes="Cancelled by user"))
     except Exception:
         pass
+    sales_stats.record_order(order, -1)
+    sales_rollup.record_order(order, -1)
+    reservations.release_order(order.id)
     db.session.commit()
     flash("Order cancelled", "success")
     return redirect(url_for("orders.my_orders"))
@@ -293,6 +295,7 @@ def reorder(order_id):
             db.session.add(CartItem(user_id=current_user.id, product_id=p.id, quantity=int(it.quantity or 1)))
         added += 1
     db.session.commit()
+    refresh_cart_count(current_user.id)
     flash(f"Re-added {added} item(s) to your cart", "success")
     return redirect(url_for("cart.view_cart"))
 
@@ -1,52 +1,25 @@
 import json
-import base64
-import requests
 from datetime import datetime
 from flask import Blueprint, current_app, redirect, request, url_for, flash
 from flask_login import current_user, login_required
 from ...extensions import db, cache, limiter
-from ...utils.email import send_email
 from ...models import Order, Payment
-from ...extensions import socketio
+from ...utils import reservations
+from ...utils import mpesa
+from ...utils import reconciliation
+from ...utils import after_commit
+from sqlalchemy.exc import IntegrityError
 import importlib
 
 payments_bp = Blueprint("payments", __name__, url_prefix="/payments")
 
 
 def _mpesa_access_token():
-    base_url = current_app.config.get("MPESA_BASE_URL")
-    key = current_app.config.get("MPESA_CONSUMER_KEY")
-    secret = current_app.config.get("MPESA_CONSUMER_SECRET")
-    if not base_url or not key or not secret:
-        return None
-    try:
-        # Try cache first (cache key: mpesa_access_token)
-        try:
-            token = cache.get('mpesa_access_token') if cache else None
-            if token:
-                return token
-        except Exception:
-            token = None
-        resp = requests.get(
-            f"{base_url}/oauth/v1/generate?grant_type=client_credentials",
-            auth=(key, secret), timeout=10
-        )
-        if resp is not None and resp.ok:
-            token_val = resp.json().get("access_token")
-            if token_val:
-                try:
-                    cache.set('mpesa_access_token', token_val, timeout=55*60)
-                except Exception:
-                    pass
-            return token_val
-    except Exception:
-        return None
-    return None
+    return mpesa.access_token()
 
 
 def _stk_password(short_code: str, passkey: str, timestamp: str) -> str:
-    raw = f"{short_code}{passkey}{timestamp}".encode("utf-8")
-    return base64.b64encode(raw).decode("utf-8")
+    return mpesa.stk_password(short_code, passkey, timestamp)
 
 
 @payments_bp.route("/mpesa/start/<int:order_id>")
@@ -74,16 +47,7 @@ def start_mpesa(order_id):
     except Exception:
         pass
 
-    base_url = current_app.config.get("MPESA_BASE_URL")
-    short_code = current_app.config.get("MPESA_SHORT_CODE")
-    passkey = current_app.config.get("MPESA_PASSKEY")
-    callback_url = current_app.config.get("MPESA_CALLBACK_URL")
-    # Optional Lipa na Till support
-    till_number = current_app.config.get("MPESA_TILL_NUMBER")
-    tx_type = current_app.config.get("MPESA_TRANSACTION_TYPE") or "CustomerPayBillOnline"
-
-    token = _mpesa_access_token()
-    if not token or not short_code or not passkey or not callback_url or not base_url:
+    if not mpesa.is_configured():
         # Fallback to stub if not configured
         payment = Payment(order_id=order.id, amount=order.total_amount, status="pending", method="mpesa")
         db.session.add(payment)
@@ -91,50 +55,34 @@ def start_mpesa(order_id):
         flash("M-Pesa not fully configured. Marked payment pending.", "info")
         return redirect(url_for("orders.my_orders"))
 
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    # Choose PartyB and transaction type
-    use_till = bool(till_number) and tx_type == "CustomerBuyGoodsOnline"
-    party_b = (till_number if use_till else short_code)
-    password = _stk_password(short_code, passkey, timestamp)
-    payload = {
-        "BusinessShortCode": short_code,
-        "Password": password,
-        "Timestamp": timestamp,
-        "TransactionType": tx_type,
-        "Amount": int(float(order.total_amount)),
-        "PartyA": phone,
-        "PartyB": party_b,
-        "PhoneNumber": phone,
-        "CallBackURL": callback_url,
-        "AccountReference": str(order.id),
-        "TransactionDesc": f"Order {order.id} payment",
-    }
-
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    payment = Payment(order_id=order.id, amount=order.total_amount, status="pending", method="mpesa")
+    db.session.add(payment)
+    db.session.commit()
+    # Hand the Daraja round-trips to the worker; the outcome arrives as a payment.status socket event
     try:
-        resp = requests.post(f"{base_url}/mpesa/stkpush/v1/processrequest", headers=headers, json=payload, timeout=15)
-        data = resp.json() if resp.content else {}
-        # Create payment record regardless
-        payment = Payment(order_id=order.id, amount=order.total_amount, status="pending", method="mpesa")
-        if resp.ok and data.get("ResponseCode") == "0":
-            payment.reference = data.get("CheckoutRequestID")
-            payment.raw_payload = json.dumps(data)
-            flash("M-Pesa STK push sent. Check your phone to authorize.", "info")
-        else:
-            payment.status = "failed"
-            payment.raw_payload = json.dumps(data)
-            msg = data.get("errorMessage") or data.get("ResponseDescription") or "Failed to initiate STK"
-            flash(msg, "danger")
-        db.session.add(payment)
-        db.session.commit()
+        from ...tasks import mpesa_stk_push_task
+        if current_app.config.get('CELERY_BROKER_URL') and hasattr(mpesa_stk_push_task, 'delay'):
+            mpesa_stk_push_task.delay(payment.id, phone)
+            flash("Sending the M-Pesa prompt to your phone. Authorize it to complete payment.", "info")
+            return redirect(url_for("orders.order_detail", order_id=order.id))
     except Exception:
-        payment = Payment(order_id=order.id, amount=order.total_amount, status="failed", method="mpesa")
-        db.session.add(payment)
-        db.session.commit()
-        flash("Network error contacting M-Pesa.", "danger")
+        pass
+    ok, message = mpesa.run_stk_push(payment.id, phone)
+    flash(message or "Failed to initiate STK", "info" if ok else "danger")
     return redirect(url_for("orders.my_orders"))
 
 
+@payments_bp.route("/mpesa/status/<int:order_id>")
+@login_required
+def mpesa_status(order_id):
+    """Payment state for clients that missed the payment.status socket event."""
+    order = db.session.get(Order, order_id)
+    if not order or order.user_id != current_user.id:
+        return {"ok": False}, 404
+    payment = order.payment
+    return {"ok": True, "order_id": order.id, "order_status": order.status, "payment_status": payment.status if payment else None}
+
+
 @payments_bp.route('/stripe/start/<int:order_id>')
 @limiter.limit("10 per minute")
 def start_stripe(order_id):
@@ -220,17 +168,21 @@ def stripe_webhook():
         order_id = sess.get('metadata', {}).get('order_id')
         if order_id:
             order = db.session.get(Order, int(order_id))
-            if order:
-                p = order.payment or Payment(order_id=order.id, method='stripe', amount=order.total_amount)
+            # The session's own row; order.payment may be an older session for the same order
+            p = Payment.query.filter_by(reference=sess.get('id')).first() if sess.get('id') else None
+            already_paid = order and Payment.query.filter_by(order_id=order.id, status='paid').first()
+            # Stripe redelivers until it gets a 2xx; an already-paid order is acknowledged as is
+            if order and not already_paid:
+                if p is None:
+                    p = order.payment or Payment(order_id=order.id, method='stripe', amount=order.total_amount)
+                    p.reference = sess.get('id')
                 p.status = 'paid'
-                p.reference = sess.get('id')
-                order.status = 'confirmed'
                 db.session.add(p)
+                reservations.commit_order(order.id)
+                if order.status in reconciliation.CONFIRMABLE_ORDER_STATUSES:
+                    order.status = 'confirmed'
+                after_commit.defer('order_status_event', order_id=order.id)
                 db.session.commit()
-                try:
-                    socketio.emit('order.status', {'order_id': order.id, 'status': order.status}, namespace='/', room=f'user_{order.user_id}')
-                except Exception:
-                    pass
     return {'ok': True}
 
 
@@ -238,61 +190,30 @@ def stripe_webhook():
 def mpesa_callback():
     # Daraja sends Body.stkCallback
     data = request.get_json(silent=True) or {}
-    body = data.get("Body", {}) if isinstance(data, dict) else {}
-    cb = body.get("stkCallback", {})
-    checkout_id = cb.get("CheckoutRequestID")
-    result_code = cb.get("ResultCode")
-    items = cb.get("CallbackMetadata", {}).get("Item", []) if isinstance(cb.get("CallbackMetadata", {}), dict) else []
-
-    # Find payment by checkout id
-    payment = None
-    if checkout_id:
-        payment = Payment.query.filter_by(reference=checkout_id).first()
-    # Fallback by AccountReference (order id)
-    if not payment:
-        try:
-            account_ref = next((i.get('Value') for i in items if i.get('Name') == 'AccountReference'), None)
-            if account_ref:
-                order = db.session.get(Order, int(account_ref))
-                payment = order.payment if order else None
-        except Exception:
-            payment = None
-
-    if not payment:
+    cb = reconciliation.parse_stk_callback(data)
+    found = reconciliation.find_payment(cb['checkout_id'], cb['account_ref'])
+    if not found:
+        return {"ok": True}
+    payment_id, order_id, status = found
+    # Idempotency: a paid payment is final; duplicate deliveries are dropped by the event key
+    if status == 'paid':
         return {"ok": True}
-
-    # Idempotency: if payment is already processed as paid, ignore
-    try:
-        if payment.status == 'paid':
-            return {"ok": True}
-    except Exception:
-        pass
-
-    # Update payment and order
-    payment.raw_payload = json.dumps(data)
-    if result_code == 0 or result_code == "0":
-        payment.status = "paid"
-        try:
-            if payment.order and payment.order.status in ("pending", "confirmed"):
-                payment.order.status = "confirmed"
-                # Notify user by email (best-effort)
-                if payment.order.user and payment.order.user.email:
-                    try:
-                        send_email(
-                            to=payment.order.user.email,
-                            subject=f"Payment received for Order #{payment.order.id}",
-                            body=f"Hello,\n\nWe have received your M-Pesa payment for Order #{payment.order.id}. Your order is now confirmed.\n\nThank you for shopping with us."
-                        )
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-    else:
-        payment.status = "failed"
-    db.session.commit()
     try:
-        if payment.order and payment.order.user_id:
-            socketio.emit('order.status', {'order_id': payment.order.id, 'status': payment.order.status}, namespace='/', room=f'user_{payment.order.user_id}')
+        outcome = reconciliation.apply_stk_result(
+            payment_id, order_id, cb['result_code'],
+            reconciliation.event_key(cb['checkout_id'], cb['result_code'], cb['receipt']),
+            raw=data,
+        )
+        if outcome == 'paid':
+            after_commit.defer('order_paid_email', order_id=order_id)
+        if outcome:
+            after_commit.defer('order_status_event', order_id=order_id)
+        db.session.commit()
+    except IntegrityError:
+        # Duplicate delivery: the event key was already recorded
+        db.session.rollback()
     except Exception:
-        pass
+        # Acknowledge anyway so Safaricom stops redelivering; reconcile_pending settles the payment
+        db.session.rollback()
+        current_app.logger.exception('M-Pesa callback for payment %s could not be applied', payment_id)
     return {"ok": True}
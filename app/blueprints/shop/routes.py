@@ -2,20 +2,56 @@ from flask import Blueprint, render_template, request, Response, url_for, flash,
 from ...models import Product, Category, HomePageBanner, Review, Order, OrderItem, FlashSale, DeliveryZone, Coupon, ProductImage, CategoryHeroImage, Post
 from flask import jsonify, session
 from flask_login import login_required, current_user
-from ...extensions import db, cache
+from ...extensions import db, cache, limiter
 from ...utils.email import send_email
 from flask import current_app
 import json
 import urllib.request
 import urllib.parse
 from ...utils.media import upload_image
+from ...utils import cache_tags
+from ...utils import search as search_index
+from ...utils import suggest as suggest_index
+from ...utils import sales_stats
+from ...utils.ratings import refresh_product_rating
+from ...utils.reservations import held_by_product
+from ...utils.cache_tags import cached_view, add_cache_tags, tag_products, category_tag
+from ...utils.keyset import Key, newest_first, paginate, paginate_offset
 
 shop_bp = Blueprint("shop", __name__)
 
+PER_PAGE = 12
+
+
+def product_sort_keys(sort):
+    """Keyset sort keys for a listing's ``sort`` argument (newest when unknown)."""
+    if sort == 'price_asc':
+        return [Key(Product.price), Key(Product.id)]
+    if sort == 'price_desc':
+        return [Key(Product.price, desc=True), Key(Product.id, desc=True)]
+    if sort == 'rating':
+        return [Key(Product.rating_avg, desc=True, null=-1), Key(Product.rating_count, desc=True), Key(Product.id, desc=True)]
+    return newest_first(Product)
+
+
+def listing_query(category_ids=None):
+    """Live products, optionally in ``category_ids``: the base of the shop and category listings."""
+    query = Product.query.filter(Product.is_active.is_(True))
+    if category_ids:
+        query = query.filter(Product.category_id.in_(category_ids))
+    return query
+
 def make_cache_key():
     """Cache key that varies by path, query string, and user auth/admin state.
     Ensures navbar updates instantly on login/logout/admin by busting per-user cache.
+    With SHARED_PAGE_CACHE the key only varies by path: the page is rendered for
+    an anonymous visitor and the per-user parts are hydrated from /api/session.
     """
+    from flask import request
+    # include full_path to vary by query params where applicable
+    path = getattr(request, 'full_path', getattr(request, 'path', '/'))
+    if cache_tags.shared_pages_enabled():
+        return f"{path}|shared"
     try:
         uid = getattr(current_user, 'id', None)
         is_auth = getattr(current_user, 'is_authenticated', False)
@@ -24,13 +60,13 @@ def make_cache_key():
         uid = None
         is_auth = False
         is_admin = False
-    # include full_path to vary by query params where applicable
-    from flask import request
-    path = getattr(request, 'full_path', getattr(request, 'path', '/'))
     return f"{path}|uid:{uid}|auth:{int(bool(is_auth))}|admin:{int(bool(is_admin))}"
 
 @shop_bp.route("/")
-@cache.cached(timeout=300, key_prefix=make_cache_key)
+@cached_view(timeout=300, key_prefix=make_cache_key, shared=True, tags=(
+    cache_tags.CATALOG, cache_tags.BANNERS, cache_tags.FLASH_SALES, cache_tags.DEALS,
+    cache_tags.TOP_PICKS, cache_tags.NEW_ARRIVALS,
+))
 def home():
     # Debug: Print database connection info
     print("\n=== DEBUG: Homepage Data ===")
@@ -79,17 +115,10 @@ def home():
         if not new_arrivals:
             new_arrivals = Product.query.filter(Product.is_active.is_(True)).order_by(Product.created_at.desc()).limit(8).all()
 
-        # Top selling (by OrderItem quantity)
-        from sqlalchemy import func
-        top_ids = (
-            OrderItem.query.with_entities(OrderItem.product_id, func.coalesce(func.sum(OrderItem.quantity), 0).label("qty"))
-            .group_by(OrderItem.product_id)
-            .order_by(func.coalesce(func.sum(OrderItem.quantity), 0).desc())
-            .limit(8)
-            .all()
-        )
-        top_ids_list = [pid for pid, _ in top_ids]
-        top_selling = Product.query.filter(Product.id.in_(top_ids_list)).all() if top_ids_list else []
+        # Top selling (lifetime units from product_sales_stats), best seller first
+        top_ids_list = sales_stats.top_product_ids(8)
+        by_id = {p.id: p for p in Product.query.filter(Product.id.in_(top_ids_list)).all()} if top_ids_list else {}
+        top_selling = [by_id[pid] for pid in top_ids_list if pid in by_id]
 
         # Active flash sales
         now = datetime.utcnow()
@@ -98,6 +127,8 @@ def home():
             FlashSale.starts_at <= now,
             FlashSale.ends_at >= now,
         ).limit(4).all()
+        tag_products(products + deals + new_arrivals + top_selling)
+        add_cache_tags(*(cache_tags.product_tag(fs.product_id) for fs in flash_sales if fs.product_id))
         return render_template(
             "home.html",
             products=products,
@@ -117,7 +148,7 @@ def home():
         return render_template('500.html'), 500
 
 @shop_bp.route("/deals")
-@cache.cached(timeout=300, key_prefix=make_cache_key)
+@cached_view(timeout=300, key_prefix=make_cache_key, shared=True, tags=(cache_tags.DEALS, cache_tags.FLASH_SALES))
 def deals_page():
     from datetime import datetime
     deals = Product.query.filter(
@@ -142,14 +173,17 @@ def deals_page():
                     sale_ends[fs.product_id] = fs.ends_at.isoformat()
     except Exception:
         pass
-    return render_template("deals.html", deals=deals, sale_ends=sale_ends)
+    # Units held by unpaid checkouts are already off stock; show them as reserved, not sold
+    held = held_by_product(p.id for p in deals if p.stock is not None and p.stock <= 0)
+    tag_products(deals)
+    return render_template("deals.html", deals=deals, sale_ends=sale_ends, held=held)
 
 @shop_bp.route("/shop")
-@cache.cached(timeout=300, key_prefix=make_cache_key)
+@cached_view(timeout=300, key_prefix=make_cache_key, shared=True)
 def shop():
     q = request.args.get("q")
     category_id = request.args.get("category")
-    page = request.args.get("page", 1, type=int)
+    cursor = request.args.get("cursor")
     sort = request.args.get("sort", "newest")
     min_price = request.args.get("min", type=float)
     max_price = request.args.get("max", type=float)
@@ -158,17 +192,23 @@ def shop():
     in_stock = request.args.get("in_stock") == '1'
     rating_min = request.args.get("rating", type=int)
 
-    query = Product.query.filter_by(is_active=True)
+    query = listing_query([category_id] if category_id else None)
     if q:
-        query = query.filter(Product.name.ilike(f"%{q}%"))
+        query, _ranked = search_index.filter_query(query, q)
     if category_id:
-        query = query.filter(Product.category_id == category_id)
+        try:
+            add_cache_tags(category_tag(category_id))
+        except Exception:
+            add_cache_tags(cache_tags.CATALOG)
+    else:
+        add_cache_tags(cache_tags.CATALOG)
     if min_price is not None:
         query = query.filter(Product.price >= min_price)
     if max_price is not None:
         query = query.filter(Product.price <= max_price)
     if deals:
         query = query.filter(Product.old_price.isnot(None), Product.old_price > Product.price)
+        add_cache_tags(cache_tags.DEALS)
     if is_new:
         from datetime import datetime, timedelta
         since = datetime.utcnow() - timedelta(days=14)
@@ -176,43 +216,22 @@ def shop():
     if in_stock:
         query = query.filter((Product.stock.is_(None)) | (Product.stock > 0))
 
-    # Rating filter via subquery to avoid GROUP BY on main query
+    # Rating filter on the denormalized approved-review average
     if rating_min and 1 <= rating_min <= 5:
-        from sqlalchemy import func, select
-        avg_sub = (
-            db.session.query(Review.product_id.label('pid'))
-            .group_by(Review.product_id)
-            .having(func.avg(Review.rating) >= rating_min)
-            .subquery()
-        )
-        query = query.filter(Product.id.in_(select(avg_sub.c.pid)))
-
-    if sort == 'price_asc':
-        query = query.order_by(Product.price.asc())
-    elif sort == 'price_desc':
-        query = query.order_by(Product.price.desc())
-    elif sort == 'rating':
-        from sqlalchemy import func
-        avg_sub = (
-            db.session.query(Review.product_id.label('pid'), func.avg(Review.rating).label('avg_rating'))
-            .group_by(Review.product_id)
-            .subquery()
-        )
-        query = query.outerjoin(avg_sub, Product.id == avg_sub.c.pid).order_by(avg_sub.c.avg_rating.desc().nullslast())
-    else:  # newest/default
-        query = query.order_by(Product.created_at.desc())
+        query = query.filter(Product.rating_avg >= rating_min)
 
-    pagination = query.paginate(page=page, per_page=12, error_out=False)
+    pagination = paginate(query, product_sort_keys(sort), cursor=cursor, per_page=PER_PAGE)
     products = pagination.items
+    tag_products(products)
     categories = Category.query.all()
     return render_template("shop.html", products=products, categories=categories, pagination=pagination)
 
 
 @shop_bp.route("/search")
-@cache.cached(timeout=120, key_prefix=make_cache_key)
+@cached_view(timeout=120, key_prefix=make_cache_key, shared=True, tags=(cache_tags.CATALOG,))
 def search():
     q = (request.args.get("q") or "").strip()
-    page = request.args.get("page", 1, type=int)
+    cursor = request.args.get("cursor")
     sort = request.args.get("sort", "relevance")
 
     # Record recent searches in session (last 5)
@@ -227,38 +246,37 @@ def search():
         pass
 
     query = Product.query.filter(Product.is_active.is_(True))
+    ranked = None
     if q:
-        # Basic ILIKE search over name and description
-        query = query.filter(
-            (Product.name.ilike(f"%{q}%")) | (Product.description.ilike(f"%{q}%"))
-        )
-    # Sorting
-    if sort == 'price_asc':
-        query = query.order_by(Product.price.asc())
-    elif sort == 'price_desc':
-        query = query.order_by(Product.price.desc())
-    elif sort == 'newest':
-        query = query.order_by(Product.created_at.desc())
-    else:  # relevance (fallback to newest for now)
-        query = query.order_by(Product.created_at.desc())
-
-    pagination = query.paginate(page=page, per_page=12, error_out=False)
+        query, ranked = search_index.filter_query(query, q)
+    # Sorting; relevance ranks by position in the backend's id list, which keys can't express
+    if sort not in ('price_asc', 'price_desc', 'newest') and ranked:
+        query = search_index.order_by_rank(query, ranked).order_by(Product.id)
+        pagination = paginate_offset(query, cursor=cursor, per_page=PER_PAGE, spec='search:relevance')
+    else:  # relevance without a ranked backend falls back to newest
+        pagination = paginate(query, product_sort_keys(sort), cursor=cursor, per_page=PER_PAGE)
+    tag_products(pagination.items)
     categories = Category.query.all()
     return render_template("shop.html", products=pagination.items, categories=categories, pagination=pagination)
 
 
 @shop_bp.route("/api/search/suggest")
+@limiter.limit("120 per minute")
 def search_suggest():
     q = (request.args.get("q") or "").strip()
     if not q:
         return jsonify([])
-    items = (
-        Product.query.with_entities(Product.name, Product.slug)
-        .filter(Product.is_active.is_(True), Product.name.ilike(f"%{q}%"))
-        .order_by(Product.created_at.desc())
-        .limit(8)
-        .all()
-    )
+    # Served from the in-memory prefix index; fall back to (typo-tolerant) search
+    hits = suggest_index.suggest(q, limit=8)
+    if hits:
+        return jsonify([{"name": n, "slug": s} for (_id, n, s) in hits])
+    query = Product.query.with_entities(Product.name, Product.slug).filter(Product.is_active.is_(True))
+    query, ranked = search_index.filter_query(query, q, limit=8)
+    if ranked:
+        query = search_index.order_by_rank(query, ranked)
+    else:
+        query = query.order_by(Product.created_at.desc())
+    items = query.limit(8).all()
     return jsonify([{"name": n, "slug": s} for (n, s) in items])
 
 
@@ -267,9 +285,7 @@ def product(slug):
     p = Product.query.filter_by(slug=slug, is_active=True).first_or_404()
     # Only approved reviews
     reviews = Review.query.filter_by(product_id=p.id, is_approved=True).order_by(Review.created_at.desc()).limit(50).all()
-    avg = None
-    if reviews:
-        avg = round(sum(r.rating for r in reviews) / len(reviews), 1)
+    avg = round(float(p.rating_avg), 1) if p.rating_count and p.rating_avg is not None else None
     # Flags
     from datetime import datetime, timedelta
     is_new = p.created_at and p.created_at >= (datetime.utcnow() - timedelta(days=14))
@@ -298,9 +314,11 @@ def product(slug):
     except Exception:
         eta_text = None
 
+    held_qty = held_by_product([p.id]).get(p.id, 0) if p.stock is not None and p.stock <= 0 else 0
     return render_template(
         "product.html",
         product=p,
+        held_qty=held_qty,
         reviews=reviews,
         avg_rating=avg,
         is_new=is_new,
@@ -335,6 +353,8 @@ def add_review(slug):
         return redirect(url_for('shop.product', slug=slug))
     r = Review(rating=rating, comment=comment, user_id=current_user.id, product_id=product.id, is_approved=False)
     db.session.add(r)
+    db.session.flush()
+    refresh_product_rating(product.id)
     db.session.commit()
     # handle photo uploads (multiple files named 'photos')
     try:
@@ -376,11 +396,16 @@ def add_review(slug):
 
 
 @shop_bp.route("/api/suggest")
+@limiter.limit("120 per minute")
 def suggest():
     q = request.args.get("q", "").strip()
     if not q:
         return {"items": []}
-    items = Product.query.filter(Product.name.ilike(f"%{q}%"), Product.is_active.is_(True)).with_entities(Product.id, Product.name, Product.slug).limit(5).all()
+    hits = suggest_index.suggest(q, limit=5)
+    if hits:
+        return {"items": [{"id": i, "name": n, "slug": s} for (i, n, s) in hits]}
+    query, ranked = search_index.filter_query(Product.query.filter(Product.is_active.is_(True)), q, limit=5)
+    items = search_index.order_by_rank(query, ranked).with_entities(Product.id, Product.name, Product.slug).limit(5).all()
     return {"items": [{"id": i.id, "name": i.name, "slug": i.slug} for i in items]}
 
 
@@ -507,13 +532,15 @@ def refund():
 # Blog storefront
 @shop_bp.route("/blog")
 def blog_index():
-    page = request.args.get('page', 1, type=int)
+    from datetime import datetime
     q = (request.args.get('q') or '').strip()
     query = Post.query.filter_by(is_published=True)
     if q:
         like = f"%{q}%"
         query = query.filter(db.or_(Post.title.ilike(like), Post.slug.ilike(like)))
-    pagination = query.order_by(Post.published_at.desc().nullslast(), Post.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
+    # Unpublished-date posts sort last, as with NULLS LAST
+    keys = [Key(Post.published_at, desc=True, null=datetime.min), Key(Post.created_at, desc=True), Key(Post.id, desc=True)]
+    pagination = paginate(query, keys, cursor=request.args.get('cursor'), per_page=10)
     return render_template('blog/index.html', posts=pagination.items, pagination=pagination, q=q)
 
 
@@ -526,10 +553,10 @@ def blog_detail(slug):
 
 
 @shop_bp.route("/category/<slug>")
-@cache.cached(timeout=300, key_prefix=make_cache_key)
+@cached_view(timeout=300, key_prefix=make_cache_key, shared=True)
 def category(slug):
     c = Category.query.filter_by(slug=slug).first_or_404()
-    page = request.args.get("page", 1, type=int)
+    cursor = request.args.get("cursor")
     sort = request.args.get("sort", "newest")
     min_price = request.args.get("min", type=float)
     max_price = request.args.get("max", type=float)
@@ -549,8 +576,9 @@ def category(slug):
         subcat = Category.query.filter_by(slug=sub_slug, parent_id=c.id).first()
         if subcat:
             category_ids = [subcat.id]
+    add_cache_tags(category_tag(c.id), *(category_tag(cid) for cid in category_ids))
 
-    query = Product.query.filter(Product.is_active.is_(True), Product.category_id.in_(category_ids))
+    query = listing_query(category_ids)
 
     if min_price is not None:
         query = query.filter(Product.price >= min_price)
@@ -559,33 +587,19 @@ def category(slug):
     if in_stock:
         query = query.filter((Product.stock.is_(None)) | (Product.stock > 0))
 
-    # Rating filter via subquery
+    # Rating filter on the denormalized approved-review average
     if rating_min and 1 <= rating_min <= 5:
-        from sqlalchemy import func, select
-        avg_sub = (
-            db.session.query(Review.product_id.label('pid'))
-            .group_by(Review.product_id)
-            .having(func.avg(Review.rating) >= rating_min)
-            .subquery()
-        )
-        query = query.filter(Product.id.in_(select(avg_sub.c.pid)))
-
-    if sort == 'price_asc':
-        query = query.order_by(Product.price.asc())
-    elif sort == 'price_desc':
-        query = query.order_by(Product.price.desc())
-    elif sort == 'rating':
-        from sqlalchemy import func
-        avg_sub = (
-            db.session.query(Review.product_id.label('pid'), func.avg(Review.rating).label('avg_rating'))
-            .group_by(Review.product_id)
-            .subquery()
-        )
-        query = query.outerjoin(avg_sub, Product.id == avg_sub.c.pid).order_by(avg_sub.c.avg_rating.desc().nullslast())
+        query = query.filter(Product.rating_avg >= rating_min)
+
+    if sort == 'popular':
+        # Sorted on the joined sales counters, so pages carry an offset instead of keys
+        from ...models import ProductSalesStats
+        query = query.outerjoin(ProductSalesStats, ProductSalesStats.product_id == Product.id) \
+            .order_by(ProductSalesStats.units_30d.desc().nullslast(), ProductSalesStats.units_total.desc().nullslast(), Product.id.desc())
+        pagination = paginate_offset(query, cursor=cursor, per_page=PER_PAGE, spec='category:popular')
     else:
-        query = query.order_by(Product.created_at.desc())
-
-    pagination = query.paginate(page=page, per_page=12, error_out=False)
+        pagination = paginate(query, product_sort_keys(sort), cursor=cursor, per_page=PER_PAGE)
+    tag_products(pagination.items)
     cats = Category.query.all()
     # Load active/scheduled hero images (max 10)
     from datetime import datetime
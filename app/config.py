@@ -8,6 +8,20 @@ class BaseConfig:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///scholagro.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine profile: auto (by DATABASE_URL), postgres, pgbouncer, sqlite or default (see app/utils/db_engine.py)
+    DB_ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE', 'auto')
+    # postgres profile pool; size it to one eventlet worker's concurrent queries
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    # Server-side limits in milliseconds (0 = server default). The statement timeout is opt-in: it also
+    # applies to `flask db upgrade`, rollup rebuilds and exports, which can legitimately run longer
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', '60000'))
+    # sqlite profile pragmas
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
     SECURITY_PASSWORD_SALT = os.getenv("SECURITY_PASSWORD_SALT", "change-this-salt")
 
     MPESA_CONSUMER_KEY = os.getenv("MPESA_CONSUMER_KEY", "")
@@ -18,12 +32,24 @@ class BaseConfig:
     MPESA_BASE_URL = os.getenv("MPESA_BASE_URL", "https://sandbox.safaricom.co.ke")
     MPESA_TILL_NUMBER = os.getenv("MPESA_TILL_NUMBER", "123456")  # placeholder; override in Admin Settings
     MPESA_TRANSACTION_TYPE = os.getenv("MPESA_TRANSACTION_TYPE", "CustomerBuyGoodsOnline")  # default to Till
+    # Seconds before expiry at which the Daraja token is refreshed in the background
+    MPESA_TOKEN_REFRESH_AHEAD = int(os.getenv("MPESA_TOKEN_REFRESH_AHEAD", "300"))
+    MPESA_HTTP_POOL_SIZE = int(os.getenv("MPESA_HTTP_POOL_SIZE", "10"))
+    # Pending STK payments older than this are resolved with the STK query API (Celery beat)
+    MPESA_RECONCILE_AFTER_SECONDS = int(os.getenv("MPESA_RECONCILE_AFTER_SECONDS", "120"))
+    MPESA_RECONCILE_INTERVAL = int(os.getenv("MPESA_RECONCILE_INTERVAL", "120"))
+    MPESA_RECONCILE_BATCH = int(os.getenv("MPESA_RECONCILE_BATCH", "100"))
 
     SMTP_HOST = os.getenv("SMTP_HOST")
     SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
     SMTP_USERNAME = os.getenv("SMTP_USERNAME")
     SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
     SMTP_SENDER = os.getenv("SMTP_SENDER", "no-reply@scholagro.com")
+    # Logged-in SMTP sessions kept per process; idle ones are NOOP-checked before reuse
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+    SMTP_IDLE_CHECK_SECONDS = float(os.getenv("SMTP_IDLE_CHECK_SECONDS", "30"))
+    SMTP_MAX_IDLE_SECONDS = float(os.getenv("SMTP_MAX_IDLE_SECONDS", "300"))
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
     # Default contact recipient
     CONTACT_TO = os.getenv("CONTACT_TO", "scholagro@gmail.com")
     # Web3Forms
@@ -36,10 +62,30 @@ class BaseConfig:
     # Caching
     CACHE_TYPE = os.getenv("CACHE_TYPE", "SimpleCache")
     CACHE_DEFAULT_TIMEOUT = int(os.getenv("CACHE_DEFAULT_TIMEOUT", "300"))
+    # Opt-in: cache storefront pages once for everyone; per-user bits load from /api/session
+    SHARED_PAGE_CACHE = os.getenv('SHARED_PAGE_CACHE', 'false').lower() == 'true'
+    # Product search backend: auto (by DB dialect), postgres, sqlite (FTS5) or memory
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+    # How often typeahead checks for other workers' product writes (seconds)
+    SUGGEST_CHECK_SECONDS = float(os.getenv('SUGGEST_CHECK_SECONDS', '2'))
+    # How often workers stat instance/*.json admin files for changes (seconds)
+    CONFIG_FILE_CHECK_SECONDS = float(os.getenv('CONFIG_FILE_CHECK_SECONDS', '5'))
     # Redis / Celery
     REDIS_URL = os.getenv('REDIS_URL', os.getenv('CACHE_REDIS_URL') or os.getenv('REDIS_URL'))
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL)
+    # Seconds between Celery beat refreshes of the daily sales rollup (last 2 days)
+    SALES_ROLLUP_INTERVAL = int(os.getenv('SALES_ROLLUP_INTERVAL', '600'))
+    # Seconds between recomputes of the 7/30-day best-seller counters
+    SALES_STATS_INTERVAL = int(os.getenv('SALES_STATS_INTERVAL', '3600'))
+    # Prepaid orders hold their stock this long before an unpaid hold is released
+    STOCK_HOLD_MINUTES = float(os.getenv('STOCK_HOLD_MINUTES', '15'))
+    STOCK_HOLD_SWEEP_SECONDS = int(os.getenv('STOCK_HOLD_SWEEP_SECONDS', '60'))
+    # Notification outbox: celery, thread, inline or off (empty = celery with a broker, else thread)
+    NOTIFY_DISPATCH_MODE = os.getenv('NOTIFY_DISPATCH_MODE', '')
+    NOTIFY_DISPATCH_INTERVAL = int(os.getenv('NOTIFY_DISPATCH_INTERVAL', '30'))
+    NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '100'))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '5'))
     # Stripe
     STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
@@ -52,6 +98,17 @@ class BaseConfig:
     # Socket.IO
     SOCKETIO_ENABLED = os.getenv('SOCKETIO_ENABLED', 'true').lower() == 'true'
     SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE')  # eventlet, gevent, threading, asyncio
+    # Redis URL shared with Celery workers so events they emit reach browsers
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    # Post-commit side effects: celery, thread or inline (empty = celery with a broker, else thread)
+    SIDE_EFFECTS_MODE = os.getenv('SIDE_EFFECTS_MODE', '')
+    SIDE_EFFECTS_THREADS = int(os.getenv('SIDE_EFFECTS_THREADS', '2'))
+    # Listing totals are counted exactly up to this many rows, then shown as "N+" (or estimated on Postgres)
+    PAGINATION_COUNT_CAP = int(os.getenv('PAGINATION_COUNT_CAP', '1000'))
+    # /api/catalog/changes: tombstone retention, and how old a change must be before it is served
+    CATALOG_CHANGES_RETENTION_DAYS = int(os.getenv('CATALOG_CHANGES_RETENTION_DAYS', '30'))
+    CATALOG_CHANGES_SETTLE_SECONDS = float(os.getenv('CATALOG_CHANGES_SETTLE_SECONDS', '5'))
+    CATALOG_CHANGES_COMPACT_INTERVAL = int(os.getenv('CATALOG_CHANGES_COMPACT_INTERVAL', '86400'))
 
 
 class DevelopmentConfig(BaseConfig):
@@ -45,7 +45,11 @@ class SocialLink(db.Model, TimestampMixin):
 
 class User(UserMixin, db.Model, TimestampMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index('ix_users_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # keyset listings seek on it
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(120))
@@ -114,6 +118,7 @@ class Category(db.Model, TimestampMixin):
 class Product(db.Model, TimestampMixin):
     __tablename__ = "products"
     id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # keyset listings seek on it
     name = db.Column(db.String(200), nullable=False)
     slug = db.Column(db.String(220), unique=True, nullable=False)
     description = db.Column(db.Text)
@@ -126,13 +131,38 @@ class Product(db.Model, TimestampMixin):
     # Admin flags: allow admin to highlight products in homepage sections
     is_top_pick = db.Column(db.Boolean, default=False)
     is_new_arrival_featured = db.Column(db.Boolean, default=False)
+    # Approved-review aggregates maintained by app.utils.ratings
+    rating_avg = db.Column(db.Numeric(3, 2), index=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
 
     reviews = db.relationship("Review", backref="product", lazy=True)
 
+    # Shop/category listings filter on is_active (+ category) and sort by a keyset key
+    # (shop.product_sort_keys); the flag indexes cover the homepage strips. Every index
+    # leads with the equality columns so none loses to another's is_active prefix.
+    __table_args__ = (
+        db.Index('ix_products_active_category_created', 'is_active', 'category_id', 'created_at'),
+        db.Index('ix_products_active_created', 'is_active', 'created_at'),
+        db.Index('ix_products_top_picks', 'is_active', 'is_top_pick', 'updated_at'),
+        db.Index('ix_products_new_arrivals', 'is_active', 'is_new_arrival_featured', 'updated_at'),
+        db.Index('ix_products_created_at', 'created_at'),  # admin list
+        db.Index('ix_products_active_category_price', 'is_active', 'category_id', 'price'),
+        db.Index('ix_products_active_price', 'is_active', 'price'),
+        # The rating sort orders on coalesce(rating_avg, -1)
+        db.Index('ix_products_active_category_rating', 'is_active', 'category_id',
+                 db.func.coalesce(rating_avg, -1), 'rating_count'),
+        db.Index('ix_products_active_rating', 'is_active', db.func.coalesce(rating_avg, -1), 'rating_count'),
+    )
+
 
 class Review(db.Model, TimestampMixin):
     __tablename__ = "reviews"
+    __table_args__ = (
+        db.Index('ix_reviews_product_approved_created', 'product_id', 'is_approved', 'created_at'),
+        db.Index('ix_reviews_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # keyset listings seek on it
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -162,7 +192,13 @@ class DeliveryZone(db.Model, TimestampMixin):
 
 class Order(db.Model, TimestampMixin):
     __tablename__ = "orders"
+    __table_args__ = (
+        db.Index('ix_orders_user_created', 'user_id', 'created_at'),
+        db.Index('ix_orders_status_created', 'status', 'created_at'),
+        db.Index('ix_orders_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # keyset listings seek on it
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     rider_id = db.Column(db.Integer, db.ForeignKey("riders.id"))
     status = db.Column(db.String(32), default="pending")  # pending, packed, on_the_way, delivered
@@ -184,8 +220,8 @@ class Order(db.Model, TimestampMixin):
 class OrderItem(db.Model, TimestampMixin):
     __tablename__ = "order_items"
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey("orders.id"), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False, index=True)
     product_name = db.Column(db.String(200), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -193,10 +229,13 @@ class OrderItem(db.Model, TimestampMixin):
 
 class Payment(db.Model, TimestampMixin):
     __tablename__ = "payments"
+    __table_args__ = (
+        db.Index('ix_payments_method_status_created', 'method', 'status', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey("orders.id"), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey("orders.id"), nullable=False, index=True)
     method = db.Column(db.String(32), default="mpesa")
-    reference = db.Column(db.String(120))
+    reference = db.Column(db.String(120), unique=True, index=True)  # M-Pesa CheckoutRequestID / Stripe session id
     amount = db.Column(db.Numeric(10, 2))
     status = db.Column(db.String(32), default="pending")  # pending, paid, failed
     raw_payload = db.Column(db.Text)
@@ -204,6 +243,9 @@ class Payment(db.Model, TimestampMixin):
 
 class CartItem(db.Model, TimestampMixin):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        db.Index('ix_cart_items_user_product', 'user_id', 'product_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
@@ -215,6 +257,9 @@ class CartItem(db.Model, TimestampMixin):
 
 class WishlistItem(db.Model, TimestampMixin):
     __tablename__ = "wishlist_items"
+    __table_args__ = (
+        db.Index('ix_wishlist_items_user_product', 'user_id', 'product_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
@@ -223,6 +268,9 @@ class WishlistItem(db.Model, TimestampMixin):
 
 class SavedItem(db.Model, TimestampMixin):
     __tablename__ = "saved_items"
+    __table_args__ = (
+        db.Index('ix_saved_items_user_product', 'user_id', 'product_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
@@ -276,6 +324,9 @@ class OrderStatusLog(db.Model, TimestampMixin):
 
 class Notification(db.Model, TimestampMixin):
     __tablename__ = "notifications"
+    __table_args__ = (
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     title = db.Column(db.String(200))
@@ -297,6 +348,9 @@ class Post(db.Model, TimestampMixin):
 
 class ProductImage(db.Model, TimestampMixin):
     __tablename__ = "product_images"
+    __table_args__ = (
+        db.Index('ix_product_images_product_primary', 'product_id', 'is_primary'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
     image_url = db.Column(db.String(500), nullable=False)
@@ -323,6 +377,10 @@ class CategoryHeroImage(db.Model, TimestampMixin):
 
 class FlashSale(db.Model, TimestampMixin):
     __tablename__ = "flash_sales"
+    __table_args__ = (
+        db.Index('ix_flash_sales_active_window', 'is_active', 'starts_at', 'ends_at'),
+        db.Index('ix_flash_sales_product_active', 'product_id', 'is_active'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
     discount_percent = db.Column(db.Integer, default=0)
@@ -347,6 +405,108 @@ class AdminEvent(db.Model, TimestampMixin):
     zone = db.Column(db.String(120))  # optional delivery zone name
 
 
+class DailySalesRollup(db.Model):
+    """Per day x zone x category x product sales, maintained by app.utils.sales_rollup.
+
+    Rows with product_id == category_id == 0 carry the order-level totals for
+    the day and zone; the others carry item units and revenue. Zone/category 0
+    stand for "none" so the unique key works on every backend.
+    """
+    __tablename__ = 'daily_sales_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'zone_id', 'category_id', 'product_id', name='uq_daily_sales_rollup_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    zone_id = db.Column(db.Integer, nullable=False, default=0)
+    category_id = db.Column(db.Integer, nullable=False, default=0)
+    product_id = db.Column(db.Integer, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    order_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ProductSalesStats(db.Model):
+    """Per-product units/revenue sold: lifetime plus rolling 7 and 30 days (app.utils.sales_stats)."""
+    __tablename__ = 'product_sales_stats'
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    units_total = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    units_7d = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_7d = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    units_30d = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_30d = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    last_sold_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StockReservation(db.Model):
+    """Units taken off stock for an unpaid order; returned unless payment lands before expires_at."""
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.Index('ix_stock_reservations_status_expires', 'status', 'expires_at'),
+        db.Index('ix_stock_reservations_product_status', 'product_id', 'status'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='held')  # held, committed, released
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+
+
+class PaymentEvent(db.Model):
+    """One row per provider result applied to a payment; the unique key makes callbacks idempotent."""
+    __tablename__ = 'payment_events'
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'event_key', name='uq_payment_events_provider_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(16), nullable=False)
+    event_key = db.Column(db.String(120), nullable=False)  # M-Pesa receipt number, or CheckoutRequestID:ResultCode
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=False, index=True)
+    result_code = db.Column(db.String(16))
+    source = db.Column(db.String(16))  # callback, query
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class NotificationOutbox(db.Model):
+    """Outgoing email/WhatsApp/SMS written with the triggering change and delivered by utils.notifications."""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_due', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(16), nullable=False)  # email, whatsapp, sms
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255))
+    body = db.Column(db.Text, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+class CatalogChange(db.Model):
+    """Append-only log of catalog writes; its id is the sync token served by /api/catalog/changes."""
+    __tablename__ = 'catalog_changes'
+    __table_args__ = (
+        db.Index('ix_catalog_changes_entity', 'entity', 'entity_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(32), nullable=False)  # product, category, product_image, flash_sale
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(8), nullable=False)  # upsert, delete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
 __all__ = [
     User, Category, Product, Review, DeliveryAddress, DeliveryZone,
     Order, OrderItem, Payment, CartItem, WishlistItem, SavedItem, HomePageBanner, Coupon
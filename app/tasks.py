@@ -3,107 +3,212 @@ from flask import current_app
 
 send_email_task = None
 send_email_html_task = None
+send_many_task = None
 bulk_import_task = None
+refresh_sales_rollup_task = None
+refresh_product_sales_stats_task = None
+release_expired_reservations_task = None
+dispatch_notifications_task = None
+mpesa_stk_push_task = None
+reconcile_mpesa_payments_task = None
+run_side_effects_task = None
+compact_catalog_changes_task = None
 
-def init_celery(app):
-    global send_email_task, send_email_html_task
+
+def _import_products_file(file_path):
+    # Process CSV import in background; import heavy logic from admin
+    import csv, io, requests, tempfile
+    from .extensions import db
+    from .models import Category, Product
+    from .utils.media import upload_image
     try:
-        celery = make_celery(app)
+        with open(file_path, 'r', encoding='utf-8') as fh:
+            reader = csv.DictReader(fh)
+            created = 0
+            for row in reader:
+                name = row.get('name'); slug = row.get('slug') or (name or '').lower().replace(' ','-')
+                price = row.get('price'); image_url = row.get('image_url'); stock = int(row.get('stock') or 0)
+                cat_name = row.get('category');
+                category = None
+                if cat_name:
+                    c = Category.query.filter_by(name=cat_name).first()
+                    if not c:
+                        c = Category(name=cat_name, slug=(cat_name or '').lower().replace(' ','-'))
+                        db.session.add(c)
+                        db.session.flush()
+                    category = c
+                if name and price:
+                    if not Product.query.filter_by(slug=slug).first():
+                        # Handle image upload if image_url is provided
+                        uploaded_image_url = None
+                        if image_url and image_url.startswith(('http://', 'https://')):
+                            try:
+                                # Download the image
+                                response = requests.get(image_url, timeout=10)
+                                response.raise_for_status()
+                                # Create a temporary file-like object
+                                from werkzeug.datastructures import FileStorage
+                                import io as io_module
+                                # Save to temp file
+                                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
+                                    tmp_file.write(response.content)
+                                    tmp_file.flush()
+                                    # Create FileStorage object
+                                    file_storage = FileStorage(stream=io_module.BytesIO(response.content), filename=f"{slug}.jpg", content_type='image/jpeg')
+                                    # Upload using media utils
+                                    uploaded = upload_image(file_storage, folder="scholagro/products")
+                                    if uploaded:
+                                        uploaded_image_url = uploaded
+                            except Exception:
+                                pass  # If download/upload fails, proceed without image
+                        p = Product(name=name, slug=slug, price=price, image_url=uploaded_image_url or image_url, stock=stock, category_id=category.id if category else None)
+                        db.session.add(p)
+                        created += 1
+            db.session.commit()
+            from .utils.search import reindex_all
+            reindex_all()
+            return created
     except Exception:
-        celery = None
+        return None
 
-    if celery:
-        @celery.task(name='app.send_email')
-        def _send_email_task(to, subject, body):
-            from .utils.email import _send_email_sync
-            with app.app_context():
-                return _send_email_sync(to, subject, body)
-        @celery.task(name='app.send_email_html')
-        def _send_email_html_task(to, subject, html):
-            from .utils.email import _send_email_html_sync
-            with app.app_context():
-                return _send_email_html_sync(to, subject, html)
-        @celery.task(name='app.bulk_import')
-        def _bulk_import_task(file_path):
-            # (omitted for brevity) will be executed within Celery worker
-            return True
-    else:
-        # Fallback: define sync functions if celery not available
-        def _send_email_task(to, subject, body):
-            from .utils.email import _send_email_sync
-            with app.app_context():
-                return _send_email_sync(to, subject, body)
-        def _send_email_html_task(to, subject, html):
-            from .utils.email import _send_email_html_sync
-            with app.app_context():
-                return _send_email_html_sync(to, subject, html)
-        def _bulk_import_task(file_path):
-            return None
+
+def init_celery(app):
+    global send_email_task, send_email_html_task, send_many_task, bulk_import_task
+    global refresh_sales_rollup_task, refresh_product_sales_stats_task
+    global release_expired_reservations_task, dispatch_notifications_task, mpesa_stk_push_task
+    global reconcile_mpesa_payments_task, run_side_effects_task, compact_catalog_changes_task
+    celery = None
+    # Without a broker, .delay() would block on a connection attempt; keep the in-process fallbacks
+    if app.config.get('CELERY_BROKER_URL'):
+        try:
+            celery = make_celery(app)
+        except Exception:
+            celery = None
+
+    # Each job runs in an app context, so the same function serves as the
+    # Celery task body and as the synchronous fallback.
     def _send_email_task(to, subject, body):
         from .utils.email import _send_email_sync
         with app.app_context():
             return _send_email_sync(to, subject, body)
 
-    @celery.task(name='app.send_email_html')
     def _send_email_html_task(to, subject, html):
         from .utils.email import _send_email_html_sync
         with app.app_context():
             return _send_email_html_sync(to, subject, html)
 
-    send_email_task = _send_email_task
-    send_email_html_task = _send_email_html_task
-    bulk_import_task = _bulk_import_task
-    @celery.task(name='app.bulk_import')
+    def _send_many_task(messages):
+        # One pooled SMTP session for the whole chunk; returns how many were sent
+        from .utils.email import send_many
+        with app.app_context():
+            return sum(send_many(tuple(m) for m in messages))
+
     def _bulk_import_task(file_path):
-        # Process CSV import in background; import heavy logic from admin
-        import csv, io, requests, tempfile
-        from .models import Category, Product
-        from .utils.media import upload_image
-        import pathlib
+        with app.app_context():
+            return _import_products_file(file_path)
+
+    def _refresh_sales_rollup_task():
+        from .utils.sales_rollup import refresh_recent
+        with app.app_context():
+            return refresh_recent()
+
+    def _refresh_product_sales_stats_task():
+        from .utils.sales_stats import refresh_windows
+        with app.app_context():
+            return refresh_windows()
+
+    def _release_expired_reservations_task():
+        from .utils.reservations import release_expired
+        with app.app_context():
+            return release_expired()
+
+    def _dispatch_notifications_task():
+        from .utils.notifications import drain
+        with app.app_context():
+            return drain()
+
+    def _mpesa_stk_push_task(payment_id, phone):
+        from .utils.mpesa import run_stk_push
+        with app.app_context():
+            return run_stk_push(payment_id, phone)[0]
+
+    def _reconcile_mpesa_payments_task():
+        from .utils.reconciliation import reconcile_pending
+        with app.app_context():
+            return reconcile_pending()
+
+    def _run_side_effects_task(items):
+        # Deferred after-commit work (emails, socket events) from webhooks
+        from .utils.after_commit import run_items
+        with app.app_context():
+            return run_items((name, kwargs) for name, kwargs in items)
+
+    def _compact_catalog_changes_task():
+        from .utils.catalog_changes import compact
+        with app.app_context():
+            return compact()
+
+    if celery:
+        _send_email_task = celery.task(name='app.send_email')(_send_email_task)
+        _send_email_html_task = celery.task(name='app.send_email_html')(_send_email_html_task)
+        _send_many_task = celery.task(name='app.send_many')(_send_many_task)
+        _bulk_import_task = celery.task(name='app.bulk_import')(_bulk_import_task)
+        _refresh_sales_rollup_task = celery.task(name='app.refresh_sales_rollup')(_refresh_sales_rollup_task)
+        _refresh_product_sales_stats_task = celery.task(name='app.refresh_product_sales_stats')(_refresh_product_sales_stats_task)
+        _release_expired_reservations_task = celery.task(name='app.release_expired_reservations')(_release_expired_reservations_task)
+        _dispatch_notifications_task = celery.task(name='app.dispatch_notifications')(_dispatch_notifications_task)
+        _mpesa_stk_push_task = celery.task(name='app.mpesa_stk_push')(_mpesa_stk_push_task)
+        _reconcile_mpesa_payments_task = celery.task(name='app.reconcile_mpesa_payments')(_reconcile_mpesa_payments_task)
+        _run_side_effects_task = celery.task(name='app.run_side_effects')(_run_side_effects_task)
+        _compact_catalog_changes_task = celery.task(name='app.compact_catalog_changes')(_compact_catalog_changes_task)
+        # Re-derive recent days so writes outside the request hooks still land
+        celery.conf.beat_schedule = {
+            **(celery.conf.beat_schedule or {}),
+            'refresh-sales-rollup': {
+                'task': 'app.refresh_sales_rollup',
+                'schedule': float(app.config.get('SALES_ROLLUP_INTERVAL', 600)),
+            },
+            'refresh-product-sales-stats': {
+                'task': 'app.refresh_product_sales_stats',
+                'schedule': float(app.config.get('SALES_STATS_INTERVAL', 3600)),
+            },
+            'release-expired-stock-holds': {
+                'task': 'app.release_expired_reservations',
+                'schedule': float(app.config.get('STOCK_HOLD_SWEEP_SECONDS', 60)),
+            },
+            'dispatch-notifications': {
+                'task': 'app.dispatch_notifications',
+                'schedule': float(app.config.get('NOTIFY_DISPATCH_INTERVAL', 30)),
+            },
+            'reconcile-mpesa-payments': {
+                'task': 'app.reconcile_mpesa_payments',
+                'schedule': float(app.config.get('MPESA_RECONCILE_INTERVAL', 120)),
+            },
+            'compact-catalog-changes': {
+                'task': 'app.compact_catalog_changes',
+                'schedule': float(app.config.get('CATALOG_CHANGES_COMPACT_INTERVAL', 86400)),
+            },
+        }
         try:
-            with open(file_path, 'r', encoding='utf-8') as fh:
-                reader = csv.DictReader(fh)
-                created = 0
-                for row in reader:
-                    name = row.get('name'); slug = row.get('slug') or (name or '').lower().replace(' ','-')
-                    price = row.get('price'); image_url = row.get('image_url'); stock = int(row.get('stock') or 0)
-                    cat_name = row.get('category');
-                    category = None
-                    if cat_name:
-                        c = Category.query.filter_by(name=cat_name).first()
-                        if not c:
-                            c = Category(name=cat_name, slug=(cat_name or '').lower().replace(' ','-'))
-                            db.session.add(c)
-                            db.session.flush()
-                        category = c
-                    if name and price:
-                        if not Product.query.filter_by(slug=slug).first():
-                            # Handle image upload if image_url is provided
-                            uploaded_image_url = None
-                            if image_url and image_url.startswith(('http://', 'https://')):
-                                try:
-                                    # Download the image
-                                    response = requests.get(image_url, timeout=10)
-                                    response.raise_for_status()
-                                    # Create a temporary file-like object
-                                    from werkzeug.datastructures import FileStorage
-                                    import io as io_module
-                                    # Save to temp file
-                                    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                                        tmp_file.write(response.content)
-                                        tmp_file.flush()
-                                        # Create FileStorage object
-                                        file_storage = FileStorage(stream=io_module.BytesIO(response.content), filename=f"{slug}.jpg", content_type='image/jpeg')
-                                        # Upload using media utils
-                                        uploaded = upload_image(file_storage, folder="scholagro/products")
-                                        if uploaded:
-                                            uploaded_image_url = uploaded
-                                except Exception:
-                                    pass  # If download/upload fails, proceed without image
-                            p = Product(name=name, slug=slug, price=price, image_url=uploaded_image_url or image_url, stock=stock, category_id=category.id if category else None)
-                            db.session.add(p)
-                            created += 1
-                db.session.commit()
+            from celery.signals import worker_process_shutdown
+
+            @worker_process_shutdown.connect(weak=False)
+            def _close_smtp_pools(**kwargs):
+                from .utils.email import close_pools
+                close_pools()
         except Exception:
             pass
+
+    send_email_task = _send_email_task
+    send_email_html_task = _send_email_html_task
+    send_many_task = _send_many_task
+    bulk_import_task = _bulk_import_task
+    refresh_sales_rollup_task = _refresh_sales_rollup_task
+    refresh_product_sales_stats_task = _refresh_product_sales_stats_task
+    release_expired_reservations_task = _release_expired_reservations_task
+    dispatch_notifications_task = _dispatch_notifications_task
+    mpesa_stk_push_task = _mpesa_stk_push_task
+    reconcile_mpesa_payments_task = _reconcile_mpesa_payments_task
+    run_side_effects_task = _run_side_effects_task
+    compact_catalog_changes_task = _compact_catalog_changes_task
     return celery
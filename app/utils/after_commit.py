@@ -0,0 +1,164 @@
+"""
+Side effects that run only after the current transaction commits.
+
+A handler calls ``defer('order_status_event', order_id=...)`` before it
+commits. The items are kept on ``db.session.info``. A SQLAlchemy
+``after_commit`` listener hands them off, and a rollback drops them,
+so nothing is emailed or emitted for a change that never landed. The
+webhook request itself never waits on SMTP or Socket.IO.
+
+Where the items run:
+
+- ``celery``: the ``app.run_side_effects`` task, used when a broker is
+  configured. Socket effects go there only if ``SOCKETIO_MESSAGE_QUEUE``
+  lets the worker reach browsers.
+- ``thread``: a small in-process pool. This is the default without a broker.
+- ``inline``: a fresh app context right after the commit. This is the
+  default under ``TESTING``.
+
+Items are plain ``(name, kwargs)`` pairs, so they serialize for Celery.
+Handlers load what they need by id in their own session.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+
+INFO_KEY = 'after_commit_effects'
+SOCKET_EFFECTS = ('order_status_event',)
+
+log = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Handlers ---------------------------------------------------------------
+
+def _email(to, subject, body):
+    from .email import send_email
+    return send_email(to=to, subject=subject, body=body)
+
+
+def _order_paid_email(order_id, method='M-Pesa'):
+    from sqlalchemy.orm import joinedload
+    from ..models import Order
+    from .email import send_email
+    order = db.session.query(Order).options(joinedload(Order.user)).filter(Order.id == order_id).first()
+    if not order or not order.user or not order.user.email:
+        return False
+    return send_email(
+        to=order.user.email,
+        subject=f"Payment received for Order #{order.id}",
+        body=f"Hello,\n\nWe have received your {method} payment for Order #{order.id}. Your order is now confirmed.\n\nThank you for shopping with us."
+    )
+
+
+def _order_status_event(order_id):
+    from ..extensions import socketio
+    from ..models import Order
+    row = db.session.query(Order.user_id, Order.status).filter(Order.id == order_id).first()
+    if not row or not row.user_id:
+        return False
+    socketio.emit('order.status', {'order_id': order_id, 'status': row.status}, namespace='/', room=f'user_{row.user_id}')
+    return True
+
+
+HANDLERS = {
+    'email': _email,
+    'order_paid_email': _order_paid_email,
+    'order_status_event': _order_status_event,
+}
+
+
+# Queueing ---------------------------------------------------------------
+
+def defer(name, **kwargs):
+    """Run handler ``name`` with ``kwargs`` once the current transaction commits."""
+    if name not in HANDLERS:
+        raise KeyError(name)
+    session = db.session()
+    if not session.in_transaction():
+        # Tie the items to a transaction so a rollback with no SQL issued still drops them
+        session.begin()
+    session.info.setdefault(INFO_KEY, []).append((name, kwargs))
+
+
+def run_items(items):
+    """Run (name, kwargs) items in the current app context; one failure does not stop the rest."""
+    done = 0
+    for name, kwargs in items:
+        try:
+            HANDLERS[name](**kwargs)
+            done += 1
+        except Exception:
+            log.exception('Deferred side effect %s failed', name)
+    return done
+
+
+def _mode(app):
+    mode = (app.config.get('SIDE_EFFECTS_MODE') or '').lower()
+    if mode:
+        return mode
+    if app.config.get('CELERY_BROKER_URL'):
+        return 'celery'
+    return 'inline' if app.testing else 'thread'
+
+
+def _run_in_context(app, items):
+    with app.app_context():
+        try:
+            return run_items(items)
+        finally:
+            db.session.remove()
+
+
+def _submit(app, items):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(app.config.get('SIDE_EFFECTS_THREADS') or 2), thread_name_prefix='after-commit')
+    _executor.submit(_run_in_context, app, items)
+
+
+def dispatch(app, items):
+    mode = _mode(app)
+    if mode == 'inline':
+        # A new app context gets its own session; the committing one can't run SQL here
+        return _run_in_context(app, items)
+    if mode == 'celery':
+        remote = [i for i in items if i[0] not in SOCKET_EFFECTS or app.config.get('SOCKETIO_MESSAGE_QUEUE')]
+        local = [i for i in items if i not in remote]
+        try:
+            from ..tasks import run_side_effects_task
+            if remote and hasattr(run_side_effects_task, 'delay'):
+                run_side_effects_task.delay([[n, kw] for n, kw in remote])
+                remote = []
+        except Exception:
+            log.warning('Could not queue side effects; running them in-process', exc_info=True)
+        items = remote + local
+    if items:
+        _submit(app, items)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    items = session.info.pop(INFO_KEY, None)
+    if not items or not has_app_context():
+        return
+    try:
+        dispatch(current_app._get_current_object(), items)
+    except Exception:
+        log.exception('Dispatching %d side effect(s) failed', len(items))
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _after_rollback(session, previous_transaction):
+    # A savepoint rollback leaves the outer transaction (and its effects) in place
+    if not previous_transaction.nested:
+        session.info.pop(INFO_KEY, None)
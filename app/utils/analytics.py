@@ -0,0 +1,107 @@
+"""
+Bucketed admin analytics computed in SQL.
+
+``bucket_totals`` returns per-bucket counts (and order sales) using one
+``GROUP BY`` per table on a dialect-specific bucket key (``date_trunc`` on
+Postgres, ``strftime``/``date`` on SQLite, ``DATE_FORMAT`` on MySQL). The key
+is the bucket's start date as ``YYYY-MM-DD``, so it lines up with the Python
+bucket list built by the caller.
+
+Buckets that ended before now are closed: their totals are cached per
+(mode, bucket start) and only still-open or uncached buckets hit the DB.
+"""
+from datetime import datetime
+
+from ..extensions import db, cache
+
+CLOSED_BUCKET_TTL = 24 * 3600
+_CACHE_PREFIX = 'analytics:bucket:'
+
+
+def bucket_key(column, mode):
+    """SQL expression giving the 'YYYY-MM-DD' start of the day/week/month containing column."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        unit = {'d': 'day', 'w': 'week'}.get(mode, 'month')
+        return db.func.to_char(db.func.date_trunc(unit, column), 'YYYY-MM-DD')
+    if dialect in ('mysql', 'mariadb'):
+        if mode == 'd':
+            return db.func.date_format(column, '%Y-%m-%d')
+        if mode == 'w':
+            return db.func.date_format(db.func.subdate(column, db.func.weekday(column)), '%Y-%m-%d')
+        return db.func.date_format(column, '%Y-%m-01')
+    # SQLite
+    if mode == 'd':
+        return db.func.strftime('%Y-%m-%d', column)
+    if mode == 'w':
+        # Monday of the week: jump to the next Sunday (or stay on it), back 6 days
+        return db.func.date(column, 'weekday 0', '-6 days')
+    return db.func.strftime('%Y-%m-01', column)
+
+
+def _grouped(model, mode, start, end, sum_column=None):
+    key = bucket_key(model.created_at, mode).label('bucket')
+    cols = [key, db.func.count(model.id)]
+    if sum_column is not None:
+        cols.append(db.func.coalesce(db.func.sum(sum_column), 0))
+    rows = (
+        db.session.query(*cols)
+        .filter(model.created_at >= start, model.created_at < end)
+        .group_by(key)
+        .all()
+    )
+    return {row[0]: row[1:] for row in rows}
+
+
+def grouped_counts(model, mode, start, end):
+    """{bucket start 'YYYY-MM-DD': row count} for model.created_at in [start, end)."""
+    return {k: int(v[0] or 0) for k, v in _grouped(model, mode, start, end).items()}
+
+
+def _compute(buckets, mode):
+    from ..models import Order, User, Product
+    start, end = buckets[0][0], buckets[-1][1]
+    orders = _grouped(Order, mode, start, end, Order.total_amount)
+    users = _grouped(User, mode, start, end)
+    products = _grouped(Product, mode, start, end)
+    out = {}
+    for s, _e in buckets:
+        k = s.strftime('%Y-%m-%d')
+        o_count, o_sum = orders.get(k, (0, 0))
+        out[k] = {
+            'sales': float(o_sum or 0),
+            'orders': int(o_count or 0),
+            'users': int((users.get(k) or (0,))[0] or 0),
+            'products': int((products.get(k) or (0,))[0] or 0),
+        }
+    return out
+
+
+def bucket_totals(buckets, mode, now=None):
+    """{bucket_start 'YYYY-MM-DD': {'sales', 'orders', 'users', 'products'}} for (start, end) buckets."""
+    if not buckets:
+        return {}
+    now = now or datetime.utcnow()
+    keys = {s: _CACHE_PREFIX + f"{mode}:{s.strftime('%Y-%m-%d')}" for s, _e in buckets}
+    closed = [(s, e) for s, e in buckets if e <= now]
+    cached = {}
+    if closed:
+        try:
+            values = cache.get_many(*[keys[s] for s, _e in closed])
+        except Exception:
+            values = [None] * len(closed)
+        for (s, _e), val in zip(closed, values):
+            if val is not None:
+                cached[s.strftime('%Y-%m-%d')] = val
+    missing = [(s, e) for s, e in buckets if s.strftime('%Y-%m-%d') not in cached]
+    totals = dict(cached)
+    if missing:
+        fresh = _compute(missing, mode)
+        totals.update(fresh)
+        to_cache = {keys[s]: fresh[s.strftime('%Y-%m-%d')] for s, e in missing if e <= now}
+        if to_cache:
+            try:
+                cache.set_many(to_cache, timeout=CLOSED_BUCKET_TTL)
+            except Exception:
+                pass
+    return totals
@@ -0,0 +1,187 @@
+"""
+Tagged page cache built on top of ``extensions.cache``.
+
+Cached views declare the data they depend on as tags (``product:12``,
+``category:3``, ``banners`` ...). Every tag has a version token stored in the
+cache; a cached entry remembers the versions it was rendered against and is
+treated as a miss as soon as any of them changes. Admin writes therefore call
+``invalidate(...)`` with the tags they touched instead of ``cache.clear()``,
+and only the pages that actually depend on those tags are re-rendered.
+
+Because versions live in the shared cache backend (Redis in production), an
+invalidation in one worker is seen by all workers.
+"""
+import uuid
+from functools import wraps
+from typing import Iterable
+
+from flask import current_app, g
+
+from ..extensions import cache
+
+# Fixed tags used by storefront views and admin mutations
+CATALOG = 'catalog'            # set of active products (creates/deletes)
+CATEGORIES = 'categories'      # category names/slugs shown in nav and filters
+BANNERS = 'banners'
+FLASH_SALES = 'flash_sales'
+DEALS = 'deals'                # old_price/price relationships
+TOP_PICKS = 'top_picks'
+NEW_ARRIVALS = 'new_arrivals'
+DELIVERY_ZONES = 'delivery_zones'
+SETTINGS = 'settings'          # admin_settings.json and announcements.json
+
+# Tags every cached page depends on (site-wide context injected into all templates)
+DEFAULT_TAGS = (SETTINGS, CATEGORIES)
+
+_VERSION_PREFIX = 'tagver:'
+_ENTRY_PREFIX = 'tagged:'
+
+
+def product_tag(product_id) -> str:
+    return f'product:{int(product_id)}'
+
+
+def category_tag(category_id) -> str:
+    return f'category:{int(category_id)}'
+
+
+def _new_version() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def _version_keys(tags: Iterable[str]):
+    return [_VERSION_PREFIX + t for t in tags]
+
+
+def current_versions(tags: Iterable[str]) -> dict:
+    """Return {tag: version} for the given tags, creating versions that are missing."""
+    tags = sorted(set(t for t in tags if t))
+    if not tags:
+        return {}
+    try:
+        values = cache.get_many(*_version_keys(tags))
+    except Exception:
+        return {}
+    versions = {}
+    missing = {}
+    for tag, val in zip(tags, values):
+        if val is None:
+            val = _new_version()
+            missing[_VERSION_PREFIX + tag] = val
+        versions[tag] = val
+    if missing:
+        try:
+            # timeout=0 keeps tag versions until evicted; eviction only causes misses
+            cache.set_many(missing, timeout=0)
+        except Exception:
+            pass
+    return versions
+
+
+def invalidate(*tags) -> None:
+    """Bump the version of each tag so dependent cached pages become stale."""
+    flat = set()
+    for t in tags:
+        if not t:
+            continue
+        if isinstance(t, (list, tuple, set)):
+            flat.update(x for x in t if x)
+        else:
+            flat.add(t)
+    if not flat:
+        return
+    try:
+        cache.set_many({_VERSION_PREFIX + t: _new_version() for t in flat}, timeout=0)
+    except Exception:
+        pass
+
+
+def add_cache_tags(*tags) -> None:
+    """Register extra dependencies for the cached view currently rendering."""
+    bucket = g.get('_cache_tags')
+    if bucket is None:
+        return
+    for t in tags:
+        if t:
+            bucket.add(t)
+
+
+def tag_products(products) -> None:
+    """Register a ``product:<id>`` dependency for every product rendered by the view."""
+    add_cache_tags(*(product_tag(p.id) for p in (products or []) if getattr(p, 'id', None)))
+
+
+def shared_pages_enabled() -> bool:
+    """True when storefront pages are cached once for all users (``SHARED_PAGE_CACHE``)."""
+    try:
+        return bool(current_app.config.get('SHARED_PAGE_CACHE', False))
+    except Exception:
+        return False
+
+
+def _is_fresh(entry) -> bool:
+    versions = entry.get('tags') or {}
+    if not versions:
+        return True
+    tags = list(versions.keys())
+    try:
+        values = cache.get_many(*_version_keys(tags))
+    except Exception:
+        return False
+    return all(val is not None and val == versions[t] for t, val in zip(tags, values))
+
+
+def cached_view(timeout: int = 300, key_prefix=None, tags: Iterable[str] = (), shared: bool = False):
+    """Cache a view's response and tie it to a set of tags.
+
+    ``key_prefix`` may be a string or a callable returning the cache key (e.g.
+    ``shop.routes.make_cache_key``). Static ``tags`` apply to every response;
+    views can add data-dependent tags with ``add_cache_tags``/``tag_products``.
+    Only plain (string) responses are cached so error pages are never stored.
+
+    With ``shared=True`` (and ``SHARED_PAGE_CACHE`` on) the page is rendered as
+    an anonymous visitor would see it and ``g.shared_page`` is set, so one entry
+    serves everyone; the browser fills in the user's navbar, cart count and
+    wishlist from ``/api/session``.
+    """
+    static_tags = tuple(tags)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = key_prefix() if callable(key_prefix) else (key_prefix or func.__name__)
+                key = _ENTRY_PREFIX + str(key)
+            except Exception:
+                return func(*args, **kwargs)
+            try:
+                entry = cache.get(key)
+            except Exception:
+                entry = None
+            if isinstance(entry, dict) and _is_fresh(entry):
+                return entry.get('value')
+
+            initial = set(DEFAULT_TAGS) | set(static_tags)
+            # Snapshot versions before rendering so an invalidation that races the
+            # render leaves the stored entry stale rather than wrongly fresh
+            versions = current_versions(initial)
+            previous = g.get('_cache_tags')
+            g._cache_tags = set(initial)
+            if shared and shared_pages_enabled():
+                g.shared_page = True
+            try:
+                rv = func(*args, **kwargs)
+                collected = g._cache_tags
+            finally:
+                g._cache_tags = previous
+                g.pop('shared_page', None)
+            if isinstance(rv, str):
+                try:
+                    versions.update(current_versions(collected - initial))
+                    cache.set(key, {'tags': versions, 'value': rv}, timeout=timeout)
+                except Exception:
+                    pass
+            return rv
+        return wrapper
+    return decorator
+
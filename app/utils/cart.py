@@ -0,0 +1,98 @@
+"""
+Cart assembly shared by the cart views, the mini cart and checkout.
+
+``load_user_cart`` and ``load_session_cart`` load every line together with
+its product in one query (a joined load for DB carts, one ``IN`` query for
+the guest session cart), and the subtotal and item count are computed from that same result set, so no
+view issues a per-line ``Product`` lookup or a separate ``SUM`` for the
+count. Lines whose product no longer exists are dropped.
+"""
+from sqlalchemy.orm import joinedload
+
+from ..extensions import db
+
+
+class CartLine:
+    __slots__ = ('item', 'product', 'quantity')
+
+    def __init__(self, item, product, quantity):
+        self.item = item            # CartItem, or None for a guest session line
+        self.product = product
+        self.quantity = int(quantity or 0)
+
+    @property
+    def line_total(self):
+        return self.quantity * float(self.product.price or 0)
+
+    def as_dict(self):
+        p = self.product
+        return {
+            "item_id": self.item.id if self.item is not None else None,
+            "product_id": p.id,
+            "name": p.name,
+            "slug": p.slug,
+            "price": float(p.price),
+            "quantity": self.quantity,
+            "image_url": getattr(p, 'image_url', None),
+            "line_total": round(self.line_total, 2),
+        }
+
+
+class Cart:
+    def __init__(self, lines):
+        self.lines = lines
+
+    @property
+    def items(self):
+        """CartItem rows (product already loaded) for templates that iterate items."""
+        return [line.item for line in self.lines if line.item is not None]
+
+    @property
+    def subtotal(self):
+        return sum(line.line_total for line in self.lines)
+
+    @property
+    def count(self):
+        return sum(line.quantity for line in self.lines)
+
+    def line_for(self, item_id=None, product_id=None):
+        for line in self.lines:
+            if item_id is not None and line.item is not None and line.item.id == item_id:
+                return line
+            if product_id is not None and line.product.id == product_id:
+                return line
+        return None
+
+    def as_dict(self):
+        return {
+            "ok": True,
+            "items": [line.as_dict() for line in self.lines],
+            "subtotal": round(self.subtotal, 2),
+            "count": int(self.count),
+        }
+
+
+def load_user_cart(user_id):
+    from ..models import CartItem
+    items = (
+        CartItem.query.options(joinedload(CartItem.product))
+        .filter(CartItem.user_id == user_id)
+        .order_by(CartItem.id)
+        .all()
+    )
+    return Cart([CartLine(i, i.product, i.quantity) for i in items if i.product is not None])
+
+
+def load_session_cart(cart):
+    """Cart for a guest ``session['cart']`` mapping of product id -> quantity."""
+    from ..models import Product
+    wanted = {}
+    for pid, qty in (cart or {}).items():
+        try:
+            wanted[int(pid)] = int(qty)
+        except Exception:
+            continue
+    if not wanted:
+        return Cart([])
+    products = {p.id: p for p in db.session.query(Product).filter(Product.id.in_(list(wanted))).all()}
+    return Cart([CartLine(None, products[pid], qty) for pid, qty in wanted.items() if pid in products])
@@ -0,0 +1,64 @@
+"""
+Per-user cart item counter kept in the cache.
+
+``nav_context`` renders the cart badge on nearly every page, so the count is
+read from ``cart_count:<user_id>`` instead of running ``SUM(quantity)``. Cart
+writes (cart blueprint, checkout, reorder, guest-cart merge on login) call
+``refresh_cart_count`` after committing; a missing key falls back to the DB
+and is repopulated. The TTL only bounds drift from writes made elsewhere
+(e.g. admin deleting products).
+"""
+from ..extensions import db, cache
+
+CART_COUNT_TTL = 3600
+
+
+def _key(user_id):
+    return f'cart_count:{int(user_id)}'
+
+
+def _count_from_db(user_id):
+    from ..models import CartItem
+    return int(
+        db.session.query(db.func.coalesce(db.func.sum(CartItem.quantity), 0))
+        .filter_by(user_id=user_id)
+        .scalar() or 0
+    )
+
+
+def set_cart_count(user_id, count):
+    try:
+        cache.set(_key(user_id), int(count), timeout=CART_COUNT_TTL)
+    except Exception:
+        pass
+    return int(count)
+
+
+def refresh_cart_count(user_id):
+    """Recompute the count from the DB after a cart write and store it."""
+    try:
+        count = _count_from_db(user_id)
+    except Exception:
+        clear_cart_count(user_id)
+        return 0
+    return set_cart_count(user_id, count)
+
+
+def clear_cart_count(user_id):
+    try:
+        cache.delete(_key(user_id))
+    except Exception:
+        pass
+
+
+def get_cart_count(user_id):
+    """Cached count for the user, loading it from the DB on a miss."""
+    if not user_id:
+        return 0
+    try:
+        value = cache.get(_key(user_id))
+    except Exception:
+        value = None
+    if value is not None:
+        return int(value)
+    return refresh_cart_count(user_id)
@@ -0,0 +1,246 @@
+"""
+Catalog change log behind ``/api/catalog/changes``.
+
+Any write to a tracked table appends ``CatalogChange`` rows in the same
+transaction. The tracked tables are products, categories, product_images
+and flash_sales. Two listeners collect the changes:
+
+- ``after_flush`` covers objects added, changed or deleted through the
+  session.
+- ``do_orm_execute`` covers bulk ``UPDATE``/``DELETE`` statements. These
+  include the set-based stock updates and the admin bulk deletes. The
+  listener selects the matching ids with the statement's own ``WHERE``
+  before the statement runs.
+
+A deleted row is logged as a ``delete`` tombstone. The collected rows are
+inserted by a ``before_commit`` hook, so their ids and ``created_at`` are
+taken at commit time, not when the change was flushed.
+
+``changes_since(token)`` folds the log after ``token`` into one entry per
+entity, in change order. An upsert entry carries the row's current columns;
+a delete entry carries only the id. The token it returns is the last change
+id read plus the time it was issued.
+
+Starting from no token returns the whole catalog. This works because the
+migration backfilled one upsert per existing row, and ``compact`` only
+drops superseded rows and tombstones older than
+``CATALOG_CHANGES_RETENTION_DAYS``. When it drops tombstones it appends a
+marker row. A token issued before that marker, and pointing below it,
+might have missed a delete. That token gets ``reset``: the feed restarts
+from zero, and the client drops its local copy first.
+
+A transaction that stays open after flushing (an import downloading
+images, say) therefore cannot commit an id that already looks old. Ids
+still become visible only at commit, so two transactions committing at the
+same moment can land out of order. To cover that, the feed only reads
+changes older than ``CATALOG_CHANGES_SETTLE_SECONDS``.
+"""
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+
+# table name -> entity name used in the feed
+TRACKED = {
+    'products': 'product',
+    'categories': 'category',
+    'product_images': 'product_image',
+    'flash_sales': 'flash_sale',
+}
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_SETTLE_SECONDS = 5
+COMPACTED = '_compacted'  # marker entity written by compact() when tombstones are dropped
+
+
+def _entity(obj):
+    table = getattr(obj, '__tablename__', None)
+    return TRACKED.get(table)
+
+
+def _fields():
+    from ..models import Category, FlashSale, Product, ProductImage
+    return {
+        'product': (Product, ('id', 'name', 'slug', 'description', 'price', 'old_price', 'stock', 'image_url',
+                              'category_id', 'is_active', 'is_top_pick', 'is_new_arrival_featured',
+                              'rating_avg', 'rating_count', 'updated_at')),
+        'category': (Category, ('id', 'name', 'slug', 'parent_id', 'updated_at')),
+        'product_image': (ProductImage, ('id', 'product_id', 'image_url', 'is_primary', 'updated_at')),
+        'flash_sale': (FlashSale, ('id', 'product_id', 'discount_percent', 'original_price', 'starts_at', 'ends_at',
+                                   'quantity_available', 'is_active', 'updated_at')),
+    }
+
+
+def _pending(session):
+    return session.info.setdefault('catalog_changes', [])
+
+
+def _append(connection, rows):
+    if not rows:
+        return
+    from ..models import CatalogChange
+    now = datetime.utcnow()
+    connection.execute(CatalogChange.__table__.insert(), [dict(r, created_at=now) for r in rows])
+
+
+# Recording --------------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    rows = _pending(session)
+    for obj in session.new:
+        if _entity(obj):
+            rows.append({'entity': _entity(obj), 'entity_id': obj.id, 'op': 'upsert'})
+    for obj in session.dirty:
+        # Collection-only changes (e.g. a backref append) don't touch the row
+        if _entity(obj) and session.is_modified(obj, include_collections=False):
+            rows.append({'entity': _entity(obj), 'entity_id': obj.id, 'op': 'upsert'})
+    for obj in session.deleted:
+        if _entity(obj):
+            rows.append({'entity': _entity(obj), 'entity_id': obj.id, 'op': 'delete'})
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_bulk(state):
+    if not (state.is_update or state.is_delete):
+        return
+    mapper = state.bind_mapper
+    entity = TRACKED.get(getattr(getattr(mapper, 'local_table', None), 'name', None))
+    if not entity:
+        return
+    pk = mapper.primary_key[0]
+    select = db.select(pk)
+    if state.statement.whereclause is not None:
+        select = select.where(state.statement.whereclause)
+    ids = state.session.execute(select).scalars().all()
+    op = 'delete' if state.is_delete else 'upsert'
+    _pending(state.session).extend({'entity': entity, 'entity_id': i, 'op': op} for i in ids)
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_pending(session):
+    # The final flush normally runs after this hook; do it first so its changes are included
+    session.flush()
+    rows = session.info.pop('catalog_changes', None)
+    if rows:
+        _append(session.connection(), rows)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_pending(session, transaction):
+    if transaction.parent is None:
+        # Rolled back (a commit has already written and cleared them)
+        session.info.pop('catalog_changes', None)
+
+
+# Reading ----------------------------------------------------------------
+
+def _retention():
+    return timedelta(days=float(current_app.config.get('CATALOG_CHANGES_RETENTION_DAYS') or DEFAULT_RETENTION_DAYS))
+
+
+def make_token(change_id, issued_at=None):
+    return f"{int(change_id)}.{int(issued_at if issued_at is not None else time.time())}"
+
+
+def parse_token(token):
+    """(change_id, issued_at) for a feed token; raises ValueError when malformed."""
+    change_id, _, issued = str(token).partition('.')
+    return int(change_id), int(issued or 0)
+
+
+def _value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def _load(entity, ids):
+    model, fields = _fields()[entity]
+    cols = [getattr(model, f) for f in fields]
+    rows = db.session.query(*cols).filter(model.id.in_(ids)).all()
+    return {r.id: {f: _value(getattr(r, f)) for f in fields} for r in rows}
+
+
+def changes_since(token=None, limit=None):
+    """{'changes': [...], 'next': token, 'has_more': bool, 'reset': bool} for the log after ``token``."""
+    from ..models import CatalogChange
+    limit = min(max(int(limit or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    since, reset = 0, False
+    if token:
+        since, issued = parse_token(token)
+        mark = (
+            db.session.query(CatalogChange.id, CatalogChange.created_at)
+            .filter(CatalogChange.entity == COMPACTED)
+            .order_by(CatalogChange.id.desc())
+            .first()
+        )
+        if mark and since < mark.id and datetime.utcfromtimestamp(issued) < mark.created_at:
+            # A tombstone this client still needed may have been compacted away
+            since, reset = 0, True
+    settle = current_app.config.get('CATALOG_CHANGES_SETTLE_SECONDS')
+    settle = DEFAULT_SETTLE_SECONDS if settle is None else float(settle)
+    rows = (
+        db.session.query(CatalogChange.id, CatalogChange.entity, CatalogChange.entity_id, CatalogChange.op)
+        .filter(CatalogChange.id > since, CatalogChange.created_at <= datetime.utcnow() - timedelta(seconds=settle))
+        .order_by(CatalogChange.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for r in rows:
+        if r.entity == COMPACTED:
+            continue
+        key = (r.entity, r.entity_id)
+        latest.pop(key, None)  # re-insert so entries follow their last change
+        latest[key] = r.op
+    upserts = {}
+    for (entity, entity_id), op in latest.items():
+        if op == 'upsert':
+            upserts.setdefault(entity, []).append(entity_id)
+    loaded = {entity: _load(entity, ids) for entity, ids in upserts.items()}
+    changes = []
+    for (entity, entity_id), op in latest.items():
+        data = loaded.get(entity, {}).get(entity_id) if op == 'upsert' else None
+        if data is None:
+            # Gone by now (its tombstone is further along the log, or it was removed outside the ORM)
+            changes.append({'entity': entity, 'id': entity_id, 'op': 'delete'})
+        else:
+            changes.append({'entity': entity, 'id': entity_id, 'op': 'upsert', 'data': data})
+    return {
+        'changes': changes,
+        'next': make_token(rows[-1].id if rows else since),
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+
+# Housekeeping -----------------------------------------------------------
+
+def compact(now=None):
+    """Drop superseded changes and expired tombstones, then commit; returns rows deleted."""
+    from ..models import CatalogChange
+    now = now or datetime.utcnow()
+    newest = (
+        db.select(db.func.max(CatalogChange.id))
+        .group_by(CatalogChange.entity, CatalogChange.entity_id)
+        .scalar_subquery()
+    )
+    superseded = db.session.execute(
+        db.delete(CatalogChange).where(CatalogChange.id.not_in(newest)).execution_options(synchronize_session=False)
+    ).rowcount
+    expired = db.session.execute(
+        db.delete(CatalogChange)
+        .where(CatalogChange.op == 'delete', CatalogChange.created_at < now - _retention())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if expired:
+        # Older markers are superseded by this one on the next run
+        db.session.add(CatalogChange(entity=COMPACTED, entity_id=0, op='mark', created_at=now))
+    db.session.commit()
+    return superseded + expired
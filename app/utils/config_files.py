@@ -0,0 +1,110 @@
+"""
+Cached access to the JSON files admins edit at runtime (``instance/``).
+
+``announcements.json`` is read on every template render and
+``admin_settings.json`` on several admin paths. ``load_json`` keeps the parsed
+content per process and stats the file at most once every
+``CONFIG_FILE_CHECK_SECONDS``; the file is only re-parsed when its mtime or
+size changes. Because every worker checks the file itself, a change saved
+through one gunicorn worker reaches the others within that interval, and
+``sync_admin_settings`` re-applies the settings onto ``app.config``, so no
+restart is needed.
+
+Values returned by ``load_json`` are shared between requests; copy before
+mutating (``read_admin_settings`` already returns a copy).
+"""
+import json
+import os
+import threading
+import time
+
+from flask import current_app
+
+ANNOUNCEMENTS_FILE = 'announcements.json'
+ADMIN_SETTINGS_FILE = 'admin_settings.json'
+DEFAULT_CHECK_SECONDS = 5
+
+_entries = {}   # path -> {'stamp': (mtime_ns, size) | None, 'checked': monotonic, 'data': parsed}
+_lock = threading.Lock()
+
+
+def _check_seconds():
+    try:
+        return float(current_app.config.get('CONFIG_FILE_CHECK_SECONDS', DEFAULT_CHECK_SECONDS))
+    except Exception:
+        return DEFAULT_CHECK_SECONDS
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def instance_file(name, app=None):
+    app = app or current_app
+    return os.path.join(app.instance_path, name)
+
+
+def load_json(path, default=None, check_seconds=None):
+    """Parsed JSON content of ``path`` (``default`` if missing or unreadable)."""
+    now = time.monotonic()
+    interval = _check_seconds() if check_seconds is None else check_seconds
+    entry = _entries.get(path)
+    if entry is not None and now - entry['checked'] < interval:
+        return default if entry['data'] is None else entry['data']
+    stamp = _stamp(path)
+    with _lock:
+        entry = _entries.get(path)
+        if entry is not None and entry['stamp'] == stamp:
+            entry['checked'] = now
+        else:
+            data = None
+            if stamp is not None:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except Exception:
+                    # Keep the last good copy if the file is mid-write or corrupt
+                    data = entry['data'] if entry else None
+            entry = {'stamp': stamp, 'checked': now, 'data': data}
+            _entries[path] = entry
+    return default if entry['data'] is None else entry['data']
+
+
+def write_json(path, data):
+    """Atomically replace ``path`` and refresh this process's cached copy."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    with _lock:
+        _entries[path] = {'stamp': _stamp(path), 'checked': time.monotonic(), 'data': data}
+
+
+def read_announcements(default):
+    data = load_json(instance_file(ANNOUNCEMENTS_FILE))
+    if isinstance(data, list):
+        msgs = [str(x) for x in data if str(x).strip()]
+        if msgs:
+            return msgs
+    return default
+
+
+def read_admin_settings():
+    data = load_json(instance_file(ADMIN_SETTINGS_FILE))
+    return dict(data) if isinstance(data, dict) else {}
+
+
+def sync_admin_settings(app):
+    """Flatten admin_settings.json onto app.config if its content changed; True if applied."""
+    data = load_json(instance_file(ADMIN_SETTINGS_FILE, app))
+    if not isinstance(data, dict) or app.extensions.get('admin_settings_applied') is data:
+        return False
+    for k, v in data.items():
+        app.config[str(k).upper()] = v
+    app.extensions['admin_settings_applied'] = data
+    return True
@@ -0,0 +1,159 @@
+"""
+Database engine profiles, chosen with ``DB_ENGINE_PROFILE``.
+
+- ``postgres`` uses a QueuePool of ``DB_POOL_SIZE`` connections, plus up to
+  ``DB_MAX_OVERFLOW`` more under bursts. Connections are pinged on checkout
+  and recycled after ``DB_POOL_RECYCLE`` seconds.
+  ``idle_in_transaction_session_timeout`` and, when
+  ``DB_STATEMENT_TIMEOUT_MS`` is set, ``statement_timeout`` go in as
+  startup options, so the server cancels a runaway query instead of letting
+  it hold a connection. The statement timeout is off by default because it
+  also covers ``flask db upgrade``, rollup rebuilds and exports.
+- ``pgbouncer`` targets PgBouncer in transaction mode. PgBouncer owns the
+  pool, so the app opens connections with NullPool. PgBouncer rejects
+  startup options, and a session ``SET`` would leak to other clients. The
+  statement timeout is therefore applied with ``SET LOCAL`` at the start of
+  each transaction. Set it on the role instead (``ALTER ROLE ... SET
+  statement_timeout``) and ``DB_STATEMENT_TIMEOUT_MS=0`` to save the round
+  trip. Prepared statements are turned off for the drivers that use them
+  (psycopg 3, asyncpg).
+- ``sqlite`` sets pragmas on every new connection:
+  - ``busy_timeout``: a second writer waits instead of failing with
+    "database is locked".
+  - WAL journal: readers keep going while a write commits.
+  - ``synchronous=NORMAL``: safe under WAL, and skips an fsync per commit.
+  - ``mmap_size``: reads come from the page cache.
+- ``default`` keeps the driver and SQLAlchemy defaults.
+
+``auto`` (the default) picks ``postgres`` or ``sqlite`` from the database URL
+and ``default`` for anything else.
+
+The Dockerfile runs one eventlet worker, so a single process and a single
+pool serve every greenlet. ``DB_POOL_SIZE`` + ``DB_MAX_OVERFLOW`` is
+therefore the number of queries the whole container can run at once.
+psycopg2 only yields to other greenlets once psycogreen has patched it.
+``install`` does that when eventlet is active and psycogreen is installed.
+
+``python -m scripts.bench_db_profiles`` measures each profile's throughput
+under eventlet.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from ..extensions import db
+
+PROFILES = ('postgres', 'pgbouncer', 'sqlite', 'default')
+
+
+def _dialect(url):
+    try:
+        return make_url(url).get_backend_name()
+    except Exception:
+        return ''
+
+
+def resolve_profile(config, url=None):
+    """The engine profile for ``config`` (``url`` defaults to SQLALCHEMY_DATABASE_URI)."""
+    url = url or config.get('SQLALCHEMY_DATABASE_URI') or ''
+    profile = str(config.get('DB_ENGINE_PROFILE') or 'auto').lower()
+    if profile in PROFILES:
+        return profile
+    return {'postgresql': 'postgres', 'sqlite': 'sqlite'}.get(_dialect(url), 'default')
+
+
+def _pg_options(config):
+    parts = []
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        parts.append(f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT_MS'])}")
+    if config.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS'):
+        parts.append(f"-c idle_in_transaction_session_timeout={int(config['DB_IDLE_IN_TRANSACTION_TIMEOUT_MS'])}")
+    return ' '.join(parts)
+
+
+def engine_options(config, profile=None, url=None):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for ``profile`` (resolved from ``config`` when omitted)."""
+    url = url or config.get('SQLALCHEMY_DATABASE_URI') or ''
+    profile = profile or resolve_profile(config, url)
+    if profile == 'postgres':
+        options = {
+            'pool_size': int(config.get('DB_POOL_SIZE') or 10),
+            'max_overflow': int(config.get('DB_MAX_OVERFLOW') or 0),
+            'pool_timeout': float(config.get('DB_POOL_TIMEOUT') or 10),
+            'pool_recycle': int(config.get('DB_POOL_RECYCLE') or -1),
+            'pool_pre_ping': True,
+            # Reuse the warmest connection so idle extras age out under pool_recycle
+            'pool_use_lifo': True,
+        }
+        pg = _pg_options(config)
+        if pg:
+            options['connect_args'] = {'options': pg}
+        return options
+    if profile == 'pgbouncer':
+        options = {'poolclass': NullPool}
+        driver = ''
+        try:
+            driver = make_url(url).get_driver_name()
+        except Exception:
+            pass
+        if driver == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': None}
+        elif driver == 'asyncpg':
+            options['connect_args'] = {'prepared_statement_cache_size': 0, 'statement_cache_size': 0}
+        return options
+    # sqlite is configured by pragmas on connect (see install); pooling stays as SQLAlchemy picks it
+    return {}
+
+
+def sqlite_pragmas(config):
+    """(name, value) pragmas run on each new SQLite connection; busy_timeout first so WAL can wait for a lock."""
+    return [
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS') or 0)),
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE') or 0)),
+    ]
+
+
+def _patch_psycopg2():
+    # psycopg2 blocks the eventlet hub unless its wait callback is made cooperative
+    try:
+        from eventlet import patcher
+        if not patcher.is_monkey_patched('socket'):
+            return
+        from psycogreen.eventlet import patch_psycopg
+        patch_psycopg()
+    except Exception:
+        pass
+
+
+def attach(engine, config, profile):
+    """Register ``profile``'s connection/transaction listeners on ``engine``."""
+    dialect = engine.dialect.name
+    if profile == 'sqlite' and dialect == 'sqlite':
+        pragmas = sqlite_pragmas(config)
+
+        @event.listens_for(engine, 'connect')
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas:
+                    cursor.execute(f'PRAGMA {name}={value}')
+            finally:
+                cursor.close()
+    elif profile in ('postgres', 'pgbouncer') and dialect == 'postgresql':
+        if engine.dialect.driver == 'psycopg2':
+            _patch_psycopg2()
+        timeout = int(config.get('DB_STATEMENT_TIMEOUT_MS') or 0)
+        if profile == 'pgbouncer' and timeout:
+            @event.listens_for(engine, 'begin')
+            def _statement_timeout(conn):
+                conn.exec_driver_sql(f'SET LOCAL statement_timeout = {timeout}')
+
+
+def install(app):
+    """Attach the configured profile's listeners to every engine of ``app``."""
+    profile = resolve_profile(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            attach(engine, app.config, profile)
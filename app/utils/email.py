@@ -1,16 +1,228 @@
+"""
+SMTP mail transport.
+
+Connections are pooled per SMTP account: a send borrows an already
+logged-in session instead of connecting, running STARTTLS and logging in
+again. A session that has been idle longer than ``SMTP_IDLE_CHECK_SECONDS``
+is checked with ``NOOP`` before reuse. One idle longer than
+``SMTP_MAX_IDLE_SECONDS``, or one that errors, is closed and replaced. At most
+``SMTP_POOL_SIZE`` idle sessions are kept per account.
+
+``send_many`` pushes any number of messages through one borrowed session and
+reconnects once if the server drops it midway. ``send_email_html_async`` /
+``send_many_async`` hand the work to the Celery tasks in ``app.tasks`` when a
+broker is configured and send in-process otherwise.
+"""
+import logging
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from flask import current_app
 import re
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple
 
 _EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
+DEFAULT_POOL_SIZE = 4
+DEFAULT_IDLE_CHECK_SECONDS = 30
+DEFAULT_MAX_IDLE_SECONDS = 300
+DEFAULT_TIMEOUT = 10
+
+log = logging.getLogger(__name__)
+
+
 def _is_valid_email(email: Optional[str]) -> bool:
     if not email or not isinstance(email, str):
         return False
     return bool(_EMAIL_REGEX.match(email))
 
+
+def _settings():
+    cfg = current_app.config
+    return {
+        'host': cfg.get('SMTP_HOST'),
+        'username': cfg.get('SMTP_USERNAME'),
+        'password': cfg.get('SMTP_PASSWORD'),
+        'port': int(cfg.get('SMTP_PORT') or 587),
+        'sender': cfg.get('SMTP_SENDER'),
+        'timeout': float(cfg.get('SMTP_TIMEOUT') or DEFAULT_TIMEOUT),
+        'pool_size': int(cfg.get('SMTP_POOL_SIZE') or DEFAULT_POOL_SIZE),
+        'idle_check': float(cfg.get('SMTP_IDLE_CHECK_SECONDS') or DEFAULT_IDLE_CHECK_SECONDS),
+        'max_idle': float(cfg.get('SMTP_MAX_IDLE_SECONDS') or DEFAULT_MAX_IDLE_SECONDS),
+    }
+
+
+def _connect(s):
+    if s['port'] == 465:
+        # SMTP over SSL
+        server = smtplib.SMTP_SSL(s['host'], s['port'], timeout=s['timeout'])
+    else:
+        # SMTP with STARTTLS
+        server = smtplib.SMTP(s['host'], s['port'], timeout=s['timeout'])
+        server.ehlo()
+        if server.has_extn('STARTTLS'):
+            server.starttls()
+            server.ehlo()
+    try:
+        server.login(s['username'], s['password'])
+    except Exception:
+        _close(server)
+        raise
+    return server
+
+
+def _close(server):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+class SMTPPool:
+    """Idle, logged-in SMTP sessions for one account, shared by the threads of a process."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._idle = []  # (server, last_used)
+        self._lock = threading.Lock()
+
+    def _take(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                server, last_used = self._idle.pop()
+            idle = now - last_used
+            if idle > self.settings['max_idle']:
+                _close(server)
+                continue
+            if idle > self.settings['idle_check']:
+                try:
+                    if server.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected('NOOP failed')
+                except Exception:
+                    _close(server)
+                    continue
+            return server
+
+    def _give_back(self, server):
+        with self._lock:
+            if len(self._idle) < self.settings['pool_size']:
+                self._idle.append((server, time.monotonic()))
+                return
+        _close(server)
+
+    @contextmanager
+    def connection(self):
+        server = self._take() or _connect(self.settings)
+        try:
+            yield server
+        except Exception:
+            # Leave no half-broken session in the pool
+            _close(server)
+            raise
+        self._give_back(server)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _close(server)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(s) -> SMTPPool:
+    key = (s['host'], s['port'], s['username'], s['password'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPPool(s)
+        return pool
+
+
+def close_pools():
+    """Close every pooled SMTP session (worker shutdown, tests)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def _build_message(sender: str, to: str, subject: str, html: str) -> MIMEText:
+    msg = MIMEText(html, 'html', 'utf-8')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = to
+    return msg
+
+
+def _plain_to_html(body: str) -> str:
+    # Convert newlines in plain text to basic <br/> for HTML rendering
+    escaped = body.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return "<html><body>" + escaped.replace("\n", "<br/>") + "</body></html>"
+
+
+def _session_lost(exc) -> bool:
+    """Whether ``exc`` means the SMTP session is unusable (vs. one message being refused)."""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code == 421  # server is closing the channel
+    # Socket errors; SMTPException subclasses OSError but is handled above or is per-message
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+def send_many(messages: Iterable[Tuple[str, str, str]]) -> List[bool]:
+    """
+    Sends many HTML emails over one pooled SMTP session.
+
+    Parameters:
+        messages: iterable of (to, subject, html) tuples.
+
+    Returns:
+        list of bool: one result per message, in order. A message the server
+        refuses only fails itself; a dropped connection is re-opened once.
+    """
+    messages = list(messages)
+    results = [False] * len(messages)
+    s = _settings()
+    if not all([s['host'], s['username'], s['password'], s['sender']]) or not _is_valid_email(s['sender']):
+        return results
+    todo = [i for i, (to, _, _) in enumerate(messages) if _is_valid_email(to)]
+    pool = _pool(s)
+    for attempt in range(2):
+        if not todo:
+            break
+        try:
+            with pool.connection() as server:
+                while todo:
+                    i = todo[0]
+                    to, subject, html = messages[i]
+                    try:
+                        server.send_message(_build_message(s['sender'], to, subject, html))
+                        results[i] = True
+                    except Exception as e:
+                        if _session_lost(e):
+                            raise
+                        # Only this message was refused (recipient, sender, data, SMTPUTF8, encoding)
+                        log.warning('SMTP rejected message to %s: %s', to, e)
+                        server.rset()
+                    todo.pop(0)
+        except Exception:
+            log.warning('SMTP session failed with %s message(s) left (attempt %s)', len(todo), attempt + 1, exc_info=True)
+    return results
+
+
 def _send_email_html_sync(to: str, subject: str, html: str) -> bool:
     """
     Sends an HTML email synchronously using SMTP settings configured in Flask current_app.
@@ -23,42 +235,16 @@ def _send_email_html_sync(to: str, subject: str, html: str) -> bool:
     Returns:
         bool: True if email sent successfully, False otherwise.
     """
-    host = current_app.config.get('SMTP_HOST')
-    username = current_app.config.get('SMTP_USERNAME')
-    password = current_app.config.get('SMTP_PASSWORD')
-    port = int(current_app.config.get('SMTP_PORT') or 587)
-    sender = current_app.config.get('SMTP_SENDER')
-
-    if not all([host, username, password, to, sender]):
-        return False
-
-    if not (_is_valid_email(to) and _is_valid_email(sender)):
+    if not to:
         return False
+    return send_many([(to, subject, html)])[0]
 
-    msg = MIMEText(html, 'html', 'utf-8')
-    msg['Subject'] = subject
-    msg['From'] = sender
-    msg['To'] = to
 
-    try:
-        if port == 465:
-            # SMTP over SSL
-            with smtplib.SMTP_SSL(host, port, timeout=10) as server:
-                server.login(username, password)
-                server.send_message(msg)
-        else:
-            # SMTP with STARTTLS
-            with smtplib.SMTP(host, port, timeout=10) as server:
-                server.ehlo()
-                if server.has_extn('STARTTLS'):
-                    server.starttls()
-                    server.ehlo()
-                server.login(username, password)
-                server.send_message(msg)
-        return True
-    except Exception:
-        # Silently fail as per user request
+def _send_email_sync(to: str, subject: str, body: str) -> bool:
+    """Plain-text counterpart of `_send_email_html_sync` (used by the Celery task)."""
+    if not body:
         return False
+    return _send_email_html_sync(to, subject, _plain_to_html(body))
 
 
 def send_email_html(to: str, subject: str, html: str) -> bool:
@@ -91,9 +277,56 @@ def send_email(to: str, subject: str, body: str) -> bool:
     Returns:
         bool: True if email send was successful, False otherwise
     """
-    if not body:
-        return False
-    # Convert newlines in plain text to basic <br/> for HTML rendering
-    escaped = body.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-    html = "<html><body>" + escaped.replace("\n", "<br/>") + "</body></html>"
+    return _send_email_sync(to, subject, body)
+
+
+def _celery_task(name):
+    """The registered Celery task from app.tasks, or None without a broker."""
+    if not current_app.config.get('CELERY_BROKER_URL'):
+        return None
+    from .. import tasks
+    task = getattr(tasks, name, None)
+    return task if hasattr(task, 'delay') else None
+
+
+def send_email_html_async(to: str, subject: str, html: str) -> bool:
+    """
+    Queues an HTML email on the Celery worker when one is configured,
+    otherwise sends it in-process.
+
+    Returns:
+        bool: True if the email was queued or sent.
+    """
+    task = _celery_task('send_email_html_task')
+    if task is not None:
+        try:
+            task.delay(to, subject, html)
+            return True
+        except Exception:
+            log.warning('Could not queue email; sending inline', exc_info=True)
     return _send_email_html_sync(to, subject, html)
+
+
+def send_many_async(messages: Iterable[Tuple[str, str, str]], chunk_size: int = 200) -> int:
+    """
+    Queues (to, subject, html) messages in chunks of ``chunk_size`` for the
+    Celery worker; each chunk is sent over one pooled session. Without a
+    broker the messages are sent in-process.
+
+    Returns:
+        int: number of messages queued (or sent, when in-process).
+    """
+    messages = [tuple(m) for m in messages]
+    task = _celery_task('send_many_task')
+    queued = 0
+    if task is not None:
+        try:
+            for start in range(0, len(messages), chunk_size):
+                task.delay([list(m) for m in messages[start:start + chunk_size]])
+                queued = min(start + chunk_size, len(messages))
+            return queued
+        except Exception:
+            # Chunks already queued will be sent by the worker; only the rest goes inline
+            log.warning('Could not queue bulk email after %s of %s messages; sending the rest inline',
+                        queued, len(messages), exc_info=True)
+    return queued + sum(send_many(messages[queued:]))
@@ -0,0 +1,271 @@
+"""
+Keyset (cursor) pagination for listings.
+
+``paginate(query, keys, cursor)`` orders ``query`` by ``keys``. The keys end
+in a unique column, usually ``(created_at, id)`` or ``(price, id)``. The query
+then seeks past the previous page's boundary row with a ``WHERE`` on those
+keys instead of an ``OFFSET``, so page 500 reads as few rows as page 1.
+
+Cursors are opaque URL-safe tokens. Each one carries:
+
+- the boundary row's key values;
+- the direction (next/prev);
+- the page number, for display;
+- the total counted on the first page.
+
+Deeper pages therefore never run ``COUNT`` again. A cursor that doesn't
+decode, or was made for another sort, falls back to the first page.
+
+The first-page total comes from ``approx_count``. It is an exact count capped
+at ``PAGINATION_COUNT_CAP`` rows. Past the cap it is the planner's estimate
+on PostgreSQL, or "cap+" elsewhere.
+
+Orderings that can't be written as keys use ``paginate_offset``. These are
+search relevance and the joined sales stats. It returns the same ``Page``,
+with the offset carried in the cursor.
+"""
+import base64
+import hashlib
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+
+from ..extensions import db
+
+DEFAULT_COUNT_CAP = 1000
+
+
+class Key:
+    """One sort key: a mapped column, its direction, and a stand-in for NULLs."""
+
+    def __init__(self, column, desc=False, null=None):
+        self.column = column
+        self.desc = desc
+        self.null = null
+        # The stand-in is rendered inline so the expression can match an index on it
+        self.expr = db.func.coalesce(column, db.literal(null, literal_execute=True)) if null is not None else column
+
+    def value(self, item):
+        v = getattr(item, self.column.key)
+        return self.null if v is None else v
+
+    def order(self, reverse=False):
+        return self.expr.asc() if self.desc == reverse else self.expr.desc()
+
+    def __repr__(self):
+        return f"{self.column}{' desc' if self.desc else ''}"
+
+
+def newest_first(model):
+    """``(created_at, id)`` descending, the default order of most listings (created_at is NOT NULL there)."""
+    return [Key(model.created_at, desc=True), Key(model.id, desc=True)]
+
+
+class Page:
+    """One page of results plus the cursors around it; templates read it like a Pagination."""
+
+    def __init__(self, items, per_page, page=1, total=None, total_exact=True,
+                 next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.page = page
+        self.total = total
+        self.total_exact = total_exact
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def pages(self):
+        if not self.total:
+            return self.page
+        return max(self.page, math.ceil(self.total / self.per_page))
+
+    @property
+    def total_label(self):
+        if self.total is None:
+            return ''
+        return f"{self.total:,}" if self.total_exact else f"{self.total:,}+"
+
+    @property
+    def first_index(self):
+        return (self.page - 1) * self.per_page + 1 if self.items else 0
+
+
+# Cursor encoding --------------------------------------------------------
+
+def _dump(v):
+    if isinstance(v, datetime):
+        return {'dt': v.isoformat()}
+    if isinstance(v, date):
+        return {'d': v.isoformat()}
+    if isinstance(v, Decimal):
+        return {'dec': str(v)}
+    return v
+
+
+def _load(v):
+    if isinstance(v, dict):
+        if 'dt' in v:
+            return datetime.fromisoformat(v['dt'])
+        if 'd' in v:
+            return date.fromisoformat(v['d'])
+        if 'dec' in v:
+            return Decimal(v['dec'])
+        raise ValueError(v)
+    return v
+
+
+def _signature(spec):
+    return hashlib.sha1(repr(spec).encode()).hexdigest()[:8]
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(token, spec):
+    """Payload dict for ``token``, or None when it is missing, malformed or for another sort."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        if payload.get('s') != _signature(spec):
+            return None
+        if 'k' in payload:
+            payload['k'] = [_load(v) for v in payload['k']]
+        return payload
+    except Exception:
+        return None
+
+
+# Counting ---------------------------------------------------------------
+
+def _planner_rows(query):
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    plan = db.session.execute(db.text('EXPLAIN (FORMAT JSON) ' + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def approx_count(query, cap=None):
+    """(count, exact): exact up to ``cap`` rows, then an estimate (PostgreSQL) or ``cap``."""
+    cap = cap or int(current_app.config.get('PAGINATION_COUNT_CAP') or DEFAULT_COUNT_CAP)
+    bare = query.order_by(None)
+    n = db.session.query(db.func.count()).select_from(bare.limit(cap + 1).subquery()).scalar() or 0
+    if n <= cap:
+        return n, True
+    if db.engine.dialect.name == 'postgresql':
+        try:
+            return max(cap, _planner_rows(bare)), False
+        except Exception:
+            pass
+    return cap, False
+
+
+# Paginating -------------------------------------------------------------
+
+def _seek(keys, values, reverse):
+    """WHERE clause selecting the rows after ``values`` in key order (before, when reversing)."""
+    def past(key, v):
+        forward = key.desc == reverse
+        return key.expr > v if forward else key.expr < v
+
+    if len({k.desc for k in keys}) == 1:
+        # Same direction throughout: one row-value comparison the index can seek on
+        row, bound = db.tuple_(*[k.expr for k in keys]), db.tuple_(*[db.literal(v) for v in values])
+        return row > bound if keys[0].desc == reverse else row < bound
+    clauses = []
+    for i, key in enumerate(keys):
+        equal = [k.expr == v for k, v in zip(keys[:i], values[:i])]
+        clauses.append(db.and_(*equal, past(key, values[i])))
+    return db.or_(*clauses)
+
+
+def _first_state(query, count):
+    total, exact = approx_count(query) if count else (None, True)
+    return {'p': 1, 't': total, 'x': exact}
+
+
+def _page_query(query, keys, state, per_page):
+    reverse = state.get('d') == 'p'
+    q = query.order_by(*[k.order(reverse) for k in keys])
+    if state.get('k'):
+        q = q.filter(_seek(keys, state['k'], reverse))
+    return q.limit(per_page + 1)
+
+
+def page_query(query, keys, cursor=None, per_page=12):
+    """The query ``paginate`` runs for the page at ``cursor`` (for plan checks)."""
+    keys = list(keys)
+    return _page_query(query, keys, decode_cursor(cursor, keys) or {}, per_page)
+
+
+def make_cursor(keys, values, direction='n', page=2, total=None, exact=True):
+    """Cursor for the page after (``'n'``) or before (``'p'``) a row with key ``values``."""
+    return encode_cursor({
+        's': _signature(list(keys)), 'k': [_dump(v) for v in values], 'd': direction,
+        'p': page, 't': total, 'x': exact,
+    })
+
+
+def paginate(query, keys, cursor=None, per_page=12, count=True):
+    """A ``Page`` of ``query`` ordered by ``keys`` (the last must be unique), seeking from ``cursor``."""
+    keys = list(keys)
+    state = decode_cursor(cursor, keys)
+    if not state or 'k' not in state:
+        state = _first_state(query, count)
+    reverse = state.get('d') == 'p'
+    rows = _page_query(query, keys, state, per_page).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+    page = state.get('p', 1)
+
+    def token(item, direction, number):
+        return make_cursor(keys, [k.value(item) for k in keys], direction, number,
+                           state.get('t'), state.get('x', True))
+
+    has_next = more if not reverse else True
+    has_prev = (more if reverse else bool(state.get('k'))) and page > 1
+    return Page(
+        rows, per_page, page=page, total=state.get('t'), total_exact=state.get('x', True),
+        next_cursor=token(rows[-1], 'n', page + 1) if rows and has_next else None,
+        prev_cursor=token(rows[0], 'p', page - 1) if rows and has_prev else None,
+    )
+
+
+def paginate_offset(query, cursor=None, per_page=12, count=True, spec='offset'):
+    """Same ``Page`` and cursors for an already-ordered query that keys can't express."""
+    state = decode_cursor(cursor, spec)
+    if not state or 'o' not in state:
+        state = dict(_first_state(query, count), o=0)
+    offset = max(0, int(state['o']))
+    rows = query.offset(offset).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    sig = _signature(spec)
+    page = offset // per_page + 1
+
+    def token(at):
+        return encode_cursor({'s': sig, 'o': at, 'p': at // per_page + 1, 't': state.get('t'), 'x': state.get('x', True)})
+
+    return Page(
+        rows, per_page, page=page, total=state.get('t'), total_exact=state.get('x', True),
+        next_cursor=token(offset + per_page) if more else None,
+        prev_cursor=token(max(0, offset - per_page)) if offset else None,
+    )
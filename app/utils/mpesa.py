@@ -0,0 +1,278 @@
+"""
+Daraja (M-Pesa) API client.
+
+All calls go through one pooled ``requests.Session`` per process, so
+OAuth, STK push and STK query reuse keep-alive TLS connections.
+
+The OAuth token is held in process memory and mirrored to the app cache for
+other workers. ``access_token`` returns it without I/O while it is fresh.
+Inside the last ``MPESA_TOKEN_REFRESH_AHEAD`` seconds of its life it still
+returns the current token and starts a single background refresh. Only a
+missing or expired token blocks, and then a lock makes one caller fetch it
+while the others wait for that result instead of all hitting Daraja.
+
+``run_stk_push`` performs the push for a pending ``Payment`` and publishes the
+result on Socket.IO (``payment.status`` to ``user_<id>``).
+``payments.start_mpesa`` runs it on the Celery worker when a broker is
+configured, so the checkout redirect does not wait for Safaricom.
+"""
+import base64
+import logging
+import threading
+import time
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from ..extensions import cache, db
+from . import reservations
+
+TOKEN_CACHE_KEY = 'mpesa_access_token'
+DEFAULT_REFRESH_AHEAD = 300
+DEFAULT_TOKEN_TTL = 3599  # Daraja tokens live an hour
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 15
+
+log = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+_token = {}  # key -> (token, expires_at epoch seconds)
+_token_lock = threading.Lock()
+_refreshing = set()
+
+
+def settings():
+    cfg = current_app.config
+    return {
+        'base_url': (cfg.get('MPESA_BASE_URL') or '').rstrip('/'),
+        'key': cfg.get('MPESA_CONSUMER_KEY'),
+        'secret': cfg.get('MPESA_CONSUMER_SECRET'),
+        'short_code': cfg.get('MPESA_SHORT_CODE'),
+        'passkey': cfg.get('MPESA_PASSKEY'),
+        'callback_url': cfg.get('MPESA_CALLBACK_URL'),
+        'till_number': cfg.get('MPESA_TILL_NUMBER'),
+        'tx_type': cfg.get('MPESA_TRANSACTION_TYPE') or 'CustomerPayBillOnline',
+        'refresh_ahead': float(cfg.get('MPESA_TOKEN_REFRESH_AHEAD') or DEFAULT_REFRESH_AHEAD),
+    }
+
+
+def is_configured(s=None):
+    s = s or settings()
+    return bool(s['base_url'] and s['key'] and s['secret'] and s['short_code'] and s['passkey'] and s['callback_url'])
+
+
+def session():
+    """The process-wide keep-alive session for Daraja."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=int(current_app.config.get('MPESA_HTTP_POOL_SIZE') or 10))
+            sess.mount('https://', adapter)
+            sess.mount('http://', adapter)
+            _session = sess
+        return _session
+
+
+def _fetch_token(sess, base_url, key, secret):
+    """(token, expires_at) straight from Daraja, or None."""
+    resp = sess.get(
+        f"{base_url}/oauth/v1/generate?grant_type=client_credentials",
+        auth=(key, secret), timeout=(CONNECT_TIMEOUT, 10)
+    )
+    if resp is None or not resp.ok:
+        return None
+    data = resp.json()
+    token = data.get('access_token')
+    if not token:
+        return None
+    try:
+        ttl = int(data.get('expires_in') or DEFAULT_TOKEN_TTL)
+    except Exception:
+        ttl = DEFAULT_TOKEN_TTL
+    return token, time.time() + ttl
+
+
+def _store(key, entry):
+    _token[key] = entry
+    try:
+        cache.set(TOKEN_CACHE_KEY, {'key': key[1], 'token': entry[0], 'expires_at': entry[1]}, timeout=max(1, int(entry[1] - time.time())))
+    except Exception:
+        pass
+
+
+def _cached(key):
+    entry = _token.get(key)
+    if entry:
+        return entry
+    try:
+        shared = cache.get(TOKEN_CACHE_KEY)
+    except Exception:
+        shared = None
+    if isinstance(shared, dict) and shared.get('key') == key[1] and shared.get('token'):
+        entry = (shared['token'], float(shared.get('expires_at') or 0))
+        _token[key] = entry
+        return entry
+    return None
+
+
+def _refresh_in_background(key, sess, base_url, secret):
+    with _token_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            entry = _fetch_token(sess, base_url, key[1], secret)
+            if entry:
+                # Process-local only: no app context here for the shared cache
+                _token[key] = entry
+        except Exception:
+            log.warning('Background M-Pesa token refresh failed', exc_info=True)
+        finally:
+            with _token_lock:
+                _refreshing.discard(key)
+    threading.Thread(target=run, name='mpesa-token', daemon=True).start()
+
+
+def access_token(s=None):
+    s = s or settings()
+    if not (s['base_url'] and s['key'] and s['secret']):
+        return None
+    key = (s['base_url'], s['key'])
+    now = time.time()
+    entry = _cached(key)
+    if entry and entry[1] > now:
+        if entry[1] - now < s['refresh_ahead']:
+            _refresh_in_background(key, session(), s['base_url'], s['secret'])
+        return entry[0]
+    # Missing or expired: one caller fetches, the rest wait on the lock and reuse its result
+    with _token_lock:
+        entry = _token.get(key)
+        if entry and entry[1] > time.time():
+            return entry[0]
+        try:
+            entry = _fetch_token(session(), s['base_url'], s['key'], s['secret'])
+        except Exception:
+            log.warning('M-Pesa token request failed', exc_info=True)
+            entry = None
+        if not entry:
+            return None
+        _store(key, entry)
+        return entry[0]
+
+
+def reset():
+    """Forget the pooled session and cached tokens (tests, credential changes)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            try:
+                _session.close()
+            except Exception:
+                pass
+        _session = None
+    _token.clear()
+    try:
+        cache.delete(TOKEN_CACHE_KEY)
+    except Exception:
+        pass
+
+
+def stk_password(short_code: str, passkey: str, timestamp: str) -> str:
+    raw = f"{short_code}{passkey}{timestamp}".encode("utf-8")
+    return base64.b64encode(raw).decode("utf-8")
+
+
+def _post(s, path, payload):
+    token = access_token(s)
+    if not token:
+        return None, {}
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    resp = session().post(f"{s['base_url']}{path}", headers=headers, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    try:
+        data = resp.json() if resp.content else {}
+    except Exception:
+        data = {}
+    return resp, data
+
+
+def stk_push(order_id, amount, phone, s=None):
+    """Send the STK prompt; returns (ok, response data)."""
+    s = s or settings()
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    # Choose PartyB and transaction type
+    use_till = bool(s['till_number']) and s['tx_type'] == "CustomerBuyGoodsOnline"
+    payload = {
+        "BusinessShortCode": s['short_code'],
+        "Password": stk_password(s['short_code'], s['passkey'], timestamp),
+        "Timestamp": timestamp,
+        "TransactionType": s['tx_type'],
+        "Amount": int(float(amount)),
+        "PartyA": phone,
+        "PartyB": s['till_number'] if use_till else s['short_code'],
+        "PhoneNumber": phone,
+        "CallBackURL": s['callback_url'],
+        "AccountReference": str(order_id),
+        "TransactionDesc": f"Order {order_id} payment",
+    }
+    resp, data = _post(s, '/mpesa/stkpush/v1/processrequest', payload)
+    return bool(resp is not None and resp.ok and data.get("ResponseCode") == "0"), data
+
+
+def stk_query(checkout_request_id, s=None):
+    """Ask Daraja for the outcome of an STK push; returns the response data ({} on failure)."""
+    s = s or settings()
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    payload = {
+        "BusinessShortCode": s['short_code'],
+        "Password": stk_password(s['short_code'], s['passkey'], timestamp),
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id,
+    }
+    resp, data = _post(s, '/mpesa/stkpushquery/v1/query', payload)
+    return data if resp is not None else {}
+
+
+def emit_payment_status(payment, message=None):
+    from ..extensions import socketio
+    try:
+        order = payment.order
+        if order and order.user_id:
+            socketio.emit('payment.status', {
+                'order_id': order.id,
+                'status': payment.status,
+                'message': message,
+            }, namespace='/', room=f'user_{order.user_id}')
+    except Exception:
+        pass
+
+
+def run_stk_push(payment_id, phone):
+    """Push the prompt for a pending M-Pesa payment and record the outcome; returns (ok, message)."""
+    import json
+    from ..models import Payment
+    payment = db.session.get(Payment, payment_id)
+    if not payment or payment.status != 'pending' or not payment.order:
+        return False, None
+    try:
+        ok, data = stk_push(payment.order_id, payment.amount, phone)
+    except Exception:
+        log.warning('STK push for order %s failed', payment.order_id, exc_info=True)
+        ok, data = False, {"errorMessage": "Network error contacting M-Pesa."}
+    payment.raw_payload = json.dumps(data)
+    if ok:
+        payment.reference = data.get("CheckoutRequestID")
+        message = "M-Pesa STK push sent. Check your phone to authorize."
+    else:
+        payment.status = "failed"
+        message = data.get("errorMessage") or data.get("ResponseDescription") or "Failed to initiate STK"
+        # No prompt reached the phone, so no payment can follow: hand the held units back now
+        reservations.release_order(payment.order_id)
+    db.session.commit()
+    emit_payment_status(payment, message)
+    return ok, message
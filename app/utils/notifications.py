@@ -0,0 +1,358 @@
+"""
+Notification outbox for order status fan-out.
+
+Request handlers never talk to SMTP, Twilio or Africa's Talking directly.
+``enqueue_order_status`` writes one ``NotificationOutbox`` row per channel
+in the same transaction as the status change, and ``kick`` asks for
+delivery after the commit without waiting for it. The Celery task
+``app.dispatch_notifications`` runs delivery when a broker is configured;
+otherwise a single background thread does. The same task on Celery beat
+picks up retries and anything a crashed worker left behind.
+
+``dispatch_pending`` claims a batch of due rows (``status``/``next_attempt_at``
+index; ``SKIP LOCKED`` where supported), groups them by channel and sends
+each group with one provider client (emails share one pooled SMTP session
+via ``send_many``). The clients are cached per process and credentials. A
+failed row is retried with exponential backoff and marked ``failed`` after
+``NOTIFY_MAX_ATTEMPTS`` tries.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from ..extensions import db
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+DEFAULT_BATCH = 100
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+LEASE_SECONDS = 300  # a row stuck in 'sending' this long is claimed again
+AT_ACCEPTED = {100, 101, 102}  # Africa's Talking statusCode: Processed, Sent, Queued
+
+log = logging.getLogger(__name__)
+
+_clients = {}
+_clients_lock = threading.Lock()
+_executor = None
+_scheduled = False
+_scheduled_lock = threading.Lock()
+
+
+def _e164(phone):
+    """Kenyan local formats (07..., 2547...) to +2547...; anything else as given."""
+    phone = (phone or '').strip()
+    if phone.startswith('0'):
+        return '+254' + phone[1:]
+    if phone.startswith('254'):
+        return '+' + phone
+    return phone
+
+
+def _cfg(key, default=None):
+    return current_app.config.get(key, default)
+
+
+def _whatsapp_configured():
+    return bool(_cfg('TWILIO_ACCOUNT_SID') and _cfg('TWILIO_AUTH_TOKEN') and _cfg('TWILIO_WHATSAPP_FROM'))
+
+
+def _africastalking_configured():
+    sender = _cfg('SMS_SENDER_ID') or _cfg('TWILIO_SMS_FROM')
+    return bool(_cfg('AFRICASTALKING_USERNAME') and _cfg('AFRICASTALKING_API_KEY') and sender)
+
+
+def _sms_configured():
+    return _africastalking_configured() or bool(
+        _cfg('TWILIO_ACCOUNT_SID') and _cfg('TWILIO_AUTH_TOKEN') and _cfg('TWILIO_SMS_FROM')
+    )
+
+
+def enqueue(channel, recipient, body, subject=None, user_id=None):
+    """Add one outbox row; the caller commits (and then calls ``kick``)."""
+    from ..models import NotificationOutbox
+    row = NotificationOutbox(channel=channel, recipient=recipient, subject=subject, body=body,
+                             user_id=user_id, status=PENDING)
+    db.session.add(row)
+    return row
+
+
+def enqueue_order_status(order, old_status, new_status):
+    """Queue the customer email/WhatsApp/SMS for an admin status change; returns the rows."""
+    user = order.user
+    if not user:
+        return []
+    label = new_status.replace('_', ' ').title()
+    rows = []
+    if user.email:
+        rows.append(enqueue(
+            'email', user.email,
+            subject=f"Your order #{order.id} is now {label}",
+            body=(f"Hello,\n\nYour order #{order.id} status has changed from {old_status} to {new_status}."
+                  "\n\nThank you for shopping with us."),
+            user_id=user.id,
+        ))
+    phone = getattr(user, 'phone', None)
+    if phone:
+        msg = f"Order #{order.id} status: {label}"
+        if _whatsapp_configured():
+            rows.append(enqueue('whatsapp', _e164(phone), msg, user_id=user.id))
+        if _sms_configured():
+            rows.append(enqueue('sms', _e164(phone), msg, user_id=user.id))
+    return rows
+
+
+# Provider clients, built once per process and set of credentials
+
+def _cached_client(key, build):
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = build()
+        return client
+
+
+def _twilio():
+    sid, tok = _cfg('TWILIO_ACCOUNT_SID'), _cfg('TWILIO_AUTH_TOKEN')
+
+    def build():
+        from twilio.rest import Client  # type: ignore
+        return Client(sid, tok)
+    return _cached_client(('twilio', sid, tok), build)
+
+
+def _africastalking_sms():
+    user, key = _cfg('AFRICASTALKING_USERNAME'), _cfg('AFRICASTALKING_API_KEY')
+
+    def build():
+        import africastalking  # type: ignore
+        africastalking.initialize(user, key)
+        return africastalking.SMS
+    return _cached_client(('africastalking', user, key), build)
+
+
+# Channel senders: list of rows -> {row.id: error message or None}
+
+def _send_email_rows(rows):
+    from .email import _plain_to_html, send_many
+    sent = send_many((r.recipient, r.subject or '', _plain_to_html(r.body)) for r in rows)
+    return {r.id: None if ok else 'email not sent' for r, ok in zip(rows, sent)}
+
+
+def _send_whatsapp_rows(rows):
+    client = _twilio()
+    sender = _cfg('TWILIO_WHATSAPP_FROM')
+    results = {}
+    for r in rows:
+        try:
+            client.messages.create(from_=sender, to='whatsapp:' + r.recipient, body=r.body)
+            results[r.id] = None
+        except Exception as e:
+            results[r.id] = str(e) or e.__class__.__name__
+    return results
+
+
+def _africastalking_results(rows, resp):
+    """Map the per-recipient statuses of one bulk send back onto its rows.
+
+    A recipient missing from the response counts as not sent, so it is retried.
+    """
+    statuses = {}
+    for rec in ((resp or {}).get('SMSMessageData') or {}).get('Recipients') or []:
+        statuses.setdefault(rec.get('number'), []).append(rec)
+    results = {}
+    for r in rows:
+        pending = statuses.get(r.recipient)
+        if not pending:
+            results[r.id] = 'no status from provider'
+            continue
+        rec = pending.pop(0)
+        try:
+            code = int(rec.get('statusCode'))
+        except (TypeError, ValueError):
+            code = None
+        ok = code in AT_ACCEPTED if code is not None else rec.get('status') == 'Success'
+        results[r.id] = None if ok else str(rec.get('status') or code or 'rejected')
+    return results
+
+
+def _send_sms_rows(rows):
+    results = {}
+    if _africastalking_configured():
+        sms = _africastalking_sms()
+        sender = _cfg('SMS_SENDER_ID') or _cfg('TWILIO_SMS_FROM')
+        # Africa's Talking takes many recipients per call; rows with the same text go together
+        by_body = {}
+        for r in rows:
+            by_body.setdefault(r.body, []).append(r)
+        for body, group in by_body.items():
+            try:
+                resp = sms.send(body, [r.recipient for r in group], sender)
+            except Exception as e:
+                results.update({r.id: str(e) or e.__class__.__name__ for r in group})
+                continue
+            results.update(_africastalking_results(group, resp))
+        return results
+    client = _twilio()
+    sender = _cfg('TWILIO_SMS_FROM')
+    for r in rows:
+        try:
+            client.messages.create(from_=sender, to=r.recipient, body=r.body)
+            results[r.id] = None
+        except Exception as e:
+            results[r.id] = str(e) or e.__class__.__name__
+    return results
+
+
+SENDERS = {
+    'email': _send_email_rows,
+    'whatsapp': _send_whatsapp_rows,
+    'sms': _send_sms_rows,
+}
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)))
+
+
+def _claim(batch, now):
+    """Mark up to ``batch`` due rows as 'sending' under a lease and return them.
+
+    The UPDATE repeats the "due" condition, so a row another dispatcher
+    leased after it was picked (SQLite has no row locks to skip) is left out.
+    """
+    from ..models import NotificationOutbox as N
+    due = (N.status.in_((PENDING, SENDING)), N.next_attempt_at <= now)
+    q = db.session.query(N.id).filter(*due).order_by(N.next_attempt_at, N.id).limit(batch)
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'sqlite':
+        q = q.with_for_update(skip_locked=True)
+    ids = [i for (i,) in q.all()]
+    if not ids:
+        db.session.commit()
+        return []
+    stmt = (
+        db.update(N)
+        .where(N.id.in_(ids), *due)
+        .values(status=SENDING, attempts=db.func.coalesce(N.attempts, 0) + 1,
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    if bind.dialect.update_returning:
+        ids = [i for (i,) in db.session.execute(stmt.returning(N.id))]
+    elif db.session.execute(stmt).rowcount != len(ids):
+        # Without RETURNING (MySQL) the picked rows are locked, so this only happens if they vanished
+        ids = [i for (i,) in db.session.query(N.id).filter(N.id.in_(ids), N.status == SENDING)]
+    db.session.commit()
+    if not ids:
+        return []
+    return db.session.query(N).filter(N.id.in_(ids)).order_by(N.id).all()
+
+
+def dispatch_pending(batch=None, now=None):
+    """Deliver one batch of due outbox rows; returns the number sent."""
+    now = now or datetime.utcnow()
+    batch = int(batch or _cfg('NOTIFY_BATCH_SIZE', DEFAULT_BATCH))
+    max_attempts = int(_cfg('NOTIFY_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+    rows = _claim(batch, now)
+    if not rows:
+        return 0
+    by_channel = {}
+    for r in rows:
+        by_channel.setdefault(r.channel, []).append(r)
+    results = {}
+    for channel, group in by_channel.items():
+        sender = SENDERS.get(channel)
+        if sender is None:
+            results.update({r.id: f'unknown channel {channel}' for r in group})
+            continue
+        try:
+            results.update(sender(group))
+        except Exception as e:
+            # Client could not be built (SDK missing, bad credentials): retry the whole group
+            results.update({r.id: str(e) or e.__class__.__name__ for r in group})
+    sent = 0
+    done_at = datetime.utcnow()
+    for r in rows:
+        error = results.get(r.id, 'not attempted')
+        if error is None:
+            r.status, r.sent_at, r.last_error = SENT, done_at, None
+            sent += 1
+        elif r.attempts >= max_attempts:
+            r.status, r.last_error = FAILED, error[:255]
+            log.warning('Giving up on %s notification %s after %s attempts: %s', r.channel, r.id, r.attempts, error)
+        else:
+            r.status, r.last_error = PENDING, error[:255]
+            r.next_attempt_at = done_at + _retry_delay(r.attempts)
+    db.session.commit()
+    return sent
+
+
+def drain(max_batches=20):
+    """Dispatch batches until nothing is due (bounded); returns the number sent."""
+    from ..models import NotificationOutbox as N
+    total = 0
+    for _ in range(max_batches):
+        total += dispatch_pending()
+        # Retried rows are pushed into the future, so this ends once the backlog is through
+        if not db.session.query(N.id).filter(N.status == PENDING, N.next_attempt_at <= datetime.utcnow()).first():
+            break
+    return total
+
+
+def _dispatch_mode(app):
+    mode = (app.config.get('NOTIFY_DISPATCH_MODE') or '').lower()
+    if mode:
+        return mode
+    if app.config.get('CELERY_BROKER_URL'):
+        return 'celery'
+    # In-memory test databases cannot be shared with a second thread; tests dispatch explicitly
+    return 'off' if app.testing else 'thread'
+
+
+def _run_in_thread(app):
+    global _scheduled
+    with _scheduled_lock:
+        _scheduled = False
+    with app.app_context():
+        try:
+            drain()
+        except Exception:
+            log.exception('Notification dispatch failed')
+        finally:
+            db.session.remove()
+
+
+def kick():
+    """Schedule delivery of queued rows without blocking the caller (after commit)."""
+    global _executor, _scheduled
+    app = current_app._get_current_object()
+    mode = _dispatch_mode(app)
+    if mode == 'off':
+        return False
+    if mode == 'inline':
+        drain()
+        return True
+    if mode == 'celery':
+        try:
+            from ..tasks import dispatch_notifications_task
+            if dispatch_notifications_task is not None and hasattr(dispatch_notifications_task, 'delay'):
+                dispatch_notifications_task.delay()
+                return True
+        except Exception:
+            log.warning('Could not enqueue notification dispatch; using a local thread', exc_info=True)
+    with _scheduled_lock:
+        # One queued run drains everything committed before it starts
+        if _scheduled:
+            return True
+        _scheduled = True
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notify')
+    _executor.submit(_run_in_thread, app)
+    return True
@@ -0,0 +1,131 @@
+"""
+EXPLAIN checks for the storefront's hot queries.
+
+``hot_queries()`` lists them with placeholder values. The paginated listings
+are built with the blueprints' own pieces (``shop.listing_query``,
+``shop.product_sort_keys``, ``keyset.newest_first``) and ``keyset.page_query``,
+for the first page and for a deep page, so they are the statements
+``paginate`` really runs. The rest mirror the filters and sort orders the
+blueprints use. ``check_plans`` runs ``EXPLAIN`` on each one for the current
+dialect and reports any that read their table with a full scan or sort it:
+
+- SQLite: an ``EXPLAIN QUERY PLAN`` row ``SCAN <table>`` that uses no index,
+  or ``USE TEMP B-TREE FOR ORDER BY``.
+- PostgreSQL: a ``Seq Scan`` or a full ``Sort`` node (an ``Incremental Sort``
+  only orders ties within the index order and is accepted).
+  ``enable_seqscan`` and ``enable_sort`` are switched off for the check so
+  small dev tables still show whether an index is usable.
+- MySQL: a plan row with ``type = ALL`` or ``Using filesort``.
+
+Used by ``scripts/explain_hot_queries.py`` (and its test) to fail the build
+when a schema or query change drops an index off a hot path.
+"""
+from datetime import datetime
+
+from ..extensions import db
+
+
+def _listings(now):
+    """(name, table, statement) for the first and a deep page of each keyset listing."""
+    from ..blueprints.shop.routes import listing_query, product_sort_keys
+    from ..models import Order, Product, Review, User
+    from .keyset import make_cursor, newest_first, page_query
+    boundary = {'newest': now, 'price_asc': 100, 'price_desc': 100, 'rating': 4}
+    listings = []
+    for sort, value in boundary.items():
+        keys = product_sort_keys(sort)
+        for scope, query in (('shop', listing_query()), ('category', listing_query([1]))):
+            listings.append((f'{scope} listing by {sort}', 'products', query, keys, [value] + [1] * (len(keys) - 1)))
+    for label, model in (('products', Product), ('orders', Order), ('reviews', Review), ('users', User)):
+        listings.append((f'admin {label}', model.__tablename__, model.query, newest_first(model), [now, 1]))
+    statements = []
+    for name, table, query, keys, values in listings:
+        statements.append((name, table, page_query(query, keys).statement))
+        statements.append((f'{name}, deep page', table, page_query(query, keys, make_cursor(keys, values)).statement))
+    return statements
+
+
+def hot_queries():
+    """(name, table, statement) for each hot query."""
+    from ..models import (
+        CartItem, FlashSale, Notification, Order, OrderItem, Payment, Product, ProductImage,
+        Review, StockReservation,
+    )
+    now = datetime(2026, 1, 1)
+    return _listings(now) + [
+        ('cart by user', 'cart_items', db.select(CartItem).where(CartItem.user_id == 1)),
+        ('order items by order', 'order_items', db.select(OrderItem).where(OrderItem.order_id == 1)),
+        ('order items by product', 'order_items', db.select(OrderItem.order_id).where(OrderItem.product_id == 1)),
+        ('my orders', 'orders', db.select(Order).where(Order.user_id == 1).order_by(Order.created_at.desc())),
+        ('admin orders by status', 'orders',
+         db.select(Order).where(Order.status == 'pending').order_by(Order.created_at.desc()).limit(50)),
+        ('orders in date range', 'orders',
+         db.select(Order.id).where(Order.created_at >= now, Order.created_at < datetime(2026, 2, 1))),
+        ('approved reviews for product', 'reviews',
+         db.select(Review).where(Review.product_id == 1, Review.is_approved.is_(True)).order_by(Review.created_at.desc()).limit(50)),
+        ('product gallery', 'product_images',
+         db.select(ProductImage).where(ProductImage.product_id.in_([1, 2, 3]))),
+        ('live flash sales', 'flash_sales',
+         db.select(FlashSale).where(FlashSale.is_active.is_(True), FlashSale.starts_at <= now, FlashSale.ends_at >= now).limit(4)),
+        ('flash sales for products', 'flash_sales',
+         db.select(FlashSale).where(FlashSale.product_id.in_([1, 2]), FlashSale.is_active.is_(True))),
+        ('unread notifications', 'notifications',
+         db.select(Notification).where(Notification.user_id == 1, Notification.is_read.is_(False)).order_by(Notification.created_at.desc()).limit(10)),
+        ('newest products', 'products',
+         db.select(Product).where(Product.is_active.is_(True)).order_by(Product.created_at.desc()).limit(8)),
+        ('top picks', 'products',
+         db.select(Product).where(Product.is_active.is_(True), Product.is_top_pick.is_(True)).order_by(Product.updated_at.desc()).limit(8)),
+        ('featured new arrivals', 'products',
+         db.select(Product).where(Product.is_active.is_(True), Product.is_new_arrival_featured.is_(True)).order_by(Product.updated_at.desc()).limit(8)),
+        ('payment by checkout id', 'payments', db.select(Payment.id).where(Payment.reference == 'ws_CO_1')),
+        ('expired stock holds', 'stock_reservations',
+         db.select(StockReservation.order_id).where(StockReservation.status == 'held', StockReservation.expires_at <= now)),
+    ]
+
+
+def _compiled(stmt, dialect):
+    return str(stmt.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _full_scans(conn, dialect_name, sql, table):
+    """Plan lines showing a full scan or a sort of ``table`` (empty when an index serves it)."""
+    if dialect_name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+        details = [str(r[-1]) for r in rows]
+        return [d for d in details
+                if (d.startswith(f'SCAN {table}') and 'USING' not in d) or d == 'USE TEMP B-TREE FOR ORDER BY']
+    if dialect_name == 'postgresql':
+        rows = conn.exec_driver_sql('EXPLAIN ' + sql).fetchall()
+        details = [str(r[0]).strip() for r in rows]
+        return [d for d in details
+                if 'Seq Scan on ' + table in d or d.lstrip('-> ').startswith('Sort ')]
+    if dialect_name in ('mysql', 'mariadb'):
+        result = conn.exec_driver_sql('EXPLAIN ' + sql)
+        keys = list(result.keys())
+        found = []
+        for r in result.fetchall():
+            row = dict(zip(keys, r))
+            if row.get('table') == table and str(row.get('type')).upper() == 'ALL':
+                found.append(f"{table}: type=ALL")
+            if 'filesort' in str(row.get('Extra') or ''):
+                found.append(f"{row.get('table')}: {row.get('Extra')}")
+        return found
+    return []
+
+
+def check_plans(engine=None):
+    """[(name, sql, [full-scan plan lines])] for every hot query, in order."""
+    engine = engine or db.engine
+    dialect = engine.dialect
+    results = []
+    with engine.connect() as conn:
+        if dialect.name == 'postgresql':
+            conn.exec_driver_sql('SET enable_seqscan = off')
+            conn.exec_driver_sql('SET enable_sort = off')
+        for name, table, stmt in hot_queries():
+            sql = _compiled(stmt, dialect)
+            results.append((name, sql, _full_scans(conn, dialect.name, sql, table)))
+        if dialect.name == 'postgresql':
+            conn.exec_driver_sql('RESET enable_seqscan')
+            conn.exec_driver_sql('RESET enable_sort')
+    return results
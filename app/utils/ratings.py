@@ -0,0 +1,42 @@
+"""
+Denormalized review aggregates on ``products`` (``rating_avg``/``rating_count``).
+
+Only approved reviews count. Every path that creates, approves, rejects or
+deletes a review calls ``refresh_product_rating`` before committing; it
+recomputes the two columns for that one product in a single UPDATE with
+correlated subqueries, so concurrent moderation cannot leave them drifting.
+Catalog sorting and the minimum-rating filter then use the indexed
+``products.rating_avg`` column instead of averaging the reviews table.
+"""
+from ..extensions import db
+
+
+def _approved(product_id):
+    from ..models import Review
+    return db.and_(Review.product_id == product_id, Review.is_approved.is_(True))
+
+
+def refresh_product_rating(product_id):
+    """Recompute rating_avg/rating_count for one product; the caller commits."""
+    from ..models import Product, Review
+    if not product_id:
+        return
+    avg = db.select(db.func.avg(Review.rating)).where(_approved(product_id)).scalar_subquery()
+    count = db.select(db.func.count(Review.id)).where(_approved(product_id)).scalar_subquery()
+    db.session.execute(
+        db.update(Product)
+        .where(Product.id == product_id)
+        .values(rating_avg=avg, rating_count=count)
+        .execution_options(synchronize_session='fetch')
+    )
+
+
+def rebuild_ratings():
+    """Recompute the aggregates for every product (backfill) and commit."""
+    from ..models import Product, Review
+    approved = db.and_(Review.product_id == Product.id, Review.is_approved.is_(True))
+    db.session.execute(db.update(Product).values(
+        rating_avg=db.select(db.func.avg(Review.rating)).where(approved).scalar_subquery(),
+        rating_count=db.select(db.func.count(Review.id)).where(approved).scalar_subquery(),
+    ))
+    db.session.commit()
@@ -0,0 +1,157 @@
+"""
+M-Pesa payment reconciliation.
+
+Both the STK callback (``payments.mpesa_callback``) and the periodic STK
+query job (``reconcile_pending``) apply a result through ``apply_stk_result``:
+
+1. Find the payment by ``CheckoutRequestID`` through the unique index on
+   ``payments.reference``. Only columns are loaded, with no relationships.
+2. Check a ``PaymentEvent`` keyed by the M-Pesa receipt number, or by
+   ``CheckoutRequestID:ResultCode`` for failures. The unique key turns a
+   duplicate delivery into a no-op, even when two callbacks race each other
+   (the loser's commit raises ``IntegrityError``).
+3. Move the payment with a conditional ``UPDATE`` (a failure only from
+   ``pending``, a success from anything but ``paid``). Then confirm the
+   order and commit or release its stock hold.
+
+``reconcile_pending`` picks up M-Pesa payments still pending after
+``MPESA_RECONCILE_AFTER_SECONDS`` (``payments(method, status, created_at)``
+index) and asks Daraja for their result, for callbacks that never arrived.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from ..extensions import db
+from . import reservations
+
+PROVIDER = 'mpesa'
+CONFIRMABLE_ORDER_STATUSES = ('placed', 'pending', 'confirmed')
+DEFAULT_RECONCILE_AFTER_SECONDS = 120
+DEFAULT_RECONCILE_BATCH = 100
+# Daraja STK query error codes that mean "no result yet"; anything else without a ResultCode is skipped too
+STILL_PROCESSING = ('500.001.1001',)
+
+log = logging.getLogger(__name__)
+
+
+def parse_stk_callback(data):
+    """Flatten Daraja's Body.stkCallback into a dict of the fields we use."""
+    body = data.get("Body", {}) if isinstance(data, dict) else {}
+    cb = body.get("stkCallback", {}) if isinstance(body, dict) else {}
+    meta = cb.get("CallbackMetadata", {})
+    items = meta.get("Item", []) if isinstance(meta, dict) else []
+    values = {i.get('Name'): i.get('Value') for i in items if isinstance(i, dict)}
+    return {
+        'checkout_id': cb.get("CheckoutRequestID"),
+        'result_code': cb.get("ResultCode"),
+        'receipt': values.get('MpesaReceiptNumber'),
+        'account_ref': values.get('AccountReference'),
+    }
+
+
+def find_payment(checkout_id=None, account_ref=None):
+    """(id, order_id, status) of the M-Pesa payment, by indexed reference or by order id."""
+    from ..models import Payment
+    cols = (Payment.id, Payment.order_id, Payment.status)
+    if checkout_id:
+        row = db.session.query(*cols).filter(Payment.reference == checkout_id).first()
+        if row:
+            return row
+    if account_ref:
+        try:
+            order_id = int(account_ref)
+        except Exception:
+            return None
+        return (
+            db.session.query(*cols)
+            .filter(Payment.order_id == order_id, Payment.method == 'mpesa')
+            .order_by(Payment.id.desc())
+            .first()
+        )
+    return None
+
+
+def event_key(checkout_id, result_code, receipt=None):
+    return str(receipt) if receipt else f"{checkout_id}:{result_code}"
+
+
+def apply_stk_result(payment_id, order_id, result_code, key, raw=None, source='callback'):
+    """
+    Record and apply one STK result; returns 'paid', 'failed' or None when it
+    was a duplicate or did not change the payment. The caller commits and must
+    treat an ``IntegrityError`` on commit as a duplicate.
+    """
+    from ..models import Order, Payment, PaymentEvent
+    if db.session.query(PaymentEvent.id).filter_by(provider=PROVIDER, event_key=key).first():
+        return None
+    paid = str(result_code) == '0'
+    db.session.add(PaymentEvent(provider=PROVIDER, event_key=key, payment_id=payment_id, result_code=str(result_code), source=source))
+    values = {'status': 'paid' if paid else 'failed'}
+    if raw is not None:
+        values['raw_payload'] = raw if isinstance(raw, str) else json.dumps(raw)
+    guard = Payment.status != 'paid' if paid else Payment.status == 'pending'
+    moved = db.session.execute(
+        db.update(Payment).where(Payment.id == payment_id, guard).values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not moved:
+        return None
+    if paid:
+        reservations.commit_order(order_id)
+        db.session.execute(
+            db.update(Order)
+            .where(Order.id == order_id, Order.status.in_(CONFIRMABLE_ORDER_STATUSES))
+            .values(status='confirmed')
+            .execution_options(synchronize_session=False)
+        )
+        return 'paid'
+    # Cancelled/timed-out STK push: hand the held units back right away
+    reservations.release_order(order_id)
+    return 'failed'
+
+
+def reconcile_pending(now=None, batch=None, older_than=None):
+    """Resolve stale pending M-Pesa payments with the STK query API; returns {'paid': n, 'failed': n}."""
+    from sqlalchemy.exc import IntegrityError
+    from ..models import Payment
+    from . import mpesa
+    counts = {'paid': 0, 'failed': 0}
+    if not mpesa.is_configured():
+        return counts
+    cfg = current_app.config
+    now = now or datetime.utcnow()
+    older_than = older_than if older_than is not None else int(cfg.get('MPESA_RECONCILE_AFTER_SECONDS') or DEFAULT_RECONCILE_AFTER_SECONDS)
+    batch = batch or int(cfg.get('MPESA_RECONCILE_BATCH') or DEFAULT_RECONCILE_BATCH)
+    rows = (
+        db.session.query(Payment.id, Payment.order_id, Payment.reference)
+        .filter(
+            Payment.method == 'mpesa',
+            Payment.status == 'pending',
+            Payment.created_at <= now - timedelta(seconds=older_than),
+            Payment.reference.isnot(None),
+        )
+        .order_by(Payment.created_at)
+        .limit(batch)
+        .all()
+    )
+    for payment_id, order_id, reference in rows:
+        try:
+            data = mpesa.stk_query(reference)
+        except Exception:
+            log.warning('STK query for %s failed', reference, exc_info=True)
+            continue
+        result_code = data.get('ResultCode')
+        if result_code is None or data.get('errorCode') in STILL_PROCESSING:
+            continue
+        try:
+            outcome = apply_stk_result(payment_id, order_id, result_code, event_key(reference, result_code), raw=data, source='query')
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            continue
+        if outcome:
+            counts[outcome] += 1
+    return counts
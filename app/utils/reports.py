@@ -0,0 +1,179 @@
+"""
+Streamed CSV reports for finance (orders, payments, order items).
+
+Each report is a column-only SELECT with the user and delivery zone joined
+in, so no ORM objects or lazy loads are created per row. It runs with
+``stream_results`` (server-side cursor where the driver supports it) and
+``yield_per``, and is written to the response in chunks, so memory stays
+flat however long the date range is.
+
+Filters come from the query string: ``from``/``to`` (YYYY-MM-DD, inclusive),
+``status``, ``zone`` (delivery zone id) and, for payments, ``q``. ``gzip=1``
+downloads a ``.csv.gz``; otherwise the body is gzip-encoded on the fly when
+the client sends ``Accept-Encoding: gzip``.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta
+
+from flask import Response, stream_with_context
+
+from ..extensions import db
+
+YIELD_PER = 1000
+ROWS_PER_CHUNK = 500
+
+
+def parse_filters(args):
+    def _date(name):
+        raw = (args.get(name) or '').strip()
+        if not raw:
+            return None
+        try:
+            return datetime.strptime(raw[:10], '%Y-%m-%d')
+        except ValueError:
+            return None
+
+    start = _date('from')
+    end = _date('to')
+    return {
+        'start': start,
+        'end': (end + timedelta(days=1)) if end else None,   # inclusive end date
+        'status': (args.get('status') or '').strip() or None,
+        'zone': args.get('zone', type=int),
+        'q': (args.get('q') or '').strip() or None,
+        'gzip': (args.get('gzip') or '').lower() in {'1', 'true', 'yes'},
+    }
+
+
+def _filter_orders(query, filters):
+    from ..models import Order
+    if filters.get('start'):
+        query = query.filter(Order.created_at >= filters['start'])
+    if filters.get('end'):
+        query = query.filter(Order.created_at < filters['end'])
+    if filters.get('zone'):
+        query = query.filter(Order.delivery_zone_id == filters['zone'])
+    return query
+
+
+def _stream(query):
+    return query.execution_options(stream_results=True, yield_per=YIELD_PER)
+
+
+def orders_rows(filters):
+    from ..models import Order, User, DeliveryZone
+    yield ["OrderID", "User", "Status", "Total", "DeliveryFee", "Discount", "Zone", "CreatedAt"]
+    query = (
+        db.session.query(
+            Order.id, User.email, Order.status, Order.total_amount, Order.delivery_fee,
+            Order.discount_amount, DeliveryZone.name, Order.created_at,
+        )
+        .outerjoin(User, Order.user_id == User.id)
+        .outerjoin(DeliveryZone, Order.delivery_zone_id == DeliveryZone.id)
+    )
+    query = _filter_orders(query, filters)
+    if filters.get('status'):
+        query = query.filter(Order.status == filters['status'])
+    query = query.order_by(Order.created_at.desc(), Order.id.desc())
+    for oid, email, status, total, fee, discount, zone, created_at in _stream(query):
+        yield [oid, email or '', status, total, fee, discount, zone or '', created_at]
+
+
+def payments_rows(filters):
+    from ..models import Order, Payment, User, DeliveryZone
+    yield ["PaymentID", "OrderID", "Method", "Reference", "Amount", "Status", "User", "Zone", "CreatedAt"]
+    query = (
+        db.session.query(
+            Payment.id, Payment.order_id, Payment.method, Payment.reference, Payment.amount,
+            Payment.status, User.email, DeliveryZone.name, Payment.created_at,
+        )
+        .outerjoin(Order, Payment.order_id == Order.id)
+        .outerjoin(User, Order.user_id == User.id)
+        .outerjoin(DeliveryZone, Order.delivery_zone_id == DeliveryZone.id)
+    )
+    if filters.get('start'):
+        query = query.filter(Payment.created_at >= filters['start'])
+    if filters.get('end'):
+        query = query.filter(Payment.created_at < filters['end'])
+    if filters.get('zone'):
+        query = query.filter(Order.delivery_zone_id == filters['zone'])
+    if filters.get('status'):
+        query = query.filter(Payment.status == filters['status'])
+    if filters.get('q'):
+        like = f"%{filters['q']}%"
+        query = query.filter(db.or_(
+            Payment.id.cast(db.String).ilike(like),
+            Payment.reference.ilike(like),
+            Payment.method.ilike(like),
+            Payment.status.ilike(like),
+            Order.id.cast(db.String).ilike(like)
+        ))
+    query = query.order_by(Payment.created_at.desc(), Payment.id.desc())
+    for pid, oid, method, reference, amount, status, email, zone, created_at in _stream(query):
+        yield [pid, oid or '', method, reference or '', amount, status, email or '', zone or '', created_at]
+
+
+def order_items_rows(filters):
+    from ..models import Order, OrderItem, User, DeliveryZone
+    yield ["OrderID", "OrderStatus", "User", "Zone", "ProductID", "Product", "Quantity", "UnitPrice", "LineTotal", "CreatedAt"]
+    query = (
+        db.session.query(
+            Order.id, Order.status, User.email, DeliveryZone.name, OrderItem.product_id,
+            OrderItem.product_name, OrderItem.quantity, OrderItem.unit_price, Order.created_at,
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(User, Order.user_id == User.id)
+        .outerjoin(DeliveryZone, Order.delivery_zone_id == DeliveryZone.id)
+    )
+    query = _filter_orders(query, filters)
+    if filters.get('status'):
+        query = query.filter(Order.status == filters['status'])
+    query = query.order_by(Order.created_at.desc(), Order.id.desc(), OrderItem.id)
+    for oid, status, email, zone, product_id, name, qty, unit_price, created_at in _stream(query):
+        line_total = (unit_price or 0) * (qty or 0)
+        yield [oid, status, email or '', zone or '', product_id, name, qty, unit_price, line_total, created_at]
+
+
+def _csv_chunks(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate(0)
+            pending = 0
+    if pending:
+        yield buf.getvalue().encode('utf-8')
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(rows, filename, filters, accept_encodings=''):
+    """Stream ``rows`` as CSV, gzip-compressing on the fly when asked or accepted."""
+    body = _csv_chunks(rows)
+    headers = {}
+    if filters.get('gzip'):
+        body = _gzip_chunks(body)
+        headers['Content-Disposition'] = f'attachment; filename={filename}.gz'
+        mimetype = 'application/gzip'
+    else:
+        headers['Content-Disposition'] = f'attachment; filename={filename}'
+        mimetype = 'text/csv'
+        if 'gzip' in (accept_encodings or ''):
+            body = _gzip_chunks(body)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
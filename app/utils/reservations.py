@@ -0,0 +1,155 @@
+"""
+Time-boxed stock holds for orders awaiting payment.
+
+Checkout takes the units off ``products.stock`` with the guarded UPDATE in
+``utils.stock``. For prepaid orders (M-Pesa, card) it also records one
+``StockReservation`` per product with ``expires_at = now + STOCK_HOLD_MINUTES``,
+so the units shown as available already exclude them.
+
+A hold ends in one of two ways:
+
+- ``commit_order`` when payment is confirmed (M-Pesa callback, Stripe
+  webhook). If the hold had already been released, it tries to take the
+  stock again and logs a warning if the units are gone. A cancelled order
+  is not restocked; it is flagged for a refund instead.
+- ``release_order`` when the payment fails (failed ``mpesa_callback``), the
+  order is cancelled, or ``release_expired`` (Celery beat) finds it past its
+  TTL. The units go back with one UPDATE.
+
+All holds of an order change status together through one conditional
+``UPDATE ... WHERE status = 'held'``, so a sweep racing a callback can only
+release or commit them once. Lookups go through the ``(status, expires_at)``
+and ``(product_id, status)`` indexes.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from ..extensions import db
+from .stock import decrement_stock, increment_stock
+
+HELD = 'held'
+COMMITTED = 'committed'
+RELEASED = 'released'
+DEFAULT_HOLD_MINUTES = 15
+SWEEP_BATCH = 200
+
+log = logging.getLogger(__name__)
+
+
+def hold_minutes():
+    try:
+        return float(current_app.config.get('STOCK_HOLD_MINUTES', DEFAULT_HOLD_MINUTES))
+    except Exception:
+        return DEFAULT_HOLD_MINUTES
+
+
+def hold_order(order, lines, minutes=None, now=None):
+    """Record holds for (product_id, quantity) lines already taken off stock; the caller commits."""
+    from ..models import StockReservation
+    now = now or datetime.utcnow()
+    expires = now + timedelta(minutes=hold_minutes() if minutes is None else minutes)
+    merged = {}
+    for pid, qty in lines:
+        merged[int(pid)] = merged.get(int(pid), 0) + int(qty or 0)
+    db.session.add_all([
+        StockReservation(order_id=order.id, product_id=pid, quantity=qty, status=HELD, expires_at=expires, created_at=now)
+        for pid, qty in merged.items() if qty > 0
+    ])
+
+
+def _claim(order_id, from_status, to_status, now):
+    """Move every hold of the order from one status to another in one statement; the moved lines (or [])."""
+    from ..models import StockReservation as R
+    stmt = (
+        db.update(R)
+        .where(R.order_id == order_id, R.status == from_status)
+        .values(status=to_status, resolved_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        # Exactly the rows this UPDATE moved; a racing claim moves none of them
+        return [(pid, qty) for pid, qty in db.session.execute(stmt.returning(R.product_id, R.quantity))]
+    # No UPDATE ... RETURNING (MySQL): lock the rows first so the UPDATE moves exactly these
+    rows = (
+        db.session.query(R.product_id, R.quantity)
+        .filter(R.order_id == order_id, R.status == from_status)
+        .with_for_update()
+        .all()
+    )
+    if rows:
+        db.session.execute(stmt)
+    return [(r.product_id, r.quantity) for r in rows]
+
+
+def release_order(order_id, now=None):
+    """Give an unpaid order's held units back; returns the number of lines released. Caller commits."""
+    lines = _claim(order_id, HELD, RELEASED, now or datetime.utcnow())
+    if lines:
+        increment_stock(lines)
+    return len(lines)
+
+
+def commit_order(order_id, now=None):
+    """Keep the order's units for good once it is paid. Caller commits.
+
+    A payment for a cancelled order leaves its units released; the order gets
+    a status log note so the payment can be refunded.
+    """
+    from ..models import Order, OrderStatusLog
+    now = now or datetime.utcnow()
+    with db.session.no_autoflush:
+        status = db.session.query(Order.status).filter(Order.id == order_id).scalar()
+    if status == 'cancelled':
+        log.warning('Order %s was paid after it was cancelled; its stock stays released and the payment needs a refund',
+                    order_id)
+        db.session.add(OrderStatusLog(order_id=order_id, status='cancelled',
+                                      notes='Payment received after cancellation: refund due'))
+        return False
+    if _claim(order_id, HELD, COMMITTED, now):
+        return True
+    # Paid after the hold lapsed: take the units again if they are still there
+    lines = _claim(order_id, RELEASED, COMMITTED, now)
+    if lines and not decrement_stock(lines):
+        log.warning('Order %s was paid after its stock hold expired and some items are no longer in stock', order_id)
+    return bool(lines)
+
+
+def release_expired(now=None, batch=SWEEP_BATCH):
+    """Release holds past their TTL (Celery beat); commits per order and returns the count of orders."""
+    from ..models import StockReservation as R
+    now = now or datetime.utcnow()
+    order_ids = [
+        oid for (oid,) in
+        db.session.query(R.order_id)
+        .filter(R.status == HELD, R.expires_at <= now)
+        .distinct()
+        .limit(batch)
+        .all()
+    ]
+    released = 0
+    for oid in order_ids:
+        try:
+            if release_order(oid, now):
+                released += 1
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            log.exception('Failed to release stock holds for order %s', oid)
+    return released
+
+
+def held_by_product(product_ids):
+    """{product_id: units currently held by unpaid orders}."""
+    from ..models import StockReservation as R
+    ids = [int(i) for i in product_ids if i]
+    if not ids:
+        return {}
+    rows = (
+        db.session.query(R.product_id, db.func.sum(R.quantity))
+        .filter(R.product_id.in_(ids), R.status == HELD)
+        .group_by(R.product_id)
+        .all()
+    )
+    return {pid: int(qty or 0) for pid, qty in rows}
@@ -0,0 +1,251 @@
+"""
+Pre-aggregated daily sales for the admin dashboard and reports.
+
+``daily_sales_rollup`` keeps one row per day x delivery zone x category x
+product (see ``DailySalesRollup``). It is kept current in two ways:
+
+- checkout, admin status changes and customer cancellation call
+  ``record_order(order, +1/-1)`` inside their own transaction. It adds the
+  order's count, total, units and revenue to the order's day with atomic
+  upserts, so the cost per checkout is one row per product and concurrent
+  checkouts never overwrite each other;
+- ``refresh_days`` rebuilds whole days from the orders table. The
+  ``app.refresh_sales_rollup`` Celery task runs it over the last couple of
+  days to pick up anything written elsewhere, and ``rebuild()`` (or
+  ``scripts/rebuild_sales_rollup.py``) backfills the whole history.
+
+Cancelled orders are left out. Admin pages read the small rollup table, so
+their cost depends on the number of days and products, not on order volume.
+"""
+from datetime import date, datetime, timedelta
+
+from ..extensions import db
+
+ORDER_LEVEL = 0           # category_id/product_id of the order-level rows
+EXCLUDED_STATUSES = ('cancelled',)
+RECENT_DAYS = 2
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _aggregate(start=None, end=None):
+    """Rollup rows for orders created in [start, end) (all history if unbounded)."""
+    from ..models import Order, OrderItem, Product
+    day = db.func.date(Order.created_at)
+    zone = db.func.coalesce(Order.delivery_zone_id, 0)
+
+    def _bounded(query):
+        query = query.filter(db.or_(Order.status.is_(None), Order.status.notin_(EXCLUDED_STATUSES)))
+        if start is not None:
+            query = query.filter(Order.created_at >= start)
+        if end is not None:
+            query = query.filter(Order.created_at < end)
+        return query
+
+    rows = {}
+    order_q = _bounded(
+        db.session.query(day, zone, db.func.count(Order.id), db.func.coalesce(db.func.sum(Order.total_amount), 0))
+    ).group_by(day, zone)
+    for d, z, count, total in order_q:
+        rows[(_as_date(d), int(z), ORDER_LEVEL, ORDER_LEVEL)] = {'order_count': int(count), 'order_total': total or 0}
+
+    category = db.func.coalesce(Product.category_id, 0)
+    item_q = _bounded(
+        db.session.query(
+            day, zone, category, OrderItem.product_id,
+            db.func.coalesce(db.func.sum(OrderItem.quantity), 0),
+            db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.unit_price), 0),
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+    ).group_by(day, zone, category, OrderItem.product_id)
+    for d, z, c, pid, units, revenue in item_q:
+        rows[(_as_date(d), int(z), int(c), int(pid))] = {'units': int(units), 'revenue': revenue or 0}
+
+    return [
+        {'day': k[0], 'zone_id': k[1], 'category_id': k[2], 'product_id': k[3], **v}
+        for k, v in rows.items()
+    ]
+
+
+def upsert(table, key, insert_values, set_values):
+    """INSERT ``key`` + ``insert_values`` into ``table``, or apply ``set_values`` (column -> SQL expression)
+    to the row already holding ``key``; ``key`` must match a unique constraint."""
+    dialect = db.session.get_bind().dialect.name
+    values = {**key, **insert_values}
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(**values).on_conflict_do_update(index_elements=list(key), set_=set_values)
+        db.session.execute(stmt)
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        db.session.execute(insert(table).values(**values).on_duplicate_key_update(**set_values))
+    else:
+        match = db.and_(*[table.c[k] == v for k, v in key.items()])
+        res = db.session.execute(db.update(table).where(match).values(**set_values))
+        if not res.rowcount:
+            db.session.execute(db.insert(table).values(**values))
+
+
+def _add(day, zone_id, category_id, product_id, deltas):
+    from ..models import DailySalesRollup
+    table = DailySalesRollup.__table__
+    now = datetime.utcnow()
+    key = {'day': day, 'zone_id': zone_id, 'category_id': category_id, 'product_id': product_id}
+    insert_values = {k: max(v, 0) for k, v in deltas.items()}
+    insert_values['updated_at'] = now
+    set_values = {k: table.c[k] + v for k, v in deltas.items()}
+    set_values['updated_at'] = now
+    upsert(table, key, insert_values, set_values)
+
+
+def record_order(order, sign=1):
+    """Add (sign=1) or remove (sign=-1) the order on its day's rows; the caller commits."""
+    from ..models import OrderItem, Product
+    day = _as_date(order.created_at or datetime.utcnow())
+    zone = int(order.delivery_zone_id or 0)
+    _add(day, zone, ORDER_LEVEL, ORDER_LEVEL, {'order_count': sign, 'order_total': (order.total_amount or 0) * sign})
+    rows = (
+        db.session.query(
+            db.func.coalesce(Product.category_id, 0), OrderItem.product_id,
+            db.func.coalesce(db.func.sum(OrderItem.quantity), 0),
+            db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.unit_price), 0),
+        )
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .filter(OrderItem.order_id == order.id)
+        .group_by(Product.category_id, OrderItem.product_id)
+        .all()
+    )
+    for category_id, pid, units, revenue in rows:
+        _add(day, zone, int(category_id), int(pid), {'units': int(units or 0) * sign, 'revenue': (revenue or 0) * sign})
+
+
+def _replace(start=None, end=None):
+    from ..models import DailySalesRollup
+    rows = _aggregate(start, end)
+    query = db.session.query(DailySalesRollup)
+    if start is not None:
+        query = query.filter(DailySalesRollup.day >= start.date())
+    if end is not None:
+        query = query.filter(DailySalesRollup.day < end.date())
+    query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(db.insert(DailySalesRollup), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def refresh_days(days):
+    """Rebuild the rollup for each given date (or datetime)."""
+    count = 0
+    for d in sorted({_as_date(d) for d in days if d}):
+        start = datetime(d.year, d.month, d.day)
+        count += _replace(start, start + timedelta(days=1))
+    return count
+
+
+def refresh_recent(days=RECENT_DAYS, now=None):
+    today = (now or datetime.utcnow()).date()
+    return refresh_days([today - timedelta(days=i) for i in range(days)])
+
+
+def rebuild():
+    """Recompute the whole table from order history."""
+    return _replace()
+
+
+# --- Readers used by the admin pages ---
+
+def _order_rows():
+    from ..models import DailySalesRollup as R
+    return db.session.query(R).filter(R.product_id == ORDER_LEVEL, R.category_id == ORDER_LEVEL)
+
+
+def totals():
+    """(order_count, sales) over all days."""
+    from ..models import DailySalesRollup as R
+    count, sales = _order_rows().with_entities(
+        db.func.coalesce(db.func.sum(R.order_count), 0),
+        db.func.coalesce(db.func.sum(R.order_total), 0),
+    ).one()
+    return int(count or 0), sales or 0
+
+
+def revenue_by_zone(limit=5):
+    from ..models import DailySalesRollup as R, DeliveryZone
+    total = db.func.sum(R.order_total)
+    return (
+        _order_rows().with_entities(DeliveryZone.name, total)
+        .join(DeliveryZone, DeliveryZone.id == R.zone_id)
+        .group_by(DeliveryZone.name)
+        .order_by(total.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def daily_sales(start=None, end=None):
+    """[(day, sales, order_count)] ordered by day; bounds are dates, end exclusive."""
+    from ..models import DailySalesRollup as R
+    query = _order_rows()
+    if start is not None:
+        query = query.filter(R.day >= start)
+    if end is not None:
+        query = query.filter(R.day < end)
+    return (
+        query.with_entities(R.day, db.func.sum(R.order_total), db.func.sum(R.order_count))
+        .group_by(R.day)
+        .order_by(R.day)
+        .all()
+    )
+
+
+def monthly_sales(months):
+    """{month start date: (sales, order_count)} for the given month start dates."""
+    out = {m: (0.0, 0) for m in months}
+    if not months:
+        return out
+    first = min(months)
+    last = max(months)
+    end = date(last.year + 1, 1, 1) if last.month == 12 else date(last.year, last.month + 1, 1)
+    for day, sales, count in daily_sales(first, end):
+        key = _as_date(day).replace(day=1)
+        if key in out:
+            s, c = out[key]
+            out[key] = (s + float(sales or 0), c + int(count or 0))
+    return out
+
+
+def sales_by_category():
+    from ..models import DailySalesRollup as R, Category
+    return (
+        db.session.query(Category.name, db.func.sum(R.revenue))
+        .select_from(R)
+        .outerjoin(Category, Category.id == R.category_id)
+        .filter(R.product_id != ORDER_LEVEL)
+        .group_by(Category.name)
+        .all()
+    )
+
+
+def top_products(limit=10):
+    from ..models import DailySalesRollup as R, Product
+    units = db.func.sum(R.units)
+    return (
+        db.session.query(Product.name, units)
+        .join(Product, Product.id == R.product_id)
+        .filter(R.product_id != ORDER_LEVEL)
+        .group_by(Product.name)
+        .order_by(units.desc())
+        .limit(limit)
+        .all()
+    )
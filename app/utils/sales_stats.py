@@ -0,0 +1,155 @@
+"""
+Materialized best-seller counters (``product_sales_stats``).
+
+One row per product with units and revenue sold over its lifetime and over
+the last 7 and 30 days (calendar days, today included). Readers such as the
+homepage "top selling" strip, the category "best selling" sort and the
+typeahead ranking get the top k with an indexed ``ORDER BY ... LIMIT k``
+instead of grouping the whole order-items history.
+
+Writes:
+
+- ``record_order(order, +1/-1)`` runs inside the checkout / cancellation
+  transaction and adds the order's units to every counter with an atomic
+  upsert, so concurrent checkouts never lose increments;
+- ``refresh_windows()`` (Celery beat, ``app.refresh_product_sales_stats``)
+  recomputes the 7/30-day counters from ``daily_sales_rollup`` so old sales
+  age out;
+- ``rebuild()`` recomputes everything (backfill after migrating).
+
+Cancelled orders are not counted, matching ``utils.sales_rollup``.
+"""
+from datetime import datetime, timedelta
+
+from ..extensions import db
+from .sales_rollup import EXCLUDED_STATUSES, ORDER_LEVEL, upsert
+
+WINDOWS = {'total': 'units_total', '7d': 'units_7d', '30d': 'units_30d'}
+
+
+def _upsert(product_id, insert_values, set_values):
+    """INSERT the row or apply set_values (column -> SQL expression) to the existing one."""
+    from ..models import ProductSalesStats as S
+    now = datetime.utcnow()
+    upsert(S.__table__, {'product_id': product_id}, {'updated_at': now, **insert_values}, {**set_values, 'updated_at': now})
+
+
+def record_order(order, sign=1, now=None):
+    """Add (sign=1) or remove (sign=-1) the order's items; the caller commits."""
+    from ..models import OrderItem, ProductSalesStats as S
+    table = S.__table__
+    now = now or datetime.utcnow()
+    placed = order.created_at or now
+    age_days = (now.date() - placed.date()).days
+    rows = (
+        db.session.query(
+            OrderItem.product_id,
+            db.func.coalesce(db.func.sum(OrderItem.quantity), 0),
+            db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.unit_price), 0),
+        )
+        .filter(OrderItem.order_id == order.id)
+        .group_by(OrderItem.product_id)
+        .all()
+    )
+    for pid, units, revenue in rows:
+        units = int(units or 0) * sign
+        revenue = (revenue or 0) * sign
+        deltas = {'units_total': units, 'revenue_total': revenue}
+        if age_days < 30:
+            deltas.update(units_30d=units, revenue_30d=revenue)
+        if age_days < 7:
+            deltas.update(units_7d=units, revenue_7d=revenue)
+        insert_values = {k: max(v, 0) for k, v in deltas.items()}
+        set_values = {k: table.c[k] + v for k, v in deltas.items()}
+        if sign > 0:
+            insert_values['last_sold_at'] = placed
+            set_values['last_sold_at'] = placed
+        _upsert(pid, insert_values, set_values)
+
+
+def refresh_windows(now=None):
+    """Recompute the 7/30-day counters from the daily rollup and commit; returns rows updated.
+
+    ``record_order`` changes the rollup and these counters in one transaction,
+    so the stats rows are locked first (a no-op on SQLite, where the write
+    lock serializes instead). Each UPDATE then reads a rollup that no pending
+    checkout can still change, and no increment is overwritten.
+    """
+    from ..models import DailySalesRollup as R, ProductSalesStats as S
+    table = S.__table__
+    today = (now or datetime.utcnow()).date()
+    d7, d30 = today - timedelta(days=6), today - timedelta(days=29)
+    recent = db.case((R.day >= d7, 1), else_=0)
+    db.session.query(S.product_id).with_for_update().all()
+    sums = (
+        db.select(
+            R.product_id.label('product_id'),
+            db.func.sum(R.units).label('u30'), db.func.sum(R.revenue).label('r30'),
+            db.func.sum(R.units * recent).label('u7'), db.func.sum(R.revenue * recent).label('r7'),
+        )
+        .where(R.product_id != ORDER_LEVEL, R.day >= d30)
+        .group_by(R.product_id)
+        .subquery()
+    )
+    updated = db.session.execute(
+        db.update(table)
+        .where(table.c.product_id == sums.c.product_id)
+        .values(units_30d=sums.c.u30, revenue_30d=sums.c.r30, units_7d=sums.c.u7, revenue_7d=sums.c.r7)
+    ).rowcount
+    sold = db.select(R.product_id).where(R.product_id != ORDER_LEVEL, R.day >= d30)
+    updated += db.session.execute(
+        db.update(table)
+        .where(
+            db.or_(table.c.units_30d != 0, table.c.revenue_30d != 0, table.c.units_7d != 0, table.c.revenue_7d != 0),
+            table.c.product_id.notin_(sold),
+        )
+        .values(units_7d=0, revenue_7d=0, units_30d=0, revenue_30d=0)
+    ).rowcount
+    db.session.commit()
+    return updated
+
+
+def rebuild(now=None):
+    """Recompute lifetime counters from order items, then the windows."""
+    from ..models import Order, OrderItem, ProductSalesStats as S
+    rows = (
+        db.session.query(
+            OrderItem.product_id,
+            db.func.coalesce(db.func.sum(OrderItem.quantity), 0),
+            db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.unit_price), 0),
+            db.func.max(Order.created_at),
+        )
+        .join(Order, OrderItem.order_id == Order.id)
+        .filter(db.or_(Order.status.is_(None), Order.status.notin_(EXCLUDED_STATUSES)))
+        .group_by(OrderItem.product_id)
+        .all()
+    )
+    db.session.query(S).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(db.insert(S), [
+            {'product_id': pid, 'units_total': int(units), 'revenue_total': revenue, 'last_sold_at': last}
+            for pid, units, revenue, last in rows
+        ])
+    db.session.commit()
+    refresh_windows(now)
+    return len(rows)
+
+
+def top_product_ids(limit=8, window='total', category_ids=None):
+    """Ids of the best-selling active products for window 'total', '7d' or '30d'."""
+    from ..models import Product, ProductSalesStats as S
+    column = getattr(S, WINDOWS.get(window, 'units_total'))
+    query = (
+        db.session.query(S.product_id)
+        .join(Product, Product.id == S.product_id)
+        .filter(column > 0, Product.is_active.is_(True))
+    )
+    if category_ids:
+        query = query.filter(Product.category_id.in_(category_ids))
+    return [pid for (pid,) in query.order_by(column.desc(), S.product_id).limit(limit)]
+
+
+def units_by_product():
+    """{product_id: lifetime units} for ranking (one scan of the small stats table)."""
+    from ..models import ProductSalesStats as S
+    return {pid: int(units or 0) for pid, units in db.session.query(S.product_id, S.units_total)}
@@ -1,9 +1,59 @@
+"""
+Product search.
+
+``search_product_ids(q)`` returns product ids ranked by relevance from the
+backend selected by ``SEARCH_BACKEND`` (``auto`` | ``postgres`` | ``sqlite`` |
+``memory``):
+
+* postgres - ``tsvector`` over name (weight A) and description (weight B),
+  served by the ``ix_products_search_tsv`` GIN expression index and ranked
+  with ``ts_rank``. The index is maintained by Postgres itself.
+* sqlite   - an FTS5 table ``products_fts`` (porter stemming), ranked with
+  ``bm25``. Kept in sync by ``index_product``/``remove_product``/``reindex_all``.
+* memory   - an in-process inverted index, rebuilt when the ``search_index``
+  cache tag changes so every worker picks up writes.
+
+Query words are normalised (lowercase, plural stripping) and corrected
+for typos before they reach the backend, so "tomatos" or "bananna" still
+find tomatoes and bananas. The memory backend corrects against its own
+index. The database backends correct against product-name words only,
+using the typeahead trie in ``utils.suggest``, which is updated per
+product rather than rebuilt, so they never build a full-catalog index. Callers get ``None``
+when search is unavailable and should fall back to a plain ``ilike`` filter.
+
+Algolia indexing (``ALGOLIA_APP_ID``/``ALGOLIA_ADMIN_KEY``) is still done by
+``index_product`` when configured.
+"""
+import difflib
 import os
+import re
+import threading
+import time
+import weakref
+
 try:
     from algoliasearch.search_client import SearchClient
 except Exception:
     SearchClient = None
 
+from ..extensions import db
+from . import cache_tags
+
+# Cache tag bumped on every index write; in-process indexes rebuild when it changes
+SEARCH_INDEX = 'search_index'
+# Upper bound on ids returned for a query (relevance beyond this is noise)
+MAX_RESULTS = 500
+# Rebuild in-process data at least this often even without writes (seconds)
+REFRESH_SECONDS = 600
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_FTS_TABLE = 'products_fts'
+PG_DOCUMENT_SQL = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
 def get_algolia_client():
     if not SearchClient:
         return None
@@ -13,7 +63,8 @@ def get_algolia_client():
         return None
     return SearchClient.create(id, key)
 
-def index_product(product):
+
+def _index_algolia(product):
     client = get_algolia_client()
     if not client:
         return False
@@ -30,3 +81,345 @@ def index_product(product):
         return True
     except Exception:
         return False
+
+
+# --- text processing -------------------------------------------------------
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def stem(word):
+    """Light plural stripping suited to grocery names (tomatoes -> tomato, berries -> berry)."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    return [stem(t) for t in tokenize(text)]
+
+
+# --- in-process inverted index (memory backend) ----------------------------
+
+class _InvertedIndex:
+    NAME_WEIGHT = 3.0
+    DESCRIPTION_WEIGHT = 1.0
+
+    def __init__(self):
+        self.postings = {}   # term -> {product_id: score}
+        self.version = None
+        self.built_at = 0.0
+
+    def build(self, rows):
+        postings = {}
+        for pid, name, description in rows:
+            for weight, text in ((self.NAME_WEIGHT, name), (self.DESCRIPTION_WEIGHT, description)):
+                for t in terms(text):
+                    bucket = postings.setdefault(t, {})
+                    bucket[pid] = bucket.get(pid, 0.0) + weight
+        self.postings = postings
+        self.built_at = time.time()
+
+    def expand(self, term, prefix=False):
+        if not prefix:
+            return [term] if term in self.postings else []
+        return [t for t in self.postings if t.startswith(term)]
+
+    def correct(self, term, prefix=False):
+        """Return the term itself if the catalog knows it, else the closest known term."""
+        if not self.postings or term.isdigit() or self.expand(term, prefix):
+            return term
+        if len(term) < 3:
+            return term
+        close = difflib.get_close_matches(term, self.postings.keys(), n=1, cutoff=0.8)
+        return close[0] if close else term
+
+    def search(self, query_terms, prefix_last=True, match_all=True, limit=MAX_RESULTS):
+        scores = None
+        for i, term in enumerate(query_terms):
+            hits = {}
+            for t in self.expand(term, prefix=prefix_last and i == len(query_terms) - 1):
+                for pid, score in self.postings.get(t, {}).items():
+                    hits[pid] = max(hits.get(pid, 0.0), score)
+            if scores is None:
+                scores = hits
+            elif match_all:
+                scores = {pid: scores[pid] + s for pid, s in hits.items() if pid in scores}
+            else:
+                for pid, s in hits.items():
+                    scores[pid] = scores.get(pid, 0.0) + s
+        ranked = sorted((scores or {}).items(), key=lambda kv: (-kv[1], -kv[0]))
+        return [pid for pid, _ in ranked[:limit]]
+
+
+_index = _InvertedIndex()
+_index_lock = threading.Lock()
+
+
+def _catalog_rows():
+    from ..models import Product
+    return (
+        db.session.query(Product.id, Product.name, Product.description)
+        .filter(Product.is_active.is_(True))
+        .all()
+    )
+
+
+def _vocabulary():
+    """The in-process index, rebuilt if another worker (or this one) wrote since it was built."""
+    try:
+        version = cache_tags.current_versions([SEARCH_INDEX]).get(SEARCH_INDEX)
+    except Exception:
+        version = None
+    stale = (_index.version != version) or (time.time() - _index.built_at > REFRESH_SECONDS)
+    if stale:
+        with _index_lock:
+            if (_index.version != version) or (time.time() - _index.built_at > REFRESH_SECONDS):
+                _index.build(_catalog_rows())
+                _index.version = version
+    return _index
+
+
+# --- backends --------------------------------------------------------------
+
+class MemoryBackend:
+    name = 'memory'
+
+    def search(self, query_terms, prefix_last, match_all, limit):
+        return _vocabulary().search(query_terms, prefix_last=prefix_last, match_all=match_all, limit=limit)
+
+    def index(self, product):
+        pass  # rebuilt lazily from the DB when the SEARCH_INDEX tag changes
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTSBackend:
+    name = 'sqlite'
+    _ready = weakref.WeakSet()  # engines whose FTS table has been checked
+
+    def _ensure(self):
+        engine = db.engine
+        if engine in self._ready:
+            return
+        db.session.execute(db.text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {_FTS_TABLE} "
+            "USING fts5(name, description, tokenize='porter unicode61')"
+        ))
+        indexed = db.session.execute(db.text(f"SELECT count(*) FROM {_FTS_TABLE}")).scalar() or 0
+        active = db.session.execute(db.text("SELECT count(*) FROM products WHERE is_active = 1")).scalar() or 0
+        if indexed != active:
+            self._fill()
+        db.session.commit()
+        self._ready.add(engine)
+
+    def _fill(self):
+        db.session.execute(db.text(f"DELETE FROM {_FTS_TABLE}"))
+        db.session.execute(db.text(
+            f"INSERT INTO {_FTS_TABLE}(rowid, name, description) "
+            "SELECT id, coalesce(name, ''), coalesce(description, '') FROM products WHERE is_active = 1"
+        ))
+
+    def search(self, query_terms, prefix_last, match_all, limit):
+        self._ensure()
+        parts = []
+        for i, t in enumerate(query_terms):
+            star = '*' if prefix_last and i == len(query_terms) - 1 else ''
+            parts.append(f'"{t}"{star}')
+        expr = (' AND ' if match_all else ' OR ').join(parts)
+        rows = db.session.execute(db.text(
+            f"SELECT rowid FROM {_FTS_TABLE} WHERE {_FTS_TABLE} MATCH :q "
+            f"ORDER BY bm25({_FTS_TABLE}, 3.0, 1.0) LIMIT :limit"
+        ), {'q': expr, 'limit': limit}).all()
+        return [r[0] for r in rows]
+
+    def index(self, product):
+        self._ensure()
+        db.session.execute(db.text(f"DELETE FROM {_FTS_TABLE} WHERE rowid = :id"), {'id': product.id})
+        if product.is_active:
+            db.session.execute(db.text(
+                f"INSERT INTO {_FTS_TABLE}(rowid, name, description) VALUES (:id, :name, :description)"
+            ), {'id': product.id, 'name': product.name or '', 'description': product.description or ''})
+        db.session.commit()
+
+    def remove(self, product_id):
+        self._ensure()
+        db.session.execute(db.text(f"DELETE FROM {_FTS_TABLE} WHERE rowid = :id"), {'id': int(product_id)})
+        db.session.commit()
+
+    def rebuild(self):
+        self._ensure()
+        self._fill()
+        db.session.commit()
+
+
+class PostgresBackend:
+    name = 'postgres'
+
+    def search(self, query_terms, prefix_last, match_all, limit):
+        parts = []
+        for i, t in enumerate(query_terms):
+            parts.append(t + (':*' if prefix_last and i == len(query_terms) - 1 else ''))
+        tsquery = (' & ' if match_all else ' | ').join(parts)
+        rows = db.session.execute(db.text(
+            f"SELECT id FROM products, to_tsquery('english', :q) AS query "
+            f"WHERE is_active AND ({PG_DOCUMENT_SQL}) @@ query "
+            f"ORDER BY ts_rank({PG_DOCUMENT_SQL}, query) DESC, id DESC LIMIT :limit"
+        ), {'q': tsquery, 'limit': limit}).all()
+        return [r[0] for r in rows]
+
+    def index(self, product):
+        pass  # the GIN expression index is maintained by Postgres on write
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+_backends = {}
+
+
+def get_backend():
+    from flask import current_app
+    choice = (current_app.config.get('SEARCH_BACKEND') or 'auto').lower()
+    if choice == 'auto':
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            choice = 'postgres'
+        elif dialect == 'sqlite':
+            choice = 'sqlite'
+        else:
+            choice = 'memory'
+    if choice not in _backends:
+        _backends[choice] = {
+            'postgres': PostgresBackend,
+            'sqlite': SQLiteFTSBackend,
+        }.get(choice, MemoryBackend)()
+    return _backends[choice]
+
+
+# --- public API ------------------------------------------------------------
+
+def normalize_query(q, prefix_last=True):
+    """Stem and typo-correct the words of q (see the module docstring for the vocabulary used)."""
+    words = tokenize(q)
+    if not words:
+        return []
+    try:
+        if get_backend().name == 'memory':
+            vocab = _vocabulary()
+            return [vocab.correct(stem(w), prefix=prefix_last and i == len(words) - 1) for i, w in enumerate(words)]
+        from . import suggest
+        return [stem(suggest.correct(w)) for w in words]
+    except Exception:
+        return [stem(w) for w in words]
+
+
+def search_product_ids(q, limit=MAX_RESULTS, prefix_last=True):
+    """Ranked ids of active products matching q, or None if search is unavailable.
+
+    All words must match; if nothing does, any-word matches are returned instead.
+    """
+    query_terms = normalize_query(q, prefix_last=prefix_last)
+    if not query_terms:
+        return []
+    try:
+        backend = get_backend()
+        ids = backend.search(query_terms, prefix_last, True, limit)
+        if not ids and len(query_terms) > 1:
+            ids = backend.search(query_terms, prefix_last, False, limit)
+        return ids
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return None
+
+
+def filter_query(query, q, limit=MAX_RESULTS):
+    """Restrict a Product query to search matches; returns (query, ranked_ids).
+
+    ``ranked_ids`` is None when the backend failed and an ilike filter was used.
+    """
+    from ..models import Product
+    ids = search_product_ids(q, limit=limit)
+    if ids is None:
+        return query.filter(Product.name.ilike(f"%{q}%")), None
+    return query.filter(Product.id.in_(ids or [-1])), ids
+
+
+def order_by_rank(query, ids):
+    """Order a Product query by the position of each id in ``ids``."""
+    from ..models import Product
+    if not ids:
+        return query
+    return query.order_by(db.case({pid: pos for pos, pid in enumerate(ids)}, value=Product.id, else_=len(ids)))
+
+
+def _bump():
+    try:
+        cache_tags.invalidate(SEARCH_INDEX)
+    except Exception:
+        pass
+
+
+def index_product(product):
+    """Update the search index for one product (call after the product is committed)."""
+    try:
+        get_backend().index(product)
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+    _bump()
+    try:
+        from . import suggest
+        suggest.upsert(product)
+    except Exception:
+        pass
+    return _index_algolia(product)
+
+
+def remove_product(product_id):
+    try:
+        get_backend().remove(product_id)
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+    _bump()
+    try:
+        from . import suggest
+        suggest.remove(product_id)
+    except Exception:
+        pass
+
+
+def reindex_all():
+    """Rebuild the search index from the products table (after bulk imports/deletes)."""
+    try:
+        get_backend().rebuild()
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+    _bump()
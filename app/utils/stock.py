@@ -0,0 +1,70 @@
+"""
+Set-based stock updates for checkout.
+
+``decrement_stock`` takes every product of an order at once and issues a
+single conditional ``UPDATE``:
+
+    UPDATE products SET stock = stock - CASE id WHEN ... END
+    WHERE id IN (...) AND (stock IS NULL OR stock >= CASE id WHEN ... END)
+
+The guard is evaluated by the database under the row's write lock, so two
+concurrent checkouts can never both take the last unit, on SQLite as well as
+on Postgres/MySQL. If fewer rows match than products were requested, some
+line was short: the caller rolls back and ``short_products`` names them.
+``stock IS NULL`` means unlimited and stays NULL. ``increment_stock`` is the
+matching single-statement restock used when reservations are released.
+"""
+from ..extensions import db
+
+
+def _merge(lines):
+    quantities = {}
+    for product_id, qty in lines:
+        quantities[int(product_id)] = quantities.get(int(product_id), 0) + int(qty or 0)
+    return {pid: q for pid, q in quantities.items() if q > 0}
+
+
+def decrement_stock(lines):
+    """Take (product_id, quantity) pairs off stock in one UPDATE; True if every product had enough."""
+    from ..models import Product
+    quantities = _merge(lines)
+    if not quantities:
+        return True
+    need = db.case(quantities, value=Product.id, else_=0)
+    stmt = (
+        db.update(Product)
+        .where(Product.id.in_(list(quantities)))
+        .where(db.or_(Product.stock.is_(None), Product.stock >= need))
+        .values(stock=Product.stock - need)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(stmt).rowcount == len(quantities)
+
+
+def increment_stock(lines):
+    """Put (product_id, quantity) pairs back on stock in one UPDATE."""
+    from ..models import Product
+    quantities = _merge(lines)
+    if not quantities:
+        return 0
+    back = db.case(quantities, value=Product.id, else_=0)
+    stmt = (
+        db.update(Product)
+        .where(Product.id.in_(list(quantities)), Product.stock.isnot(None))
+        .values(stock=Product.stock + back)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(stmt).rowcount
+
+
+def short_products(lines):
+    """Products (as currently stored) that cannot cover the requested quantities."""
+    from ..models import Product
+    quantities = _merge(lines)
+    if not quantities:
+        return []
+    rows = db.session.query(Product).filter(Product.id.in_(list(quantities))).all()
+    found = {p.id for p in rows}
+    short = [p for p in rows if p.stock is not None and int(p.stock) < quantities[p.id]]
+    missing = [pid for pid in quantities if pid not in found]
+    return short + [None] * len(missing)
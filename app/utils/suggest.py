@@ -0,0 +1,303 @@
+"""
+Process-local prefix index for typeahead suggestions.
+
+Every word of an active product's name (and its slug) is inserted into a
+trie; each node keeps the ids of all products below it plus a precomputed
+top-N list ordered by popularity (lifetime units sold, from
+``product_sales_stats``), so a
+one-word lookup is a walk of ``len(prefix)`` nodes with no DB access.
+
+It doubles as the name vocabulary ``utils.search`` corrects query typos
+against: ``correct`` walks it with a bounded edit distance.
+
+The trie is built on first use and rebuilt after ``REFRESH_SECONDS`` so
+popularity follows sales. In between, writes are applied incrementally.
+Writes in this process go through ``upsert``/``remove``, which
+``utils.search`` calls when a product is indexed. Writes by other workers
+bump the ``search_index`` cache tag; the tag is checked at most once per
+``SUGGEST_CHECK_SECONDS``, and a bump replays the product entries of the
+catalog change log after the last one applied. The trie is only rebuilt
+when that backlog is longer than ``MAX_DELTA`` or the log was reset.
+"""
+import heapq
+import threading
+import time
+import weakref
+
+from flask import current_app
+
+from ..extensions import db
+from . import cache_tags
+from .search import SEARCH_INDEX, tokenize
+
+TOP_N = 10
+MAX_PREFIX = 24
+REFRESH_SECONDS = 600
+DEFAULT_CHECK_SECONDS = 2
+MAX_DELTA = 500
+
+
+class _Node:
+    __slots__ = ('children', 'ids', 'top', 'ends')
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+        self.top = []
+        self.ends = 0   # products having this exact word
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.root = _Node()
+        self.products = {}     # id -> (name, slug, popularity)
+        self.version = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+        self.change_id = 0     # last catalog change applied
+        self.engine = None     # weakref to the engine it was built from
+        self.lock = threading.RLock()
+
+    # --- building ---------------------------------------------------------
+
+    @staticmethod
+    def _keys(name, slug):
+        keys = set(tokenize(name)) | set(tokenize(slug))
+        return {k[:MAX_PREFIX] for k in keys if k}
+
+    def _rank_key(self, pid):
+        name, _slug, popularity = self.products[pid]
+        return (-popularity, name.lower(), pid)
+
+    def _refresh_top(self, node):
+        node.top = heapq.nsmallest(TOP_N, node.ids, key=self._rank_key)
+
+    def _insert(self, pid, keys, touched):
+        for key in keys:
+            node = self.root
+            for ch in key:
+                node = node.children.setdefault(ch, _Node())
+                node.ids.add(pid)
+                touched.add(node)
+            node.ends += 1
+
+    def _discard(self, pid, keys, touched):
+        for key in keys:
+            node = self.root
+            path = []
+            for ch in key:
+                node = node.children.get(ch)
+                if node is None:
+                    break
+                node.ids.discard(pid)
+                path.append((ch, node))
+                touched.add(node)
+            else:
+                node.ends = max(node.ends - 1, 0)
+            # prune empty branches
+            parent = self.root
+            for ch, child in path:
+                if not child.ids:
+                    parent.children.pop(ch, None)
+                    touched.discard(child)
+                    break
+                parent = child
+
+    def build(self, rows, popularity):
+        with self.lock:
+            self.root = _Node()
+            self.products = {}
+            touched = set()
+            for pid, name, slug in rows:
+                self.products[pid] = (name or '', slug or '', int(popularity.get(pid, 0)))
+                self._insert(pid, self._keys(name, slug), touched)
+            for node in touched:
+                self._refresh_top(node)
+            self.built_at = time.time()
+
+    def upsert(self, pid, name, slug, active=True):
+        with self.lock:
+            touched = set()
+            old = self.products.pop(pid, None)
+            popularity = old[2] if old else 0
+            if old:
+                self._discard(pid, self._keys(old[0], old[1]), touched)
+            if active:
+                self.products[pid] = (name or '', slug or '', popularity)
+                self._insert(pid, self._keys(name, slug), touched)
+            for node in touched:
+                self._refresh_top(node)
+
+    def remove(self, pid):
+        self.upsert(pid, None, None, active=False)
+
+    # --- lookup -----------------------------------------------------------
+
+    def _node(self, prefix):
+        node = self.root
+        for ch in prefix[:MAX_PREFIX]:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def correct(self, word):
+        """``word`` if some product-name word starts with it, else the closest name word (or ``word``).
+
+        Walks the trie with one edit-distance row per node, pruning branches
+        that are already too far off, so the cost follows the number of
+        near-matching words rather than the vocabulary size.
+        """
+        word = word[:MAX_PREFIX]
+        if len(word) < 3 or word.isdigit():
+            return word
+        with self.lock:
+            if self._node(word) is not None:
+                return word
+            limit = 1 if len(word) < 6 else 2
+            best = None   # (distance, -products, candidate)
+            stack = [(ch, child, ch, range(len(word) + 1)) for ch, child in self.root.children.items()]
+            while stack:
+                ch, node, key, above = stack.pop()
+                row = [above[0] + 1]
+                for i, wc in enumerate(word, 1):
+                    row.append(min(row[i - 1] + 1, above[i] + 1, above[i - 1] + (wc != ch)))
+                if node.ends and row[-1] <= limit:
+                    cand = (row[-1], -len(node.ids), key)
+                    if best is None or cand < best:
+                        best = cand
+                if min(row) <= limit:
+                    stack.extend((c, child, key + c, row) for c, child in node.children.items())
+            return best[2] if best else word
+
+    def lookup(self, q, limit=TOP_N):
+        words = tokenize(q)
+        if not words:
+            return []
+        with self.lock:
+            nodes = [self._node(w) for w in words]
+            if any(n is None for n in nodes):
+                return []
+            if len(nodes) == 1 and limit <= TOP_N:
+                ids = nodes[0].top[:limit]
+            else:
+                common = set.intersection(*(n.ids for n in nodes))
+                ids = heapq.nsmallest(limit, common, key=self._rank_key)
+            return [(pid,) + self.products[pid][:2] for pid in ids]
+
+
+_index = SuggestIndex()
+
+
+def _load():
+    from ..models import Product
+    from .sales_stats import units_by_product
+    rows = (
+        db.session.query(Product.id, Product.name, Product.slug)
+        .filter(Product.is_active.is_(True))
+        .all()
+    )
+    return rows, units_by_product()
+
+
+def _log_head():
+    from ..models import CatalogChange
+    return db.session.query(db.func.max(CatalogChange.id)).scalar() or 0
+
+
+def _rebuild(version):
+    # Read the log head first: changes committed while loading are replayed again, which is harmless
+    head = _log_head()
+    rows, popularity = _load()
+    _index.build(rows, popularity)
+    _index.version = version
+    _index.change_id = head
+    _index.engine = weakref.ref(db.engine)
+
+
+def _apply_changes():
+    """Replay product changes logged since the last build; False when a rebuild is needed instead."""
+    from ..models import CatalogChange, Product
+    if _log_head() < _index.change_id:
+        return False  # the log was reset
+    changes = (
+        db.session.query(CatalogChange.id, CatalogChange.entity_id)
+        .filter(CatalogChange.entity == 'product', CatalogChange.id > _index.change_id)
+        .order_by(CatalogChange.id)
+        .limit(MAX_DELTA + 1)
+        .all()
+    )
+    if len(changes) > MAX_DELTA:
+        return False
+    if not changes:
+        return True
+    ids = {c.entity_id for c in changes}
+    current = {
+        r.id: r
+        for r in db.session.query(Product.id, Product.name, Product.slug, Product.is_active)
+        .filter(Product.id.in_(ids))
+    }
+    for pid in ids:
+        r = current.get(pid)
+        if r is not None and r.is_active:
+            _index.upsert(pid, r.name, r.slug)
+        else:
+            _index.remove(pid)
+    _index.change_id = changes[-1].id
+    return True
+
+
+def _check_seconds():
+    value = current_app.config.get('SUGGEST_CHECK_SECONDS')
+    return DEFAULT_CHECK_SECONDS if value is None else float(value)
+
+
+def _current_version():
+    try:
+        return cache_tags.current_versions([SEARCH_INDEX]).get(SEARCH_INDEX)
+    except Exception:
+        return None
+
+
+def get_index():
+    """The process-local index, brought up to date at most once per ``SUGGEST_CHECK_SECONDS``."""
+    now = time.time()
+    engine = db.engine
+    built_here = _index.engine is not None and _index.engine() is engine
+    if built_here and now - _index.checked_at < _check_seconds():
+        return _index
+    version = _current_version()
+    with _index.lock:
+        if not built_here or now - _index.built_at > REFRESH_SECONDS:
+            _rebuild(version)
+        elif _index.version != version:
+            if not _apply_changes():
+                _rebuild(version)
+            _index.version = version
+        _index.checked_at = now
+    return _index
+
+
+def suggest(q, limit=TOP_N):
+    """[(id, name, slug), ...] for products whose words start with each word of q."""
+    return get_index().lookup(q, limit=limit)
+
+
+def correct(word):
+    """Typo-correct one query word against the product-name vocabulary."""
+    return get_index().correct(word)
+
+
+def upsert(product):
+    """Apply a product write to this process's index (other workers replay it from the change log)."""
+    if not _index.built_at:
+        return
+    with _index.lock:
+        _index.upsert(product.id, product.name, product.slug, active=bool(product.is_active))
+
+
+def remove(product_id):
+    if not _index.built_at:
+        return
+    with _index.lock:
+        _index.remove(int(product_id))
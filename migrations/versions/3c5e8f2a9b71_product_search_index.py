@@ -0,0 +1,41 @@
+"""product full-text search index
+
+Revision ID: 3c5e8f2a9b71
+Revises: 1acb9548750a
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e8f2a9b71'
+down_revision = '1acb9548750a'
+branch_labels = None
+depends_on = None
+
+# Must match app.utils.search.PG_DOCUMENT_SQL so the planner can use the index
+PG_DOCUMENT_SQL = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_products_search_tsv ON products USING gin (({PG_DOCUMENT_SQL}))")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(name, description, tokenize='porter unicode61')")
+        op.execute(
+            "INSERT INTO products_fts(rowid, name, description) "
+            "SELECT id, coalesce(name, ''), coalesce(description, '') FROM products WHERE is_active = 1"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_products_search_tsv")
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS products_fts")
@@ -0,0 +1,40 @@
+"""daily sales rollup table
+
+Revision ID: 5d2a7c4e1f08
+Revises: 3c5e8f2a9b71
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a7c4e1f08'
+down_revision = '3c5e8f2a9b71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('zone_id', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('category_id', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('product_id', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('order_total', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('units', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'zone_id', 'category_id', 'product_id', name='uq_daily_sales_rollup_key')
+    )
+    op.create_index('ix_daily_sales_rollup_day', 'daily_sales_rollup', ['day'], unique=False)
+    # Backfill with: python -m scripts.rebuild_sales_rollup
+
+
+def downgrade():
+    op.drop_index('ix_daily_sales_rollup_day', table_name='daily_sales_rollup')
+    op.drop_table('daily_sales_rollup')
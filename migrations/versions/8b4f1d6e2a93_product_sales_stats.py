@@ -0,0 +1,42 @@
+"""product sales stats table
+
+Revision ID: 8b4f1d6e2a93
+Revises: 5d2a7c4e1f08
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4f1d6e2a93'
+down_revision = '5d2a7c4e1f08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_sales_stats',
+    sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('units_total', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('revenue_total', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('units_7d', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('revenue_7d', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('units_30d', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('revenue_30d', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+    sa.Column('last_sold_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index('ix_product_sales_stats_units_total', 'product_sales_stats', ['units_total'], unique=False)
+    op.create_index('ix_product_sales_stats_units_7d', 'product_sales_stats', ['units_7d'], unique=False)
+    op.create_index('ix_product_sales_stats_units_30d', 'product_sales_stats', ['units_30d'], unique=False)
+    # Backfill with: python -m scripts.rebuild_sales_rollup
+
+
+def downgrade():
+    op.drop_index('ix_product_sales_stats_units_30d', table_name='product_sales_stats')
+    op.drop_index('ix_product_sales_stats_units_7d', table_name='product_sales_stats')
+    op.drop_index('ix_product_sales_stats_units_total', table_name='product_sales_stats')
+    op.drop_table('product_sales_stats')
@@ -0,0 +1,42 @@
+"""catalog change log for the incremental catalog feed
+
+Revision ID: a2d9e4c71f36
+Revises: f1c6a8e3b507
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2d9e4c71f36'
+down_revision = 'f1c6a8e3b507'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=32), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=8), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_catalog_changes_created_at', 'catalog_changes', ['created_at'], unique=False)
+    op.create_index('ix_catalog_changes_entity', 'catalog_changes', ['entity', 'entity_id'], unique=False)
+    # One upsert per existing row, so a feed read from the start is a full snapshot
+    for table, entity in (('categories', 'category'), ('products', 'product'),
+                          ('product_images', 'product_image'), ('flash_sales', 'flash_sale')):
+        op.execute(
+            f"INSERT INTO catalog_changes (entity, entity_id, op, created_at) "
+            f"SELECT '{entity}', id, 'upsert', CURRENT_TIMESTAMP FROM {table} ORDER BY id"
+        )
+
+
+def downgrade():
+    op.drop_index('ix_catalog_changes_entity', table_name='catalog_changes')
+    op.drop_index('ix_catalog_changes_created_at', table_name='catalog_changes')
+    op.drop_table('catalog_changes')
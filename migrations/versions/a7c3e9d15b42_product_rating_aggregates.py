@@ -0,0 +1,40 @@
+"""product rating aggregates
+
+Revision ID: a7c3e9d15b42
+Revises: 8b4f1d6e2a93
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9d15b42'
+down_revision = '8b4f1d6e2a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_avg', sa.Numeric(precision=3, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_products_rating_avg', ['rating_avg'], unique=False)
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_product_id', ['product_id'], unique=False)
+    # Backfill from approved reviews (same rule as app.utils.ratings)
+    op.execute(
+        "UPDATE products SET "
+        "rating_avg = (SELECT AVG(r.rating) FROM reviews r WHERE r.product_id = products.id AND r.is_approved = TRUE), "
+        "rating_count = (SELECT COUNT(r.id) FROM reviews r WHERE r.product_id = products.id AND r.is_approved = TRUE)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_product_id')
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_rating_avg')
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_avg')
@@ -0,0 +1,32 @@
+"""created_at NOT NULL on the keyset-paginated tables
+
+Revision ID: b8e2f4a6c913
+Revises: a2d9e4c71f36
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a6c913'
+down_revision = 'a2d9e4c71f36'
+branch_labels = None
+depends_on = None
+
+# Listings seek on the raw (created_at, id) index, which would skip rows without a timestamp
+TABLES = ('products', 'orders', 'reviews', 'users')
+
+
+def upgrade():
+    for table in TABLES:
+        op.execute(f"UPDATE {table} SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL")
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,42 @@
+"""stock reservations
+
+Revision ID: c2e8a4f6b319
+Revises: a7c3e9d15b42
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8a4f6b319'
+down_revision = 'a7c3e9d15b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False, server_default='held'),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('resolved_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_reservations_order_id', 'stock_reservations', ['order_id'], unique=False)
+    op.create_index('ix_stock_reservations_status_expires', 'stock_reservations', ['status', 'expires_at'], unique=False)
+    op.create_index('ix_stock_reservations_product_status', 'stock_reservations', ['product_id', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_stock_reservations_product_status', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_status_expires', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_order_id', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
@@ -0,0 +1,65 @@
+"""indexes for the keyset sorts of the shop, category and admin listings
+
+Revision ID: c4f7a1d3e952
+Revises: b8e2f4a6c913
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f7a1d3e952'
+down_revision = 'b8e2f4a6c913'
+branch_labels = None
+depends_on = None
+
+# Must match the rating sort key in shop.product_sort_keys
+RATING = sa.text('coalesce(rating_avg, -1)')
+
+
+def _partial(*flags):
+    # The partial indexes this revision replaces, as f1c6a8e3b507 created them
+    return {
+        'postgresql_where': sa.text(' AND '.join(f'{f} IS true' for f in flags)),
+        'sqlite_where': sa.text(' AND '.join(f'{f} IS 1' for f in flags)),
+    }
+
+
+def upgrade():
+    # SQLite preferred the (is_active, category_id, created_at) prefix to the partial indexes
+    # and then sorted; leading with the filtered columns gives both the filter and the order
+    op.drop_index('ix_products_live_created', table_name='products')
+    op.drop_index('ix_products_top_picks', table_name='products')
+    op.drop_index('ix_products_new_arrivals', table_name='products')
+    op.create_index('ix_products_top_picks', 'products', ['is_active', 'is_top_pick', 'updated_at'], unique=False)
+    op.create_index('ix_products_new_arrivals', 'products',
+                    ['is_active', 'is_new_arrival_featured', 'updated_at'], unique=False)
+    op.create_index('ix_products_active_created', 'products', ['is_active', 'created_at'], unique=False)
+    op.create_index('ix_products_created_at', 'products', ['created_at'], unique=False)
+    op.create_index('ix_products_active_category_price', 'products', ['is_active', 'category_id', 'price'], unique=False)
+    op.create_index('ix_products_active_price', 'products', ['is_active', 'price'], unique=False)
+    op.create_index('ix_products_active_category_rating', 'products',
+                    ['is_active', 'category_id', RATING, 'rating_count'], unique=False)
+    op.create_index('ix_products_active_rating', 'products', ['is_active', RATING, 'rating_count'], unique=False)
+    op.create_index('ix_reviews_created_at', 'reviews', ['created_at'], unique=False)
+    op.create_index('ix_users_created_at', 'users', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_created_at', table_name='users')
+    op.drop_index('ix_reviews_created_at', table_name='reviews')
+    op.drop_index('ix_products_active_rating', table_name='products')
+    op.drop_index('ix_products_active_category_rating', table_name='products')
+    op.drop_index('ix_products_active_price', table_name='products')
+    op.drop_index('ix_products_active_category_price', table_name='products')
+    op.drop_index('ix_products_created_at', table_name='products')
+    op.drop_index('ix_products_active_created', table_name='products')
+    op.drop_index('ix_products_new_arrivals', table_name='products')
+    op.drop_index('ix_products_top_picks', table_name='products')
+    op.create_index('ix_products_new_arrivals', 'products', ['updated_at'], unique=False,
+                    **_partial('is_active', 'is_new_arrival_featured'))
+    op.create_index('ix_products_top_picks', 'products', ['updated_at'], unique=False,
+                    **_partial('is_active', 'is_top_pick'))
+    op.create_index('ix_products_live_created', 'products', ['created_at'], unique=False, **_partial('is_active'))
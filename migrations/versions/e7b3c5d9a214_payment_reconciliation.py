@@ -0,0 +1,61 @@
+"""payment reconciliation indexes and payment events
+
+Revision ID: e7b3c5d9a214
+Revises: d4a1f7b2c860
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3c5d9a214'
+down_revision = 'd4a1f7b2c860'
+branch_labels = None
+depends_on = None
+
+
+def _dedupe_references():
+    # Keep one row per reference (the paid one if any, else the oldest) and clear it on the rest
+    bind = op.get_bind()
+    dupes = bind.execute(sa.text(
+        "SELECT reference FROM payments WHERE reference IS NOT NULL GROUP BY reference HAVING COUNT(*) > 1"
+    )).scalars().all()
+    for ref in dupes:
+        rows = bind.execute(
+            sa.text("SELECT id, status FROM payments WHERE reference = :ref ORDER BY id"), {'ref': ref}
+        ).all()
+        keep = next((r.id for r in rows if r.status == 'paid'), rows[0].id)
+        bind.execute(
+            sa.text("UPDATE payments SET reference = NULL WHERE reference = :ref AND id <> :keep"),
+            {'ref': ref, 'keep': keep},
+        )
+
+
+def upgrade():
+    _dedupe_references()
+    op.create_index('ix_payments_reference', 'payments', ['reference'], unique=True)
+    op.create_index('ix_payments_order_id', 'payments', ['order_id'], unique=False)
+    op.create_index('ix_payments_method_status_created', 'payments', ['method', 'status', 'created_at'], unique=False)
+    op.create_table('payment_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('provider', sa.String(length=16), nullable=False),
+    sa.Column('event_key', sa.String(length=120), nullable=False),
+    sa.Column('payment_id', sa.Integer(), nullable=False),
+    sa.Column('result_code', sa.String(length=16), nullable=True),
+    sa.Column('source', sa.String(length=16), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('provider', 'event_key', name='uq_payment_events_provider_key')
+    )
+    op.create_index('ix_payment_events_payment_id', 'payment_events', ['payment_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_payment_events_payment_id', table_name='payment_events')
+    op.drop_table('payment_events')
+    op.drop_index('ix_payments_method_status_created', table_name='payments')
+    op.drop_index('ix_payments_order_id', table_name='payments')
+    op.drop_index('ix_payments_reference', table_name='payments')
@@ -0,0 +1,75 @@
+"""indexes for hot foreign keys and storefront filters
+
+Revision ID: f1c6a8e3b507
+Revises: e7b3c5d9a214
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6a8e3b507'
+down_revision = 'e7b3c5d9a214'
+branch_labels = None
+depends_on = None
+
+
+def _partial(*flags):
+    # Spelled the way SQLAlchemy renders `.is_(True)` on each dialect, so the planner can
+    # match the predicate; MySQL has no partial indexes and gets a plain one
+    return {
+        'postgresql_where': sa.text(' AND '.join(f'{f} IS true' for f in flags)),
+        'sqlite_where': sa.text(' AND '.join(f'{f} IS 1' for f in flags)),
+    }
+
+
+def upgrade():
+    op.create_index('ix_products_active_category_created', 'products', ['is_active', 'category_id', 'created_at'], unique=False)
+    op.create_index('ix_products_live_created', 'products', ['created_at'], unique=False,
+                    **_partial('is_active'))
+    op.create_index('ix_products_top_picks', 'products', ['updated_at'], unique=False,
+                    **_partial('is_active', 'is_top_pick'))
+    op.create_index('ix_products_new_arrivals', 'products', ['updated_at'], unique=False,
+                    **_partial('is_active', 'is_new_arrival_featured'))
+
+    # The composite index leads with product_id, so the single-column one is redundant
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_product_id')
+        batch_op.create_index('ix_reviews_product_approved_created', ['product_id', 'is_approved', 'created_at'], unique=False)
+
+    op.create_index('ix_orders_user_created', 'orders', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_orders_status_created', 'orders', ['status', 'created_at'], unique=False)
+    op.create_index('ix_orders_created_at', 'orders', ['created_at'], unique=False)
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'], unique=False)
+    op.create_index('ix_order_items_product_id', 'order_items', ['product_id'], unique=False)
+    op.create_index('ix_cart_items_user_product', 'cart_items', ['user_id', 'product_id'], unique=False)
+    op.create_index('ix_wishlist_items_user_product', 'wishlist_items', ['user_id', 'product_id'], unique=False)
+    op.create_index('ix_saved_items_user_product', 'saved_items', ['user_id', 'product_id'], unique=False)
+    op.create_index('ix_product_images_product_primary', 'product_images', ['product_id', 'is_primary'], unique=False)
+    op.create_index('ix_flash_sales_active_window', 'flash_sales', ['is_active', 'starts_at', 'ends_at'], unique=False)
+    op.create_index('ix_flash_sales_product_active', 'flash_sales', ['product_id', 'is_active'], unique=False)
+    op.create_index('ix_notifications_user_read_created', 'notifications', ['user_id', 'is_read', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notifications_user_read_created', table_name='notifications')
+    op.drop_index('ix_flash_sales_product_active', table_name='flash_sales')
+    op.drop_index('ix_flash_sales_active_window', table_name='flash_sales')
+    op.drop_index('ix_product_images_product_primary', table_name='product_images')
+    op.drop_index('ix_saved_items_user_product', table_name='saved_items')
+    op.drop_index('ix_wishlist_items_user_product', table_name='wishlist_items')
+    op.drop_index('ix_cart_items_user_product', table_name='cart_items')
+    op.drop_index('ix_order_items_product_id', table_name='order_items')
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
+    op.drop_index('ix_orders_created_at', table_name='orders')
+    op.drop_index('ix_orders_status_created', table_name='orders')
+    op.drop_index('ix_orders_user_created', table_name='orders')
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_product_approved_created')
+        batch_op.create_index('ix_reviews_product_id', ['product_id'], unique=False)
+    op.drop_index('ix_products_new_arrivals', table_name='products')
+    op.drop_index('ix_products_top_picks', table_name='products')
+    op.drop_index('ix_products_live_created', table_name='products')
+    op.drop_index('ix_products_active_category_created', table_name='products')
@@ -0,0 +1,133 @@
+"""
+Benchmark DB engine profiles under eventlet, the way the Dockerfile serves the app.
+
+Each profile gets its own engine, built with the same options and listeners
+the app uses. ``--greenlets`` green threads then share that engine in one
+monkey-patched process (one eventlet worker) for ``--seconds``. The load is a
+storefront mix: a product page, the newest-first listing page, and (with
+``--write-ratio``) a stock update in its own transaction. Throughput and
+latency percentiles are reported per profile.
+
+Usage:
+    python -m scripts.bench_db_profiles                      # auto profile vs driver defaults
+    python -m scripts.bench_db_profiles --profiles sqlite,default --greenlets 50 --seconds 10
+    python -m scripts.bench_db_profiles \\
+        --profiles postgres,pgbouncer=postgresql+psycopg2://shop:pw@pgbouncer:6432/scholagro
+
+``name=URL`` benchmarks a profile against another URL (e.g. PgBouncer's port).
+Otherwise the profile runs against DATABASE_URL. WAL mode is stored in the
+SQLite file, so compare ``sqlite`` and ``default`` on separate copies.
+
+The stock update writes ``stock = stock``, so the data is left unchanged.
+``--seed N`` creates the tables and N products when the database has no
+products. Use it only on a scratch database.
+"""
+import eventlet
+
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+
+import sqlalchemy as sa  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Category, Product  # noqa: E402
+from app.utils import db_engine  # noqa: E402
+
+parser = argparse.ArgumentParser(description='Throughput of each DB engine profile under eventlet.')
+parser.add_argument('--profiles', default='', help='Comma-separated profile[=url] list (default: auto profile and "default")')
+parser.add_argument('--greenlets', type=int, default=50, help='Concurrent green threads (default 50)')
+parser.add_argument('--seconds', type=float, default=10, help='Run time per profile (default 10)')
+parser.add_argument('--write-ratio', type=float, default=0.1, help='Share of operations that are stock updates (default 0.1)')
+parser.add_argument('--seed', type=int, default=0, help='Create tables and N products if there are none (scratch DBs only)')
+args = parser.parse_args()
+
+app = create_app()
+config = app.config
+products = Product.__table__
+
+READ_PAGE = (
+    sa.select(products.c.id, products.c.name, products.c.price, products.c.image_url)
+    .where(products.c.is_active.is_(True))
+    .order_by(products.c.created_at.desc(), products.c.id.desc())
+    .limit(13)
+)
+READ_ONE = sa.select(products).where(products.c.id == sa.bindparam('id'))
+WRITE = products.update().where(products.c.id == sa.bindparam('pid')).values(stock=products.c.stock)
+
+
+def seed(n):
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Product.id).first():
+            return
+        c = Category(name='Bench', slug='bench')
+        db.session.add(c)
+        db.session.flush()
+        db.session.add_all(Product(name=f'Bench {i}', slug=f'bench-{i}', price=100 + i % 50, stock=100,
+                                   category_id=c.id) for i in range(n))
+        db.session.commit()
+
+
+def targets():
+    default_url = config['SQLALCHEMY_DATABASE_URI']
+    spec = args.profiles or f"{db_engine.resolve_profile(config)},default"
+    for item in spec.split(','):
+        name, _, url = item.strip().partition('=')
+        yield name, url or default_url
+
+
+def run(profile, url):
+    engine = sa.create_engine(url, **db_engine.engine_options(config, profile, url))
+    db_engine.attach(engine, config, profile)
+    with engine.connect() as conn:
+        ids = conn.execute(sa.select(products.c.id)).scalars().all()
+    if not ids:
+        raise SystemExit('No products to read; run against a seeded database or pass --seed N')
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + args.seconds
+
+    def worker():
+        nonlocal errors
+        rnd = random.Random()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if rnd.random() < args.write_ratio:
+                    with engine.begin() as conn:
+                        conn.execute(WRITE, {'pid': rnd.choice(ids)})
+                else:
+                    with engine.connect() as conn:
+                        conn.execute(READ_ONE, {'id': rnd.choice(ids)}).first()
+                        conn.execute(READ_PAGE).all()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    pool = eventlet.GreenPool(args.greenlets)
+    began = time.perf_counter()
+    for _ in range(args.greenlets):
+        pool.spawn(worker)
+    pool.waitall()
+    elapsed = time.perf_counter() - began
+    engine.dispose()
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return len(latencies) / elapsed, pct(0.5), pct(0.95), pct(0.99), errors
+
+
+if args.seed:
+    seed(args.seed)
+
+print(f"{args.greenlets} greenlets, {args.seconds:g}s per profile, {args.write_ratio:.0%} writes")
+print(f"{'profile':12} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+for name, url in targets():
+    ops, p50, p95, p99, errors = run(name, url)
+    print(f"{name:12} {ops:9.1f} {p50:8.2f} {p95:8.2f} {p99:8.2f} {errors:7d}")
@@ -0,0 +1,33 @@
+"""
+EXPLAIN the storefront's hot queries and fail if any falls back to a full scan or sort.
+
+Usage:
+    python -m scripts.explain_hot_queries            # report; exit 1 on a seq scan or sort
+    python -m scripts.explain_hot_queries --verbose  # also print the SQL
+
+Run against the configured DATABASE_URL after `flask db upgrade` (or in CI
+against a migrated scratch database). The query list lives in
+app/utils/query_plans.py; add a query there when a new hot path ships.
+"""
+import argparse
+import sys
+from app import create_app
+from app.utils.query_plans import check_plans
+
+parser = argparse.ArgumentParser(description='Check hot queries for sequential scans and sorts.')
+parser.add_argument('--verbose', action='store_true', help='Print the SQL for each query')
+args = parser.parse_args()
+
+app = create_app()
+with app.app_context():
+    failed = 0
+    for name, sql, scans in check_plans():
+        print(f"{'SCAN/SORT' if scans else 'ok':9}  {name}")
+        for line in scans:
+            print(f"           {line}")
+        if args.verbose:
+            print('           ' + ' '.join(sql.split()))
+        failed += bool(scans)
+    if failed:
+        print(f"{failed} hot quer{'y' if failed == 1 else 'ies'} scan or sort their table")
+        sys.exit(1)
@@ -0,0 +1,28 @@
+"""
+Rebuild the daily_sales_rollup and product_sales_stats tables from order history.
+
+Usage:
+    python -m scripts.rebuild_sales_rollup            # whole history
+    python -m scripts.rebuild_sales_rollup --days 7   # only the last 7 days
+
+Run once after applying the migrations that create the tables; afterwards
+checkout/status hooks and the Celery beat tasks keep them current. The
+best-seller counters are always rebuilt in full (their 7/30-day windows are
+derived from the rollup).
+"""
+import argparse
+from app import create_app
+from app.utils import sales_rollup, sales_stats
+
+parser = argparse.ArgumentParser(description='Rebuild the daily sales rollup.')
+parser.add_argument('--days', type=int, default=None, help='Only rebuild this many recent days')
+args = parser.parse_args()
+
+app = create_app()
+with app.app_context():
+    if args.days:
+        rows = sales_rollup.refresh_recent(days=args.days)
+    else:
+        rows = sales_rollup.rebuild()
+    print(f"Wrote {rows} rollup rows")
+    print(f"Wrote {sales_stats.rebuild()} product sales stats rows")
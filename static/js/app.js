@@ -139,6 +139,15 @@
           showToast('Order ' + payload.order_id + ' status: ' + payload.status.replace('_',' '), true);
         }catch(e){/* ignore */}
       });
+      socket.on('payment.status', (payload)=>{
+        try{
+          const orderEl = document.getElementById('order-detail');
+          if (orderEl && String(orderEl.getAttribute('data-order-id')) === String(payload.order_id)){
+            if (typeof fetchOrderStatus === 'function') fetchOrderStatus();
+          }
+          showToast(payload.message || ('Payment for order ' + payload.order_id + ': ' + payload.status), payload.status !== 'failed');
+        }catch(e){/* ignore */}
+      });
       socket.on('notification', (n)=>{ showToast(n.title + ' – ' + n.message, true); });
       socket.on('rider.location', (payload)=>{ 
         try{ 
@@ -443,7 +452,7 @@
   
   const toastEl = document.getElementById('toast');
   const toastBody = document.getElementById('toast-body');
-  const csrfToken = (document.querySelector('meta[name="csrf-token"]')||{}).content || '';
+  let csrfToken = (document.querySelector('meta[name="csrf-token"]')||{}).content || '';
   let toast;
   
   if (toastEl && typeof bootstrap !== 'undefined') {
@@ -1138,6 +1147,46 @@
     if (fc){ setTimeout(()=>{ try{ fc.remove(); }catch{} }, 5000); }
   })();
 
+  // Shared page cache: the page body was rendered for an anonymous visitor,
+  // so fill in navbar, cart count, wishlist hearts and flashes for this user
+  (async function(){
+    if (!document.body || document.body.dataset.sharedPage !== '1') return;
+    let data;
+    try{
+      const res = await fetch('/api/session', { credentials: 'same-origin', headers: { 'Accept': 'application/json' } });
+      if (!res.ok) return;
+      data = await res.json();
+    }catch(_e){ return; }
+    if (data.csrf_token){
+      csrfToken = data.csrf_token;
+      const meta = document.querySelector('meta[name="csrf-token"]');
+      if (meta) meta.setAttribute('content', data.csrf_token);
+      document.querySelectorAll('input[name="csrf_token"]').forEach(i=>{ i.value = data.csrf_token; });
+    }
+    const badge = document.getElementById('cart-count-badge');
+    if (badge && typeof data.cart_count !== 'undefined') badge.textContent = data.cart_count;
+    const navUser = document.getElementById('nav-user');
+    if (navUser && data.nav_html) navUser.innerHTML = data.nav_html;
+    if (data.authenticated){
+      document.querySelectorAll('[data-auth-only]').forEach(el=>{ el.hidden = false; });
+      document.querySelectorAll('[data-guest-only]').forEach(el=>{ el.hidden = true; });
+    }
+    if (data.is_admin){
+      document.querySelectorAll('[data-admin-only]').forEach(el=>{ el.hidden = false; });
+    }
+    const liked = new Set((data.wishlist || []).map(String));
+    document.querySelectorAll('.btn-wishlist[data-product-id]').forEach(btn=>{
+      if (!liked.has(String(btn.dataset.productId))) return;
+      btn.classList.remove('btn-outline-danger');
+      btn.classList.add('btn-danger');
+      const icon = btn.querySelector('i');
+      if (icon){ icon.classList.remove('bi-heart'); icon.classList.add('bi-heart-fill'); }
+    });
+    (data.flashes || []).forEach(f=>{
+      showToast(f.message, !(f.category === 'danger' || f.category === 'error'));
+    });
+  })();
+
   // Password reveal + confirm validation (storefront)
   document.addEventListener('change', (e)=>{
     const chk = e.target.closest('.js-show-pass');
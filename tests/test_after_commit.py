@@ -0,0 +1,82 @@
+import threading
+from app.extensions import db
+from app.models import Order, Payment, User
+from app.utils import after_commit
+
+
+def seed(app):
+    with app.app_context():
+        u = User(email='effects@example.com', password_hash='x', name='E')
+        db.session.add(u)
+        db.session.flush()
+        o = Order(user_id=u.id, status='placed', total_amount=20)
+        db.session.add(o)
+        db.session.flush()
+        db.session.add(Payment(order_id=o.id, method='mpesa', amount=20, status='pending', reference='ws_CO_fx'))
+        db.session.commit()
+        return o.id
+
+
+def paid_callback():
+    return {'Body': {'stkCallback': {'CheckoutRequestID': 'ws_CO_fx', 'ResultCode': 0,
+                                     'CallbackMetadata': {'Item': [{'Name': 'MpesaReceiptNumber', 'Value': 'FX1'}]}}}}
+
+
+def test_effects_run_after_commit_and_see_committed_state(client, app, monkeypatch):
+    oid = seed(app)
+    seen = []
+
+    def status_event(order_id):
+        seen.append(('status', db.session.get(Order, order_id).status))
+    monkeypatch.setitem(after_commit.HANDLERS, 'order_status_event', status_event)
+    monkeypatch.setitem(after_commit.HANDLERS, 'order_paid_email', lambda order_id, method='M-Pesa': seen.append(('email', order_id)))
+    client.post('/payments/mpesa/callback', json=paid_callback())
+    assert seen == [('email', oid), ('status', 'confirmed')]
+    # Duplicate delivery: nothing applied, nothing sent
+    client.post('/payments/mpesa/callback', json=paid_callback())
+    assert len(seen) == 2
+
+
+def test_rolled_back_effects_are_dropped(app, monkeypatch):
+    calls = []
+    monkeypatch.setitem(after_commit.HANDLERS, 'email', lambda **kw: calls.append(kw))
+    with app.app_context():
+        after_commit.defer('email', to='a@example.com', subject='s', body='b')
+        db.session.rollback()
+        db.session.commit()
+    assert calls == []
+
+
+def test_webhook_does_not_wait_for_thread_effects(client, app, monkeypatch):
+    seed(app)
+    app.config['SIDE_EFFECTS_MODE'] = 'thread'
+    release, finished = threading.Event(), threading.Event()
+
+    def slow_smtp(order_id, method='M-Pesa'):
+        release.wait(5)
+        finished.set()
+    monkeypatch.setitem(after_commit.HANDLERS, 'order_paid_email', slow_smtp)
+    monkeypatch.setattr(after_commit, 'SOCKET_EFFECTS', ())
+    monkeypatch.setitem(after_commit.HANDLERS, 'order_status_event', lambda order_id: None)
+    assert client.post('/payments/mpesa/callback', json=paid_callback()).status_code == 200
+    assert not finished.is_set()
+    release.set()
+    assert finished.wait(5)
+
+
+def test_celery_mode_queues_serializable_items(app, monkeypatch):
+    from app import tasks
+    queued = []
+
+    class FakeTask:
+        def delay(self, items):
+            queued.append(items)
+    monkeypatch.setattr(tasks, 'run_side_effects_task', FakeTask())
+    monkeypatch.setitem(after_commit.HANDLERS, 'order_status_event', lambda order_id: None)
+    app.config['SIDE_EFFECTS_MODE'] = 'celery'
+    with app.app_context():
+        after_commit.defer('email', to='a@example.com', subject='s', body='b')
+        after_commit.defer('order_status_event', order_id=1)
+        db.session.commit()
+    # Without a Socket.IO message queue the socket event stays in-process
+    assert queued == [[['email', {'to': 'a@example.com', 'subject': 's', 'body': 'b'}]]]
@@ -0,0 +1,43 @@
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Order, User
+
+
+def seed(app):
+    with app.app_context():
+        admin = User(email='stats-admin@example.com', password_hash=generate_password_hash('pass'), name='A', is_admin=True,
+                     created_at=datetime(2025, 12, 1))
+        buyer = User(email='stats-buyer@example.com', password_hash='x', name='B', created_at=datetime(2026, 2, 3))
+        db.session.add_all([admin, buyer])
+        db.session.flush()
+        for when, amount in ((datetime(2026, 1, 5, 9), 100), (datetime(2026, 1, 28, 18), 50), (datetime(2026, 3, 1), 30)):
+            db.session.add(Order(user_id=buyer.id, status='paid', total_amount=amount, created_at=when))
+        db.session.commit()
+
+
+def test_month_series_grouped_in_sql_and_closed_buckets_cached(client, app):
+    seed(app)
+    client.post('/auth/login', data={'email': 'stats-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    url = '/admin/analytics/series?mode=m&start=2026-01-01T00:00:00&end=2026-03-15T00:00:00'
+    data = client.get(url).get_json()
+    assert data['labels'] == ['Jan 2026', 'Feb 2026', 'Mar 2026']
+    assert data['orders'] == [2, 0, 1]
+    assert data['sales'] == [150.0, 0, 30.0]
+    assert data['users'] == [0, 1, 0]
+    assert data['aov'] == [75.0, 0, 30.0]
+
+    # January is closed: a late write is not visible until the cached bucket expires
+    with app.app_context():
+        buyer = User.query.filter_by(email='stats-buyer@example.com').first()
+        db.session.add(Order(user_id=buyer.id, status='paid', total_amount=10, created_at=datetime(2026, 1, 10)))
+        db.session.commit()
+    assert client.get(url).get_json()['orders'][0] == 2
+
+
+def test_week_series_buckets_start_on_monday(client, app):
+    seed(app)
+    client.post('/auth/login', data={'email': 'stats-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    data = client.get('/admin/analytics/series?mode=w&start=2026-01-05T00:00:00&end=2026-01-30T00:00:00').get_json()
+    assert data['labels'][0] == 'Wk 2026-01-05'
+    assert data['orders'] == [1, 0, 0, 1]
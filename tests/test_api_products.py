@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import Category, Product
+
+
+def _seed():
+    veg = Category(name='Vegetables', slug='vegetables')
+    fruit = Category(name='Fruit', slug='fruit')
+    db.session.add_all([veg, fruit])
+    db.session.flush()
+    base = datetime(2026, 3, 1)
+    for i in range(7):
+        db.session.add(Product(name=f'Item {i}', slug=f'item-{i}', price=10 + i, stock=i,
+                               category_id=veg.id if i % 2 else fruit.id, updated_at=base + timedelta(days=i)))
+    db.session.commit()
+
+
+def _pages(client, url):
+    rows, pages = [], 0
+    while url:
+        resp = client.get(url)
+        assert resp.status_code == 200
+        rows.extend(resp.get_json())
+        pages += 1
+        link = resp.headers.get('Link')
+        url = link[1:link.index('>')].replace('http://localhost', '') if link else None
+    return rows, pages
+
+
+def test_products_paginate_with_cursor(app, client):
+    with app.app_context():
+        _seed()
+    rows, pages = _pages(client, '/api/products?limit=3')
+    assert pages == 3
+    assert [r['slug'] for r in rows] == [f'item-{i}' for i in range(7)]
+    assert set(rows[0]) == {'id', 'name', 'price', 'stock', 'image_url', 'category', 'slug'}
+    assert rows[0]['category'] == 'Fruit' and rows[1]['category'] == 'Vegetables'
+
+
+def test_fields_category_and_updated_since(app, client):
+    with app.app_context():
+        _seed()
+    rows = client.get('/api/products?fields=id,slug,updated_at&category=vegetables').get_json()
+    assert [r['slug'] for r in rows] == ['item-1', 'item-3', 'item-5']
+    assert set(rows[0]) == {'id', 'slug', 'updated_at'}
+
+    rows, _ = _pages(client, '/api/products?fields=slug&limit=2&updated_since=2026-03-05T00:00:00Z')
+    assert [r['slug'] for r in rows] == ['item-4', 'item-5', 'item-6']
+
+    assert client.get('/api/products?fields=slug,password').status_code == 400
+    assert client.get('/api/products?updated_since=yesterday').status_code == 400
+    assert client.get('/api/products?category=nope').status_code == 404
+
+
+def test_category_is_joined_not_lazy_loaded(app, client):
+    with app.app_context():
+        _seed()
+        statements = []
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            assert len(client.get('/api/products').get_json()) == 7
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        product_queries = [s for s in statements if 'FROM products' in s or 'FROM categories' in s]
+        assert len(product_queries) == 1
+
+
+def test_conditional_requests_get_304(app, client):
+    with app.app_context():
+        _seed()
+    first = client.get('/api/products?limit=3')
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified']
+    again = client.get('/api/products?limit=3', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.get_data() == b''
+    since = client.get('/api/products?limit=3', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert since.status_code == 304
+
+    with app.app_context():
+        p = Product.query.filter_by(slug='item-0').first()
+        p.price = 99
+        db.session.commit()
+    changed = client.get('/api/products?limit=3', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
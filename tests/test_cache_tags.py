@@ -0,0 +1,82 @@
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Category, HomePageBanner, Product, User
+from app.utils import cache_tags
+
+
+def create_admin_user(app):
+    with app.app_context():
+        u = User(email='tags-admin@example.com', password_hash=generate_password_hash('pass'), name='Admin', is_admin=True)
+        db.session.add(u)
+        db.session.commit()
+
+
+def test_cached_page_survives_unrelated_invalidation(client, app):
+    with app.app_context():
+        db.session.add(HomePageBanner(title='First', image_url='https://example.com/first.jpg', is_active=True, sort_order=0))
+        db.session.commit()
+    html = client.get('/').get_data(as_text=True)
+    assert 'https://example.com/first.jpg' in html
+    # Write directly to the DB: the cached page must still be served
+    with app.app_context():
+        db.session.add(HomePageBanner(title='Second', image_url='https://example.com/second.jpg', is_active=True, sort_order=1))
+        db.session.commit()
+        cache_tags.invalidate(cache_tags.DELIVERY_ZONES, cache_tags.product_tag(999))
+    html = client.get('/').get_data(as_text=True)
+    assert 'https://example.com/second.jpg' not in html
+    # Invalidating the tag the page depends on re-renders it
+    with app.app_context():
+        cache_tags.invalidate(cache_tags.BANNERS)
+    html = client.get('/').get_data(as_text=True)
+    assert 'https://example.com/second.jpg' in html
+
+
+def test_product_edit_only_invalidates_dependent_pages(client, app):
+    with app.app_context():
+        c1 = Category(name='Fruits', slug='fruits')
+        c2 = Category(name='Dairy', slug='dairy')
+        db.session.add_all([c1, c2])
+        db.session.flush()
+        p1 = Product(name='Mango', slug='mango', price=10.0, stock=5, category_id=c1.id)
+        p2 = Product(name='Milk', slug='milk', price=20.0, stock=5, category_id=c2.id)
+        db.session.add_all([p1, p2])
+        db.session.commit()
+        p1_id, p2_id = p1.id, p2.id
+    create_admin_user(app)
+    client.post('/auth/login', data={'email': 'tags-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    assert 'Mango' in client.get('/category/fruits').get_data(as_text=True)
+    assert 'Milk' in client.get('/category/dairy').get_data(as_text=True)
+    # Change Milk behind the cache's back; the dairy page stays cached
+    with app.app_context():
+        milk = db.session.get(Product, p2_id)
+        milk.name = 'Milk Renamed Quietly'
+        db.session.commit()
+    client.post(f'/admin/products/{p1_id}/edit', data={'name': 'Mango Ripe', 'price': '12', 'stock': '5'})
+    assert 'Mango Ripe' in client.get('/category/fruits').get_data(as_text=True)
+    assert 'Milk Renamed Quietly' not in client.get('/category/dairy').get_data(as_text=True)
+
+
+def test_product_price_or_stock_edit_invalidates_catalog(client, app):
+    with app.app_context():
+        c = Category(name='Grains', slug='grains')
+        db.session.add(c)
+        db.session.flush()
+        p = Product(name='Rice', slug='rice', price=10.0, stock=5, category_id=c.id)
+        db.session.add(p)
+        db.session.commit()
+        pid = p.id
+    create_admin_user(app)
+    client.post('/auth/login', data={'email': 'tags-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+
+    def catalog_version():
+        with app.app_context():
+            return cache_tags.current_versions([cache_tags.CATALOG])
+
+    v0 = catalog_version()
+    client.post(f'/admin/products/{pid}/edit', data={'name': 'Rice', 'price': '10', 'stock': '5'})
+    assert catalog_version() == v0
+    client.post(f'/admin/products/{pid}/edit', data={'name': 'Rice', 'price': '11', 'stock': '5'})
+    v1 = catalog_version()
+    assert v1 != v0
+    client.post(f'/admin/products/{pid}/edit', data={'name': 'Rice', 'price': '11', 'stock': '0'})
+    assert catalog_version() != v1
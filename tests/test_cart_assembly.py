@@ -0,0 +1,56 @@
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import CartItem, Product, User
+
+
+def seed(app, n):
+    with app.app_context():
+        u = User(email='mini@example.com', password_hash=generate_password_hash('pass'), name='M')
+        products = [Product(name=f'Item {i}', slug=f'item-{i}', price=10 + i, stock=50) for i in range(n)]
+        db.session.add_all([u, *products])
+        db.session.commit()
+        return u.id, [p.id for p in products]
+
+
+def count_queries(app, fn):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return result, len(statements)
+
+
+def test_mini_cart_uses_constant_queries(client, app):
+    uid, pids = seed(app, 6)
+    client.post('/auth/login', data={'email': 'mini@example.com', 'password': 'pass'}, follow_redirects=True)
+    with app.app_context():
+        db.session.add(CartItem(user_id=uid, product_id=pids[0], quantity=2))
+        db.session.commit()
+    _, one_line = count_queries(app, lambda: client.get('/cart/mini'))
+    with app.app_context():
+        db.session.add_all([CartItem(user_id=uid, product_id=pid, quantity=1) for pid in pids[1:]])
+        db.session.commit()
+    resp, many_lines = count_queries(app, lambda: client.get('/cart/mini'))
+    assert many_lines == one_line
+    data = resp.get_json()
+    assert data['count'] == 7
+    assert data['subtotal'] == 2 * 10 + sum(10 + i for i in range(1, 6))
+    assert client.get('/cart/').status_code == 200
+
+
+def test_guest_mini_cart_and_update_totals(client, app):
+    _, pids = seed(app, 3)
+    for pid in pids:
+        client.post('/cart/add', json={'product_id': pid})
+    client.post('/cart/add', json={'product_id': 999})   # unknown product is rejected
+    data = client.get('/cart/mini').get_json()
+    assert [i['product_id'] for i in data['items']] == pids
+    assert data['subtotal'] == 33 and data['count'] == 3
+    res = client.post('/cart/update', json={'product_id': pids[2], 'quantity': 4}).get_json()
+    assert res['item_subtotal'] == 48 and res['cart_subtotal'] == 69 and res['cart_count'] == 6
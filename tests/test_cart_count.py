@@ -0,0 +1,24 @@
+from werkzeug.security import generate_password_hash
+from app.extensions import db, cache
+from app.models import CartItem, Product, User
+from app.utils.cart_count import get_cart_count
+
+
+def test_cart_count_served_from_counter_with_db_fallback(client, app):
+    with app.app_context():
+        u = User(email='counter@example.com', password_hash=generate_password_hash('pass'), name='C')
+        p = Product(name='Rice', slug='rice', price=100, stock=10)
+        db.session.add_all([u, p])
+        db.session.commit()
+        uid, pid = u.id, p.id
+    client.post('/auth/login', data={'email': 'counter@example.com', 'password': 'pass'}, follow_redirects=True)
+    assert client.post('/cart/add', json={'product_id': pid}).get_json()['cart_count'] == 1
+    assert client.post('/cart/add', json={'product_id': pid}).get_json()['cart_count'] == 2
+    with app.app_context():
+        assert cache.get(f'cart_count:{uid}') == 2
+        # A write that bypasses the cart blueprint is not seen until the counter is dropped
+        CartItem.query.filter_by(user_id=uid).update({CartItem.quantity: 5})
+        db.session.commit()
+        assert get_cart_count(uid) == 2
+        cache.delete(f'cart_count:{uid}')
+        assert get_cart_count(uid) == 5
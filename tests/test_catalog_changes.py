@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.models import CatalogChange, Category, FlashSale, Product, ProductImage, User
+from app.utils import catalog_changes
+from app.utils.stock import decrement_stock
+
+
+def _feed(client, since=None, **params):
+    if since:
+        params['since'] = since
+    resp = client.get('/api/catalog/changes', query_string=params)
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def _seed():
+    c = Category(name='Greens', slug='greens')
+    db.session.add(c)
+    db.session.flush()
+    products = [Product(name=f'Kale {i}', slug=f'kale-{i}', price=50, stock=10, category_id=c.id) for i in range(3)]
+    db.session.add_all(products)
+    db.session.commit()
+    return c, products
+
+
+def test_snapshot_then_deltas(app, client):
+    app.config['CATALOG_CHANGES_SETTLE_SECONDS'] = 0
+    with app.app_context():
+        _, products = _seed()
+        first_id = products[0].id
+    snap = _feed(client)
+    assert not snap['reset'] and not snap['has_more']
+    assert [(c['entity'], c['op']) for c in snap['changes']] == [('category', 'upsert')] + [('product', 'upsert')] * 3
+    assert snap['changes'][1]['data']['slug'] == 'kale-0'
+
+    assert _feed(client, snap['next'])['changes'] == []
+
+    with app.app_context():
+        p = db.session.get(Product, first_id)
+        p.price = 45
+        p.name = 'Kale bunch'
+        db.session.add(ProductImage(product_id=first_id, image_url='https://img/kale.jpg', is_primary=True))
+        db.session.commit()
+    delta = _feed(client, snap['next'])
+    # Two column changes on one product fold into one entry carrying its current row
+    changes = {(c['entity'], c['id']): c for c in delta['changes']}
+    assert set(changes) == {('product', first_id), ('product_image', 1)}
+    assert changes[('product', first_id)]['data']['name'] == 'Kale bunch'
+    assert changes[('product_image', 1)]['data']['product_id'] == first_id
+
+
+def test_bulk_statements_are_logged(app, client):
+    app.config['CATALOG_CHANGES_SETTLE_SECONDS'] = 0
+    with app.app_context():
+        _, products = _seed()
+        ids = [p.id for p in products]
+        token = catalog_changes.changes_since()['next']
+        assert decrement_stock([(ids[0], 2)])
+        db.session.commit()
+        now = datetime.utcnow()
+        db.session.add(FlashSale(product_id=ids[1], discount_percent=10, starts_at=now, ends_at=now + timedelta(days=1)))
+        db.session.commit()
+        feed = catalog_changes.changes_since(token)
+        assert [(c['entity'], c['op']) for c in feed['changes']] == [('product', 'upsert'), ('flash_sale', 'upsert')]
+        assert feed['changes'][0]['data']['stock'] == 8
+
+
+def test_admin_bulk_deletes_leave_tombstones(app, client):
+    app.config['CATALOG_CHANGES_SETTLE_SECONDS'] = 0
+    with app.app_context():
+        _, products = _seed()
+        ids = [p.id for p in products]
+        db.session.add(User(email='admin@example.com', password_hash=generate_password_hash('pass'), is_admin=True))
+        db.session.commit()
+    token = _feed(client)['next']
+    client.post('/auth/login', data={'email': 'admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    client.post('/admin/products/bulk-delete', data={'ids': [str(ids[0])]})
+    delta = _feed(client, token)
+    assert delta['changes'] == [{'entity': 'product', 'id': ids[0], 'op': 'delete'}]
+
+    client.post('/admin/products/delete-all', data={'confirm': 'yes'})
+    delta = _feed(client, delta['next'])
+    assert sorted(c['id'] for c in delta['changes']) == ids[1:]
+    assert {c['op'] for c in delta['changes']} == {'delete'}
+
+
+def test_paging_settle_window_and_bad_token(app, client):
+    with app.app_context():
+        _seed()
+    # Fresh changes are held back until they settle
+    assert _feed(client)['changes'] == []
+    app.config['CATALOG_CHANGES_SETTLE_SECONDS'] = 0
+    page = _feed(client, limit=2)
+    assert page['has_more'] and len(page['changes']) == 2
+    rest = _feed(client, page['next'], limit=2)
+    assert not rest['has_more'] and len(rest['changes']) == 2
+    assert client.get('/api/catalog/changes?since=abc').status_code == 400
+
+
+def test_compaction_resets_stale_tokens(app, client):
+    app.config['CATALOG_CHANGES_SETTLE_SECONDS'] = 0
+    with app.app_context():
+        _, products = _seed()
+        stale = catalog_changes.make_token(1, issued_at=0)
+        fresh = catalog_changes.changes_since()['next']
+        p = db.session.get(Product, products[0].id)
+        p.price = 60
+        db.session.delete(db.session.get(Product, products[1].id))
+        db.session.commit()
+        # Tombstone is past retention
+        CatalogChange.query.filter_by(op='delete').update({'created_at': datetime.utcnow() - timedelta(days=90)})
+        db.session.commit()
+        removed = catalog_changes.compact()
+        # The product's first upsert (superseded) and the expired tombstone go
+        assert removed == 3
+        assert CatalogChange.query.filter_by(entity='product', entity_id=products[0].id).count() == 1
+
+        feed = catalog_changes.changes_since(stale)
+        assert feed['reset']
+        assert {c['id'] for c in feed['changes'] if c['entity'] == 'product'} == {products[0].id, products[2].id}
+        after = catalog_changes.changes_since(catalog_changes.make_token(feed['next'].split('.')[0]))
+        assert not after['reset']
+        # Issued before the compaction and behind the dropped tombstone: reset as well
+        assert catalog_changes.changes_since(fresh)['reset']
+
+
+def test_changes_are_stamped_at_commit(app):
+    with app.app_context():
+        c, products = _seed()
+        before = CatalogChange.query.count()
+        p = db.session.get(Product, products[0].id)
+        p.price = 42
+        db.session.flush()
+        # Flushed but not committed: nothing in the log yet
+        assert db.session.query(CatalogChange.id).count() == before
+        committed_at = datetime.utcnow()
+        db.session.commit()
+        row = CatalogChange.query.order_by(CatalogChange.id.desc()).first()
+        assert (row.entity, row.entity_id) == ('product', products[0].id)
+        assert row.created_at >= committed_at
+
+        p.price = 43
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        assert CatalogChange.query.count() == before + 1
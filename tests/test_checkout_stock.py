@@ -0,0 +1,77 @@
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import CartItem, Order, Product, User
+from app.utils.stock import decrement_stock, short_products
+
+
+def seed(app, stocks):
+    with app.app_context():
+        u = User(email='stock@example.com', password_hash=generate_password_hash('pass'), name='S')
+        products = [Product(name=f'Stock {i}', slug=f'stock-{i}', price=5, stock=s) for i, s in enumerate(stocks)]
+        db.session.add_all([u, *products])
+        db.session.commit()
+        # None means unlimited stock; the column default would turn it into 0 on insert
+        for p, s in zip(products, stocks):
+            if s is None:
+                p.stock = None
+        db.session.commit()
+        return u.id, [p.id for p in products]
+
+
+def test_decrement_stock_is_all_or_nothing(app):
+    _, (a, b, unlimited) = seed(app, [3, 1, None])
+    with app.app_context():
+        assert decrement_stock([(a, 2), (unlimited, 7), (a, 1)])
+        db.session.commit()
+        assert (db.session.get(Product, a).stock, db.session.get(Product, unlimited).stock) == (0, None)
+        assert not decrement_stock([(b, 1), (a, 1)])
+        db.session.rollback()
+        assert db.session.get(Product, b).stock == 1
+        assert [p.id for p in short_products([(b, 1), (a, 1)])] == [a]
+
+
+def test_checkout_uses_fixed_statement_count_and_rejects_oversell(client, app):
+    uid, pids = seed(app, [5, 5, 5, 5, 1])
+    client.post('/auth/login', data={'email': 'stock@example.com', 'password': 'pass'}, follow_redirects=True)
+    with app.app_context():
+        engine = db.engine
+
+    def checkout(lines):
+        with app.app_context():
+            db.session.add_all([CartItem(user_id=uid, product_id=pid, quantity=q) for pid, q in lines])
+            db.session.commit()
+        updates = []
+        listener = lambda conn, cur, stmt, *a: updates.append(stmt) if stmt.lstrip().upper().startswith('UPDATE PRODUCTS') else None
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            client.post('/orders/checkout', data={'payment_method': 'cod', 'fulfillment': 'pickup'})
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        return updates
+
+    assert len(checkout([(pids[0], 1), (pids[1], 2), (pids[2], 3), (pids[3], 4)])) == 1
+    with app.app_context():
+        assert [db.session.get(Product, pid).stock for pid in pids[:4]] == [4, 3, 2, 1]
+        assert Order.query.count() == 1
+
+    # Another buyer takes the last unit after this cart was validated: the guarded UPDATE refuses
+    with app.app_context():
+        db.session.add(CartItem(user_id=uid, product_id=pids[4], quantity=1))
+        db.session.commit()
+    original = decrement_stock
+
+    def racing(lines):
+        lines = list(lines)
+        db.session.query(Product).filter_by(id=pids[4]).update({'stock': 0}, synchronize_session=False)
+        return original(lines)
+
+    import app.blueprints.orders.routes as orders_routes
+    orders_routes.decrement_stock = racing
+    try:
+        client.post('/orders/checkout', data={'payment_method': 'cod', 'fulfillment': 'pickup'})
+    finally:
+        orders_routes.decrement_stock = original
+    with app.app_context():
+        assert Order.query.count() == 1
+        assert CartItem.query.filter_by(user_id=uid).count() == 1
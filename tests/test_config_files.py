@@ -0,0 +1,41 @@
+import json
+import os
+from app.utils import config_files
+
+
+def test_load_json_reparses_only_after_mtime_change(tmp_path, monkeypatch):
+    path = str(tmp_path / 'announcements.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(['first'], f)
+    assert config_files.load_json(path, check_seconds=60) == ['first']
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(['second', 'message'], f)
+    os.utime(path, ns=(1, 10**9))
+    # Inside the check window the file is not even stat'ed
+    assert config_files.load_json(path, check_seconds=60) == ['first']
+    opened = []
+    real_open = open
+    monkeypatch.setattr('builtins.open', lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+    assert config_files.load_json(path, check_seconds=0) == ['second', 'message']
+    assert config_files.load_json(path, check_seconds=0) == ['second', 'message']
+    assert opened == [path]
+
+
+def test_admin_settings_reach_config_without_restart(app):
+    path = config_files.instance_file(config_files.ADMIN_SETTINGS_FILE, app)
+    original = open(path, 'rb').read() if os.path.exists(path) else None
+    try:
+        # Simulate another worker saving the settings file
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'site_name': 'Synced Shop'}, f)
+        os.utime(path, ns=(2, 2 * 10**9))
+        app.config['CONFIG_FILE_CHECK_SECONDS'] = 0
+        with app.test_client() as c:
+            c.get('/api/health')
+        assert app.config['SITE_NAME'] == 'Synced Shop'
+    finally:
+        if original is None:
+            os.remove(path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(original)
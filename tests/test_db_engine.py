@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.utils.db_engine import attach, engine_options, resolve_profile
+
+CONFIG = {
+    'DB_ENGINE_PROFILE': 'auto',
+    'DB_POOL_SIZE': 8,
+    'DB_MAX_OVERFLOW': 4,
+    'DB_POOL_TIMEOUT': 5,
+    'DB_POOL_RECYCLE': 900,
+    'DB_STATEMENT_TIMEOUT_MS': 15000,
+    'DB_IDLE_IN_TRANSACTION_TIMEOUT_MS': 60000,
+    'SQLITE_BUSY_TIMEOUT_MS': 4000,
+    'SQLITE_MMAP_SIZE': 1 << 20,
+}
+PG_URL = 'postgresql+psycopg2://shop:pw@db:5432/scholagro'
+
+
+def test_auto_profile_follows_the_url():
+    assert resolve_profile(CONFIG, PG_URL) == 'postgres'
+    assert resolve_profile(CONFIG, 'sqlite:///scholagro.db') == 'sqlite'
+    assert resolve_profile(CONFIG, 'mysql+pymysql://u:p@db/shop') == 'default'
+    assert resolve_profile(dict(CONFIG, DB_ENGINE_PROFILE='PgBouncer'), PG_URL) == 'pgbouncer'
+
+
+def test_postgres_and_pgbouncer_options():
+    pg = engine_options(CONFIG, url=PG_URL)
+    assert pg['pool_size'] == 8 and pg['max_overflow'] == 4 and pg['pool_recycle'] == 900
+    assert pg['pool_pre_ping'] is True
+    assert pg['connect_args']['options'] == '-c statement_timeout=15000 -c idle_in_transaction_session_timeout=60000'
+
+    bouncer = engine_options(CONFIG, 'pgbouncer', PG_URL)
+    # No client pool and no startup options: PgBouncer rejects them
+    assert bouncer == {'poolclass': NullPool}
+    psycopg3 = engine_options(CONFIG, 'pgbouncer', 'postgresql+psycopg://shop:pw@bouncer:6432/scholagro')
+    assert psycopg3['connect_args'] == {'prepare_threshold': None}
+
+
+def test_sqlite_pragmas_applied_on_connect(tmp_path):
+    url = f"sqlite:///{tmp_path / 'shop.db'}"
+    engine = create_engine(url, **engine_options(CONFIG, url=url))
+    attach(engine, CONFIG, resolve_profile(CONFIG, url))
+    with engine.connect() as conn:
+        values = [conn.execute(text(f'PRAGMA {name}')).scalar()
+                  for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')]
+    engine.dispose()
+    assert values == ['wal', 1, 4000, 1 << 20]
+
+
+def test_app_engine_uses_the_profile(app):
+    from app.extensions import db
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == app.config['SQLITE_BUSY_TIMEOUT_MS']
+
+
+def test_statement_timeout_is_opt_in(app):
+    # Migrations and rebuilds run through create_app too; no server-side statement limit by default
+    assert app.config['DB_STATEMENT_TIMEOUT_MS'] == 0
+    pg = engine_options(app.config, 'postgres', PG_URL)
+    assert 'statement_timeout' not in pg['connect_args']['options']
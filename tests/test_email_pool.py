@@ -0,0 +1,119 @@
+import smtplib
+import pytest
+from app.utils import email
+
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent, self.noops, self.closed = [], 0, False
+        self.fail_after = None
+        self.noop_code = 250
+        FakeSMTP.instances.append(self)
+
+    def ehlo(self):
+        pass
+
+    def has_extn(self, name):
+        return True
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        self.logged_in = (user, password)
+
+    def noop(self):
+        self.noops += 1
+        return (self.noop_code, b'OK')
+
+    def rset(self):
+        pass
+
+    def send_message(self, msg):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise smtplib.SMTPServerDisconnected('gone')
+        if msg['To'] == 'refused@example.com':
+            raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'no')})
+        if msg['To'] == 'utf8@example.com':
+            raise smtplib.SMTPNotSupportedError('SMTPUTF8 not supported by server')
+        if msg['To'] == 'blocked@example.com':
+            raise smtplib.SMTPSenderRefused(553, b'sender rejected', msg['From'])
+        self.sent.append(msg['To'])
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+@pytest.fixture
+def smtp(app, monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr(email.smtplib, 'SMTP', FakeSMTP)
+    email.close_pools()
+    app.config.update(SMTP_HOST='smtp.test', SMTP_PORT=587, SMTP_USERNAME='u', SMTP_PASSWORD='p', SMTP_SENDER='shop@example.com')
+    with app.app_context():
+        yield FakeSMTP
+    email.close_pools()
+
+
+def test_send_many_reuses_one_logged_in_session(smtp):
+    messages = [(f'user{i}@example.com', 'Hi', '<p>hi</p>') for i in range(5)] + [('refused@example.com', 'Hi', 'x'), ('not-an-email', 'Hi', 'x')]
+    assert email.send_many(messages) == [True] * 5 + [False, False]
+    assert email.send_email('later@example.com', 'Hi', 'plain\ntext')
+    assert len(smtp.instances) == 1
+    assert smtp.instances[0].sent[-1] == 'later@example.com'
+
+
+def test_idle_session_is_checked_and_replaced_when_dead(smtp):
+    assert email.send_email_html('a@example.com', 'Hi', 'x')
+    first = smtp.instances[0]
+    pool = email._pool(email._settings())
+    pool.settings['idle_check'] = 0
+    first.noop_code = 421
+    assert email.send_email_html('b@example.com', 'Hi', 'x')
+    assert first.noops == 1 and first.closed
+    assert len(smtp.instances) == 2 and smtp.instances[1].sent == ['b@example.com']
+
+
+def test_dropped_connection_is_reopened_once(smtp):
+    assert email.send_email_html('warm@example.com', 'Hi', 'x')
+    smtp.instances[0].fail_after = 2
+    results = email.send_many([(f'user{i}@example.com', 'Hi', 'x') for i in range(4)])
+    assert results == [True] * 4
+    assert smtp.instances[0].closed
+    assert smtp.instances[1].sent == ['user1@example.com', 'user2@example.com', 'user3@example.com']
+
+
+def test_refused_messages_do_not_abort_the_batch(smtp):
+    messages = [('utf8@example.com', 'Hi', 'x'), ('a@example.com', 'Hi', 'x'),
+                ('blocked@example.com', 'Hi', 'x'), ('b@example.com', 'Hi', 'x')]
+    assert email.send_many(messages) == [False, True, False, True]
+    assert len(smtp.instances) == 1 and not smtp.instances[0].closed
+    assert smtp.instances[0].sent == ['a@example.com', 'b@example.com']
+
+
+def test_task_fallbacks_run_without_a_broker(smtp, app):
+    from app import tasks
+    assert not hasattr(tasks.send_many_task, 'delay')
+    assert tasks.send_many_task([['x@example.com', 'Hi', 'x'], ['y@example.com', 'Hi', 'x']]) == 2
+    assert tasks.send_email_task('z@example.com', 'Hi', 'body')
+    assert email.send_many_async([('w@example.com', 'Hi', 'x')]) == 1
+
+
+def test_failed_queueing_sends_only_the_unqueued_rest_inline(smtp, app, monkeypatch):
+    queued = []
+
+    class FlakyTask:
+        def delay(self, chunk):
+            if queued:
+                raise ConnectionError('broker gone')
+            queued.append([to for to, _s, _h in chunk])
+
+    monkeypatch.setattr(email, '_celery_task', lambda name: FlakyTask())
+    messages = [(f'm{i}@example.com', 'Hi', 'x') for i in range(5)]
+    assert email.send_many_async(messages, chunk_size=2) == 5
+    assert queued == [['m0@example.com', 'm1@example.com']]
+    assert smtp.instances[0].sent == ['m2@example.com', 'm3@example.com', 'm4@example.com']
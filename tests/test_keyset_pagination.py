@@ -0,0 +1,146 @@
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.models import Category, Product, User
+from app.utils.keyset import Key, approx_count, newest_first, paginate
+
+
+def _seed(n=25):
+    c = Category(name='Seeds', slug='seeds')
+    db.session.add(c)
+    db.session.flush()
+    base = datetime(2026, 1, 1)
+    for i in range(n):
+        # Pairs share a timestamp and price so the id tie-break matters
+        db.session.add(Product(name=f'P{i}', slug=f'p{i}', price=Decimal(100 + (i // 2)), stock=5,
+                               category_id=c.id, created_at=base + timedelta(hours=i // 2)))
+    db.session.commit()
+    return c
+
+
+def _walk(keys, per_page=4):
+    seen, cursor, pages = [], None, []
+    while True:
+        page = paginate(Product.query, keys, cursor=cursor, per_page=per_page)
+        pages.append(page)
+        seen.extend(p.id for p in page.items)
+        if not page.has_next:
+            return seen, pages
+        cursor = page.next_cursor
+
+
+def test_walks_every_row_once_in_order(app):
+    with app.app_context():
+        _seed()
+        seen, pages = _walk(newest_first(Product))
+        expected = [p.id for p in Product.query.order_by(Product.created_at.desc(), Product.id.desc())]
+        assert seen == expected
+        assert [p.page for p in pages] == list(range(1, 8))
+        assert pages[0].total == 25 and pages[0].total_exact
+        # The total rides along in the cursor instead of being recounted
+        assert pages[-1].total == 25 and pages[-1].pages == 7
+
+        seen, _ = _walk([Key(Product.price), Key(Product.id)])
+        assert seen == [p.id for p in Product.query.order_by(Product.price, Product.id)]
+
+
+def test_prev_cursor_returns_the_same_page(app):
+    with app.app_context():
+        _seed()
+        keys = [Key(Product.price, desc=True), Key(Product.id, desc=True)]
+        _, pages = _walk(keys)
+        third = pages[2]
+        back = paginate(Product.query, keys, cursor=pages[3].prev_cursor, per_page=4)
+        assert [p.id for p in back.items] == [p.id for p in third.items]
+        assert back.page == 3 and back.has_prev and back.has_next
+        first = paginate(Product.query, keys, cursor=pages[1].prev_cursor, per_page=4)
+        assert first.page == 1 and not first.has_prev
+
+
+def test_deep_pages_seek_without_offset_or_count(app):
+    with app.app_context():
+        _seed()
+        _, pages = _walk(newest_first(Product))
+        statements = []
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement.upper())
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            paginate(Product.query, newest_first(Product), cursor=pages[-2].next_cursor, per_page=4)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        assert len(statements) == 1
+        assert '(PRODUCTS.CREATED_AT, PRODUCTS.ID) < (' in statements[0]
+        assert 'COUNT(' not in statements[0]
+
+
+def test_bad_or_foreign_cursor_falls_back_to_first_page(app):
+    with app.app_context():
+        _seed()
+        price_page = paginate(Product.query, [Key(Product.price), Key(Product.id)], per_page=4)
+        for cursor in ('not-a-cursor', price_page.next_cursor):
+            page = paginate(Product.query, newest_first(Product), cursor=cursor, per_page=4)
+            assert page.page == 1 and not page.has_prev
+
+
+def test_nullable_key_sorts_last(app):
+    with app.app_context():
+        _seed(6)
+        Product.query.filter(Product.slug.in_(['p0', 'p1'])).update({'rating_avg': None}, synchronize_session=False)
+        Product.query.filter(Product.slug.in_(['p2', 'p3', 'p4', 'p5'])).update({'rating_avg': 4}, synchronize_session=False)
+        db.session.commit()
+        keys = [Key(Product.rating_avg, desc=True, null=-1), Key(Product.id, desc=True)]
+        seen, _ = _walk(keys, per_page=3)
+        assert [db.session.get(Product, i).slug for i in seen] == ['p5', 'p4', 'p3', 'p2', 'p1', 'p0']
+
+
+def test_approx_count_caps(app):
+    with app.app_context():
+        _seed(12)
+        assert approx_count(Product.query, cap=20) == (12, True)
+        assert approx_count(Product.query, cap=5) == (5, False)
+        page = paginate(Product.query, newest_first(Product), per_page=4)
+        app.config['PAGINATION_COUNT_CAP'] = 5
+        capped = paginate(Product.query, newest_first(Product), per_page=4)
+        assert page.total_label == '12' and capped.total_label == '5+'
+
+
+def test_category_and_admin_pages_link_cursors(app, client):
+    with app.app_context():
+        c = _seed()
+        slug = c.slug
+        db.session.add(User(email='admin@example.com', password_hash=generate_password_hash('pass'), is_admin=True))
+        db.session.commit()
+    html = client.get(f'/category/{slug}?sort=price_asc').get_data(as_text=True)
+    nxt = re.search(r'rel="next" href="([^"]+)"', html).group(1).replace('&amp;', '&')
+    assert 'cursor=' in nxt and 'sort=price_asc' in nxt
+    assert 'P12' in client.get(nxt).get_data(as_text=True)
+
+    client.post('/auth/login', data={'email': 'admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    html = client.get('/admin/products?per_page=10').get_data(as_text=True)
+    assert 'Total: 25' in html and 'Page 1 of 3' in html
+    nxt = re.search(r'href="([^"]*cursor=[^"]+)">Next', html).group(1).replace('&amp;', '&')
+    html = client.get(nxt).get_data(as_text=True)
+    assert 'Page 2 of 3' in html and 'per_page=10' in nxt
+
+
+def test_listing_tables_require_created_at(app):
+    # newest_first seeks on the raw column, so a NULL would drop the row from every listing
+    from app.models import Order, Review
+    for model in (Product, Order, Review, User):
+        assert model.__table__.c.created_at.nullable is False
+    with app.app_context():
+        _seed(2)
+        with pytest.raises(IntegrityError):
+            Product.query.update({'created_at': None}, synchronize_session=False)
+            db.session.flush()
+        db.session.rollback()
@@ -0,0 +1,98 @@
+import threading
+import time
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Order, Payment, User
+from app.utils import mpesa
+
+
+class FakeResponse:
+    def __init__(self, data, ok=True):
+        self._data, self.ok, self.content = data, ok, b'{}'
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    def __init__(self, delay=0, expires_in=3599):
+        self.token_calls, self.posts, self.delay, self.expires_in = 0, [], delay, expires_in
+        self.lock = threading.Lock()
+
+    def get(self, url, auth=None, timeout=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.token_calls += 1
+            n = self.token_calls
+        return FakeResponse({'access_token': f'tok{n}', 'expires_in': self.expires_in})
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.posts.append((url, headers['Authorization'], json))
+        return FakeResponse({'ResponseCode': '0', 'CheckoutRequestID': f'ws_CO_{len(self.posts)}'})
+
+
+def configure(app, monkeypatch, sess):
+    app.config.update(MPESA_BASE_URL='https://daraja.test', MPESA_CONSUMER_KEY='k', MPESA_CONSUMER_SECRET='s',
+                      MPESA_SHORT_CODE='174379', MPESA_PASSKEY='pk', MPESA_CALLBACK_URL='https://shop.test/cb')
+    mpesa.reset()
+    monkeypatch.setattr(mpesa, '_session', sess)
+
+
+def test_token_is_fetched_once_under_concurrency(app, monkeypatch):
+    sess = FakeSession(delay=0.05)
+    configure(app, monkeypatch, sess)
+    results = []
+
+    def worker():
+        with app.app_context():
+            results.append(mpesa.access_token())
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ['tok1'] * 8 and sess.token_calls == 1
+    with app.app_context():
+        assert mpesa.access_token() == 'tok1'
+    assert sess.token_calls == 1
+    mpesa.reset()
+
+
+def test_token_is_refreshed_ahead_of_expiry_in_background(app, monkeypatch):
+    sess = FakeSession(expires_in=60)  # inside the 300s refresh-ahead window
+    configure(app, monkeypatch, sess)
+    with app.app_context():
+        assert mpesa.access_token() == 'tok1'
+        # Still valid: returned at once while one refresh runs behind it
+        assert mpesa.access_token() == 'tok1'
+        deadline = time.time() + 2
+        while sess.token_calls < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert sess.token_calls == 2
+        time.sleep(0.05)
+        assert mpesa.access_token() in ('tok2', 'tok3')
+    mpesa.reset()
+
+
+def test_start_mpesa_uses_shared_session(client, app, monkeypatch):
+    sess = FakeSession()
+    configure(app, monkeypatch, sess)
+    with app.app_context():
+        u = User(email='stk@example.com', password_hash=generate_password_hash('pass'), name='S', phone='254712345678')
+        db.session.add(u)
+        db.session.flush()
+        orders = [Order(user_id=u.id, status='placed', total_amount=100) for _ in range(2)]
+        db.session.add_all(orders)
+        db.session.commit()
+        order_ids = [o.id for o in orders]
+    client.post('/auth/login', data={'email': 'stk@example.com', 'password': 'pass'}, follow_redirects=True)
+    for oid in order_ids:
+        client.get(f'/payments/mpesa/start/{oid}')
+    assert sess.token_calls == 1 and len(sess.posts) == 2
+    assert sess.posts[0][1] == 'Bearer tok1'
+    assert sess.posts[0][2]['AccountReference'] == str(order_ids[0])
+    with app.app_context():
+        p = Payment.query.filter_by(order_id=order_ids[0]).one()
+        assert (p.status, p.reference) == ('pending', 'ws_CO_1')
+    assert client.get(f'/payments/mpesa/status/{order_ids[0]}').get_json()['payment_status'] == 'pending'
+    mpesa.reset()
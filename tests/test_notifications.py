@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Notification, NotificationOutbox, Order, User
+from app.utils import notifications
+
+
+def test_status_changes_only_write_the_outbox(client, app, monkeypatch):
+    app.config.update(TWILIO_ACCOUNT_SID='AC1', TWILIO_AUTH_TOKEN='tok', TWILIO_SMS_FROM='+15550001')
+    with app.app_context():
+        admin = User(email='notify-admin@example.com', password_hash=generate_password_hash('pass'), name='A', is_admin=True)
+        buyer = User(email='notify-buyer@example.com', password_hash='x', name='B', phone='0712345678')
+        db.session.add_all([admin, buyer])
+        db.session.flush()
+        orders = [Order(user_id=buyer.id, status='pending', total_amount=10) for _ in range(50)]
+        db.session.add_all(orders)
+        db.session.commit()
+        order_ids = [o.id for o in orders]
+
+    def no_network(*a, **k):
+        raise AssertionError('provider called from the request')
+    monkeypatch.setitem(notifications.SENDERS, 'email', no_network)
+    monkeypatch.setitem(notifications.SENDERS, 'sms', no_network)
+    client.post('/auth/login', data={'email': 'notify-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    for oid in order_ids:
+        assert client.post(f'/admin/orders/{oid}/status', data={'status': 'packed'}).status_code == 302
+
+    with app.app_context():
+        assert NotificationOutbox.query.filter_by(status='pending').count() == 100
+        sms = NotificationOutbox.query.filter_by(channel='sms').first()
+        assert (sms.recipient, sms.body) == ('+254712345678', f'Order #{order_ids[0]} status: Packed')
+        assert Notification.query.count() == 50
+
+
+def test_dispatch_batches_per_channel_and_backs_off(app, monkeypatch):
+    calls = []
+
+    def email(rows):
+        calls.append(len(rows))
+        return {r.id: None if r.recipient != 'bounce@example.com' else 'mailbox full' for r in rows}
+    monkeypatch.setitem(notifications.SENDERS, 'email', email)
+    app.config['NOTIFY_MAX_ATTEMPTS'] = 2
+    with app.app_context():
+        for i in range(3):
+            notifications.enqueue('email', f'user{i}@example.com', 'hi', subject='Hi')
+        notifications.enqueue('email', 'bounce@example.com', 'hi', subject='Hi')
+        db.session.commit()
+
+        now = datetime.utcnow()
+        assert notifications.dispatch_pending(now=now) == 3
+        assert calls == [4]
+        bounce = NotificationOutbox.query.filter_by(recipient='bounce@example.com').one()
+        assert (bounce.status, bounce.attempts, bounce.last_error) == ('pending', 1, 'mailbox full')
+        assert bounce.next_attempt_at > now
+        # Not due yet
+        assert notifications.dispatch_pending(now=now) == 0
+        assert calls == [4]
+        assert notifications.dispatch_pending(now=now + timedelta(hours=2)) == 0
+        assert (bounce.status, bounce.attempts) == ('failed', 2)
+        assert NotificationOutbox.query.filter_by(status='sent').count() == 3
+
+
+def test_provider_clients_are_reused(app, monkeypatch):
+    built = []
+    monkeypatch.setattr(notifications, '_clients', {})
+    with app.app_context():
+        for _ in range(3):
+            notifications._cached_client(('twilio', 'AC1', 'tok'), lambda: built.append(1) or object())
+    assert built == [1]
+
+
+def test_claim_skips_rows_leased_by_another_dispatcher(app, monkeypatch):
+    from app.models import NotificationOutbox as N
+    with app.app_context():
+        for i in range(2):
+            notifications.enqueue('email', f'race{i}@example.com', 'hi', subject='Hi')
+        db.session.commit()
+        now = datetime.utcnow()
+        query_all = db.session.query(N.id).__class__.all
+
+        def pick_then_lose_one(q):
+            monkeypatch.undo()
+            picked = query_all(q)
+            # Another dispatcher leases the first row between the pick and the UPDATE
+            with db.engine.begin() as conn:
+                conn.execute(db.update(N).where(N.id == picked[0][0])
+                             .values(status='sending', attempts=1, next_attempt_at=now + timedelta(minutes=5)))
+            return picked
+        monkeypatch.setattr(db.session.query(N.id).__class__, 'all', pick_then_lose_one)
+        rows = notifications._claim(10, now)
+        assert [r.recipient for r in rows] == ['race1@example.com']
+        assert [(r.status, r.attempts) for r in N.query.order_by(N.id)] == [('sending', 1), ('sending', 1)]
+
+
+def test_africastalking_marks_each_recipient_from_its_status(app, monkeypatch):
+    sent = []
+
+    class FakeSMS:
+        def send(self, body, recipients, sender):
+            sent.append(list(recipients))
+            return {'SMSMessageData': {'Recipients': [
+                {'number': '+254711000001', 'status': 'Success', 'statusCode': 101},
+                {'number': '+254711000002', 'status': 'InvalidPhoneNumber', 'statusCode': 403},
+            ]}}
+    monkeypatch.setattr(notifications, '_africastalking_sms', lambda: FakeSMS())
+    app.config.update(AFRICASTALKING_USERNAME='sandbox', AFRICASTALKING_API_KEY='key', SMS_SENDER_ID='SHOP')
+    with app.app_context():
+        for n in ('+254711000001', '+254711000002', '+254711000003'):
+            notifications.enqueue('sms', n, 'Order #1 status: Packed')
+        db.session.commit()
+        assert notifications.dispatch_pending() == 1
+        assert len(sent) == 1
+        rows = {r.recipient: r for r in NotificationOutbox.query}
+        assert rows['+254711000001'].status == 'sent'
+        assert (rows['+254711000002'].status, rows['+254711000002'].last_error) == ('pending', 'InvalidPhoneNumber')
+        assert (rows['+254711000003'].status, rows['+254711000003'].last_error) == ('pending', 'no status from provider')
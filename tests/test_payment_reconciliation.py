@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models import Order, Payment, PaymentEvent, Product, StockReservation, User
+from app.utils import mpesa, reconciliation, reservations
+from app.utils.stock import decrement_stock
+
+
+def seed(app, n=1, age_minutes=10):
+    with app.app_context():
+        u = User(email='recon@example.com', password_hash='x', name='R')
+        p = Product(name='Recon', slug='recon', price=10, stock=10)
+        db.session.add_all([u, p])
+        db.session.flush()
+        ids = []
+        for i in range(n):
+            o = Order(user_id=u.id, status='placed', total_amount=20)
+            db.session.add(o)
+            db.session.flush()
+            decrement_stock([(p.id, 2)])
+            reservations.hold_order(o, [(p.id, 2)])
+            db.session.add(Payment(order_id=o.id, method='mpesa', amount=20, status='pending', reference=f'ws_CO_{i}',
+                                   created_at=datetime.utcnow() - timedelta(minutes=age_minutes)))
+            ids.append(o.id)
+        db.session.commit()
+        return p.id, ids
+
+
+def callback(checkout_id, code, receipt=None):
+    items = [{'Name': 'Amount', 'Value': 20}]
+    if receipt:
+        items.append({'Name': 'MpesaReceiptNumber', 'Value': receipt})
+    return {'Body': {'stkCallback': {'CheckoutRequestID': checkout_id, 'ResultCode': code, 'CallbackMetadata': {'Item': items}}}}
+
+
+def test_callback_confirms_once_and_ignores_duplicates(client, app):
+    pid, (oid,) = seed(app)
+    for _ in range(3):
+        assert client.post('/payments/mpesa/callback', json=callback('ws_CO_0', 0, 'QAB123')).status_code == 200
+    # A late failure for the same push cannot undo the payment
+    client.post('/payments/mpesa/callback', json=callback('ws_CO_0', 1032))
+    with app.app_context():
+        assert db.session.get(Order, oid).status == 'confirmed'
+        assert Payment.query.filter_by(order_id=oid).one().status == 'paid'
+        assert [e.event_key for e in PaymentEvent.query.all()] == ['QAB123']
+        assert StockReservation.query.filter_by(order_id=oid).one().status == 'committed'
+        assert db.session.get(Product, pid).stock == 8
+
+
+
+def test_callback_that_fails_to_apply_is_acknowledged_and_rolled_back(client, app, monkeypatch):
+    pid, (oid,) = seed(app)
+
+    def broken(order_id, now=None):
+        raise RuntimeError('stock update failed')
+    monkeypatch.setattr(reservations, 'commit_order', broken)
+    resp = client.post('/payments/mpesa/callback', json=callback('ws_CO_0', 0, 'QAB123'))
+    assert resp.status_code == 200 and resp.get_json() == {'ok': True}
+    with app.app_context():
+        assert Payment.query.filter_by(order_id=oid).one().status == 'pending'
+        assert PaymentEvent.query.count() == 0
+    # Nothing was left half-applied: once the cause is gone the redelivery goes through
+    monkeypatch.undo()
+    client.post('/payments/mpesa/callback', json=callback('ws_CO_0', 0, 'QAB123'))
+    with app.app_context():
+        assert Payment.query.filter_by(order_id=oid).one().status == 'paid'
+
+
+def test_reconcile_pending_queries_stale_payments(app, monkeypatch):
+    pid, (paid_oid, failed_oid, waiting_oid) = seed(app, n=3)
+    app.config.update(MPESA_BASE_URL='https://daraja.test', MPESA_CONSUMER_KEY='k', MPESA_CONSUMER_SECRET='s',
+                      MPESA_SHORT_CODE='174379', MPESA_PASSKEY='pk', MPESA_CALLBACK_URL='https://shop.test/cb')
+    answers = {
+        'ws_CO_0': {'ResultCode': '0', 'ResultDesc': 'The service request is processed successfully.'},
+        'ws_CO_1': {'ResultCode': '1032', 'ResultDesc': 'Request cancelled by user'},
+        'ws_CO_2': {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'},
+    }
+    queried = []
+    monkeypatch.setattr(mpesa, 'stk_query', lambda ref, s=None: queried.append(ref) or answers[ref])
+    with app.app_context():
+        # Too recent: the callback may still arrive
+        assert reconciliation.reconcile_pending(older_than=3600) == {'paid': 0, 'failed': 0}
+        assert reconciliation.reconcile_pending() == {'paid': 1, 'failed': 1}
+        assert sorted(queried) == ['ws_CO_0', 'ws_CO_1', 'ws_CO_2']
+        statuses = {p.order_id: p.status for p in Payment.query.all()}
+        assert statuses == {paid_oid: 'paid', failed_oid: 'failed', waiting_oid: 'pending'}
+        assert db.session.get(Order, paid_oid).status == 'confirmed'
+        assert db.session.get(Product, pid).stock == 6  # failed order's hold went back
+        # A second run only re-queries the one still processing
+        queried.clear()
+        reconciliation.reconcile_pending()
+        assert queried == ['ws_CO_2']
+
+
+def test_stripe_webhook_pays_the_sessions_own_row(client, app):
+    pid, (oid,) = seed(app)
+    with app.app_context():
+        # The customer opened a second Stripe session for the same order
+        db.session.add(Payment(order_id=oid, method='stripe', amount=20, status='pending', reference='cs_2'))
+        db.session.commit()
+    event = {'id': 'evt_1', 'object': 'event', 'type': 'checkout.session.completed',
+             'data': {'object': {'id': 'cs_2', 'object': 'checkout.session', 'metadata': {'order_id': str(oid)}}}}
+    for _ in range(2):
+        assert client.post('/payments/stripe/webhook', json=event).status_code == 200
+    with app.app_context():
+        assert db.session.get(Order, oid).status == 'confirmed'
+        assert {p.reference: p.status for p in Payment.query.filter_by(order_id=oid)} == {
+            'ws_CO_0': 'pending', 'cs_2': 'paid'}
@@ -0,0 +1,53 @@
+import csv
+import io
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Category, Product, ProductImage, User
+
+
+def seed(app, n=30):
+    with app.app_context():
+        db.session.add(User(email='export-admin@example.com', password_hash=generate_password_hash('pass'), name='A', is_admin=True))
+        c = Category(name='Veg', slug='veg')
+        db.session.add(c)
+        db.session.flush()
+        for i in range(n):
+            p = Product(name=f'Item {i}', slug=f'item-{i}', price=10 + i, stock=i, category_id=c.id)
+            db.session.add(p)
+            db.session.flush()
+            db.session.add(ProductImage(product_id=p.id, image_url=f'https://img.example.com/{i}-a.jpg', is_primary=True))
+            db.session.add(ProductImage(product_id=p.id, image_url=f'https://img.example.com/{i}-b.jpg', is_primary=False))
+        db.session.commit()
+
+
+def test_exports_stream_with_batched_image_queries(client, app, monkeypatch):
+    from app.blueprints.admin import routes as admin_routes
+    seed(app)
+    client.post('/auth/login', data={'email': 'export-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    monkeypatch.setattr(admin_routes, 'EXPORT_BATCH_SIZE', 10)
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, stmt, *a: statements.append(stmt)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        resp = client.get('/admin/products/export')
+        assert resp.is_streamed
+        body = resp.get_data(as_text=True)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert len(rows) == 30
+    by_slug = {r['slug']: r for r in rows}
+    assert by_slug['item-3']['images'] == 'https://img.example.com/3-a.jpg|https://img.example.com/3-b.jpg'
+    assert by_slug['item-3']['category_name'] == 'Veg'
+    image_selects = [s for s in statements if 'FROM product_images' in s]
+    assert len(image_selects) == 3
+    # Keyset pages of products, each followed by its images: no query runs while another is being read
+    pages = [s for s in statements if 'FROM products' in s and 'LIMIT' in s]
+    assert len(pages) == 3
+
+    data = client.get('/admin/products/export.json').get_json()
+    assert len(data) == 30 and data[0]['images']
+    assert 'Item 29' in client.get('/admin/products/print').get_data(as_text=True)
@@ -0,0 +1,29 @@
+from app.extensions import db
+from app.utils.query_plans import check_plans, hot_queries
+
+
+def test_hot_queries_use_indexes(app):
+    with app.app_context():
+        results = check_plans()
+        assert len(results) == len(hot_queries())
+        scans = {name: lines for name, _, lines in results if lines}
+        assert scans == {}
+
+
+def test_dropped_index_is_reported(app):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP INDEX ix_cart_items_user_product')
+        scans = {name: lines for name, _, lines in check_plans() if lines}
+        assert list(scans) == ['cart by user']
+        assert scans['cart by user'][0].startswith('SCAN cart_items')
+
+
+def test_listing_sort_without_an_index_is_reported(app):
+    # The listings are checked as paginate builds them, so a sort the index can't serve shows up
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP INDEX ix_orders_created_at')
+        scans = {name: lines for name, _, lines in check_plans() if lines}
+        assert set(scans) == {'admin orders', 'admin orders, deep page'}
+        assert 'USE TEMP B-TREE FOR ORDER BY' in scans['admin orders']
@@ -0,0 +1,55 @@
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Order, OrderItem, Product, Review, User
+
+
+def seed(app):
+    with app.app_context():
+        admin = User(email='rate-admin@example.com', password_hash=generate_password_hash('pass'), name='A', is_admin=True)
+        buyer = User(email='rate-buyer@example.com', password_hash=generate_password_hash('pass'), name='B')
+        beans = Product(name='Beans', slug='beans', price=80, stock=10)
+        rice = Product(name='Rice', slug='rice', price=90, stock=10)
+        db.session.add_all([admin, buyer, beans, rice])
+        db.session.flush()
+        o = Order(user_id=buyer.id, status='delivered', total_amount=80)
+        db.session.add(o)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=o.id, product_id=beans.id, product_name='Beans', quantity=1, unit_price=80))
+        db.session.add(Review(rating=2, user_id=admin.id, product_id=rice.id, is_approved=True))
+        db.session.commit()
+        from app.utils.ratings import rebuild_ratings
+        rebuild_ratings()
+        return beans.id, rice.id
+
+
+def rating(app, pid):
+    with app.app_context():
+        p = db.session.get(Product, pid)
+        return (float(p.rating_avg) if p.rating_avg is not None else None, p.rating_count)
+
+
+def login(client, email):
+    client.get('/auth/logout')
+    client.post('/auth/login', data={'email': email, 'password': 'pass'}, follow_redirects=True)
+
+
+def test_review_lifecycle_maintains_aggregates(client, app):
+    beans_id, rice_id = seed(app)
+    assert rating(app, rice_id) == (2.0, 1)
+    login(client, 'rate-buyer@example.com')
+    client.post('/product/beans/review', data={'rating': 5, 'comment': 'Great'})
+    assert rating(app, beans_id) == (None, 0)   # pending moderation
+
+    login(client, 'rate-admin@example.com')
+    with app.app_context():
+        review_id = Review.query.filter_by(product_id=beans_id).one().id
+    client.post(f'/admin/reviews/{review_id}/approve')
+    assert rating(app, beans_id) == (5.0, 1)
+
+    html = client.get('/shop?sort=rating').get_data(as_text=True)
+    assert html.index('Beans') < html.index('Rice')
+    html = client.get('/shop?rating=4').get_data(as_text=True)
+    assert 'Beans' in html and 'Rice' not in html
+
+    client.post(f'/admin/reviews/{review_id}/delete')
+    assert rating(app, beans_id) == (None, 0)
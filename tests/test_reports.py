@@ -0,0 +1,52 @@
+import csv
+import gzip
+import io
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import DeliveryZone, Order, OrderItem, Payment, Product, User
+
+
+def seed(app):
+    with app.app_context():
+        admin = User(email='report-admin@example.com', password_hash=generate_password_hash('pass'), name='A', is_admin=True)
+        buyer = User(email='buyer@example.com', password_hash='x', name='B')
+        zone = DeliveryZone(name='Ruiru', fee=100)
+        p = Product(name='Maize', slug='maize', price=60, stock=50)
+        db.session.add_all([admin, buyer, zone, p])
+        db.session.flush()
+        for day, status in ((3, 'paid'), (10, 'pending'), (20, 'paid')):
+            o = Order(user_id=buyer.id, status=status, total_amount=120, delivery_zone_id=zone.id, created_at=datetime(2026, 1, day))
+            db.session.add(o)
+            db.session.flush()
+            db.session.add(OrderItem(order_id=o.id, product_id=p.id, product_name='Maize', quantity=2, unit_price=60))
+            db.session.add(Payment(order_id=o.id, method='mpesa', reference=f'REF{day}', amount=120, status=status, created_at=datetime(2026, 1, day)))
+        db.session.commit()
+        return zone.id
+
+
+def rows(body):
+    return list(csv.DictReader(io.StringIO(body)))
+
+
+def test_streamed_reports_with_filters_and_gzip(client, app):
+    zone_id = seed(app)
+    client.post('/auth/login', data={'email': 'report-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    resp = client.get(f'/admin/reports/orders.csv?from=2026-01-01&to=2026-01-10&zone={zone_id}')
+    assert resp.is_streamed
+    orders = rows(resp.get_data(as_text=True))
+    assert [o['Zone'] for o in orders] == ['Ruiru', 'Ruiru']
+    assert orders[0]['User'] == 'buyer@example.com'
+
+    paid = rows(client.get('/admin/reports/payments.csv?status=paid').get_data(as_text=True))
+    assert sorted(p['Reference'] for p in paid) == ['REF20', 'REF3']
+
+    items = rows(client.get('/admin/reports/order-items.csv?status=pending').get_data(as_text=True))
+    assert len(items) == 1 and items[0]['LineTotal'] == '120.00'
+
+    gz = client.get('/admin/reports/orders.csv?gzip=1')
+    assert gz.headers['Content-Disposition'].endswith('orders.csv.gz')
+    assert len(rows(gzip.decompress(gz.get_data()).decode())) == 3
+    enc = client.get('/admin/reports/orders.csv', headers={'Accept-Encoding': 'gzip'})
+    assert enc.headers['Content-Encoding'] == 'gzip'
+    assert len(rows(gzip.decompress(enc.get_data()).decode())) == 3
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import CartItem, Order, Payment, Product, StockReservation, User
+from app.utils import reservations
+from app.utils.stock import decrement_stock
+
+
+def seed(app, stock=5):
+    with app.app_context():
+        u = User(email='hold@example.com', password_hash=generate_password_hash('pass'), name='H')
+        p = Product(name='Flash Deal', slug='flash-deal', price=10, stock=stock)
+        db.session.add_all([u, p])
+        db.session.commit()
+        return u.id, p.id
+
+
+def checkout(client, app, uid, pid, qty, method='mpesa'):
+    with app.app_context():
+        db.session.add(CartItem(user_id=uid, product_id=pid, quantity=qty))
+        db.session.commit()
+    client.post('/orders/checkout', data={'payment_method': method, 'fulfillment': 'pickup'})
+    with app.app_context():
+        return Order.query.order_by(Order.id.desc()).first().id
+
+
+def stock_of(app, pid):
+    with app.app_context():
+        return db.session.get(Product, pid).stock
+
+
+def test_prepaid_checkout_holds_and_sweep_releases_expired(client, app):
+    uid, pid = seed(app)
+    client.post('/auth/login', data={'email': 'hold@example.com', 'password': 'pass'}, follow_redirects=True)
+    oid = checkout(client, app, uid, pid, 2)
+    assert stock_of(app, pid) == 3
+    with app.app_context():
+        r = StockReservation.query.filter_by(order_id=oid).one()
+        assert (r.product_id, r.quantity, r.status) == (pid, 2, 'held')
+        assert reservations.held_by_product([pid]) == {pid: 2}
+        # Not expired yet: nothing to do
+        assert reservations.release_expired() == 0
+        assert reservations.release_expired(now=datetime.utcnow() + timedelta(hours=1)) == 1
+        assert StockReservation.query.filter_by(order_id=oid).one().status == 'released'
+        # A second sweep cannot restock twice
+        assert reservations.release_expired(now=datetime.utcnow() + timedelta(hours=1)) == 0
+    assert stock_of(app, pid) == 5
+
+    # COD orders are not held
+    checkout(client, app, uid, pid, 1, method='cod')
+    with app.app_context():
+        assert StockReservation.query.count() == 1
+    assert stock_of(app, pid) == 4
+
+
+def test_commit_keeps_units_and_late_payment_retakes_them(app):
+    uid, pid = seed(app)
+    with app.app_context():
+        paid, late = Order(user_id=uid), Order(user_id=uid)
+        db.session.add_all([paid, late])
+        db.session.flush()
+        for o in (paid, late):
+            decrement_stock([(pid, 2)])
+            reservations.hold_order(o, [(pid, 2)])
+        db.session.commit()
+        assert reservations.commit_order(paid.id)
+        db.session.commit()
+        assert reservations.release_expired(now=datetime.utcnow() + timedelta(hours=1)) == 1
+        assert db.session.get(Product, pid).stock == 3
+        # Payment confirmed after the sweep: the units are taken again
+        assert reservations.commit_order(late.id)
+        db.session.commit()
+        assert db.session.get(Product, pid).stock == 1
+        assert reservations.held_by_product([pid]) == {}
+
+
+def test_failed_mpesa_callback_and_cancel_release(client, app):
+    uid, pid = seed(app)
+    client.post('/auth/login', data={'email': 'hold@example.com', 'password': 'pass'}, follow_redirects=True)
+    oid = checkout(client, app, uid, pid, 2)
+    with app.app_context():
+        payment = Payment.query.filter_by(order_id=oid).first()
+        if payment is None:
+            payment = Payment(order_id=oid, method='mpesa', amount=20, status='pending')
+            db.session.add(payment)
+        payment.reference = 'ws_CO_fail'
+        payment.status = 'pending'
+        db.session.commit()
+    client.post('/payments/mpesa/callback', json={'Body': {'stkCallback': {'CheckoutRequestID': 'ws_CO_fail', 'ResultCode': 1032}}})
+    assert stock_of(app, pid) == 5
+
+    oid = checkout(client, app, uid, pid, 3)
+    assert stock_of(app, pid) == 2
+    with app.app_context():
+        # Cancellation is allowed for pending orders within the window
+        db.session.get(Order, oid).status = 'pending'
+        db.session.commit()
+    client.get(f'/orders/{oid}/cancel')
+    assert stock_of(app, pid) == 5
+    with app.app_context():
+        assert StockReservation.query.filter_by(order_id=oid).one().status == 'released'
+
+
+def test_payment_after_cancellation_leaves_stock_released(app):
+    from app.models import OrderStatusLog
+    from app.utils import reconciliation
+    uid, pid = seed(app)
+    with app.app_context():
+        o = Order(user_id=uid, status='pending')
+        db.session.add(o)
+        db.session.flush()
+        decrement_stock([(pid, 2)])
+        reservations.hold_order(o, [(pid, 2)])
+        payment = Payment(order_id=o.id, method='mpesa', amount=20, status='pending', reference='ws_CO_late')
+        db.session.add(payment)
+        db.session.commit()
+        o.status = 'cancelled'
+        reservations.release_order(o.id)
+        db.session.commit()
+        assert reconciliation.apply_stk_result(payment.id, o.id, 0, 'QLATE1') == 'paid'
+        db.session.commit()
+        assert db.session.get(Product, pid).stock == 5
+        assert db.session.get(Order, o.id).status == 'cancelled'
+        assert StockReservation.query.filter_by(order_id=o.id).one().status == 'released'
+        assert 'refund due' in OrderStatusLog.query.filter_by(order_id=o.id).one().notes
+
+
+def test_failed_stk_push_releases_the_hold(app, monkeypatch):
+    from app.utils import mpesa
+    uid, pid = seed(app)
+
+    def unreachable(*args, **kwargs):
+        raise ConnectionError('daraja down')
+
+    monkeypatch.setattr(mpesa, 'stk_push', unreachable)
+    with app.app_context():
+        o = Order(user_id=uid, status='placed')
+        db.session.add(o)
+        db.session.flush()
+        decrement_stock([(pid, 3)])
+        reservations.hold_order(o, [(pid, 3)])
+        payment = Payment(order_id=o.id, method='mpesa', amount=30, status='pending')
+        db.session.add(payment)
+        db.session.commit()
+        assert mpesa.run_stk_push(payment.id, '254712345678')[0] is False
+        assert db.session.get(Payment, payment.id).status == 'failed'
+        assert StockReservation.query.filter_by(order_id=o.id).one().status == 'released'
+        assert db.session.get(Product, pid).stock == 5
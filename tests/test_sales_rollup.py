@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Category, DailySalesRollup, DeliveryZone, Order, OrderItem, Product, User
+from app.utils import sales_rollup
+
+
+def seed(app):
+    with app.app_context():
+        admin = User(email='rollup-admin@example.com', password_hash=generate_password_hash('pass'), name='A', is_admin=True)
+        buyer = User(email='rollup-buyer@example.com', password_hash='x', name='B')
+        zone = DeliveryZone(name='Kahawa', fee=50)
+        fruit = Category(name='Fruit', slug='fruit')
+        db.session.add_all([admin, buyer, zone, fruit])
+        db.session.flush()
+        mango = Product(name='Mango', slug='mango', price=20, stock=100, category_id=fruit.id)
+        salt = Product(name='Salt', slug='salt', price=10, stock=100)
+        db.session.add_all([mango, salt])
+        db.session.flush()
+        for day, status, items in (
+            (datetime(2026, 3, 1, 8), 'paid', [(mango, 3)]),
+            (datetime(2026, 3, 1, 17), 'pending', [(mango, 1), (salt, 2)]),
+            (datetime(2026, 3, 2, 9), 'cancelled', [(salt, 5)]),
+        ):
+            total = sum(float(p.price) * q for p, q in items)
+            o = Order(user_id=buyer.id, status=status, total_amount=total, delivery_zone_id=zone.id, created_at=day)
+            db.session.add(o)
+            db.session.flush()
+            for p, q in items:
+                db.session.add(OrderItem(order_id=o.id, product_id=p.id, product_name=p.name, quantity=q, unit_price=p.price))
+        db.session.commit()
+
+
+def test_rebuild_aggregates_per_day_zone_category_product(app):
+    seed(app)
+    with app.app_context():
+        sales_rollup.rebuild()
+        assert sales_rollup.totals() == (2, 100)
+        assert [(d, float(s), int(c)) for d, s, c in sales_rollup.daily_sales()] == [(date(2026, 3, 1), 100.0, 2)]
+        assert dict((n, float(t)) for n, t in sales_rollup.sales_by_category()) == {'Fruit': 80.0, None: 20.0}
+        assert [(n, int(u)) for n, u in sales_rollup.top_products()] == [('Mango', 4), ('Salt', 2)]
+        assert [(n, float(t)) for n, t in sales_rollup.revenue_by_zone()] == [('Kahawa', 100.0)]
+        # Rebuilding is idempotent
+        before = DailySalesRollup.query.count()
+        sales_rollup.rebuild()
+        assert DailySalesRollup.query.count() == before
+
+
+def test_status_transition_refreshes_rollup_and_dashboard_reads_it(client, app):
+    seed(app)
+    with app.app_context():
+        sales_rollup.rebuild()
+        cancelled_id = Order.query.filter_by(status='cancelled').one().id
+    client.post('/auth/login', data={'email': 'rollup-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    client.post(f'/admin/orders/{cancelled_id}/status', data={'status': 'pending'})
+    with app.app_context():
+        assert sales_rollup.totals() == (3, 150)
+        assert [(n, int(u)) for n, u in sales_rollup.top_products()] == [('Salt', 7), ('Mango', 4)]
+    assert client.get('/admin/').status_code == 200
+    assert b'2026-03-02' in client.get('/admin/analytics').data
+    resp = client.get('/admin/reports/advanced')
+    assert resp.status_code == 200 and b'Salt' in resp.data
+
+
+def rollup_rows(app):
+    with app.app_context():
+        return sorted(
+            (r.day, r.zone_id, r.category_id, r.product_id, r.order_count, float(r.order_total), r.units, float(r.revenue))
+            for r in DailySalesRollup.query.all()
+            if r.order_count or r.units
+        )
+
+
+def test_record_order_applies_deltas_that_match_a_rebuild(app):
+    seed(app)
+    with app.app_context():
+        for o in Order.query.filter(Order.status != 'cancelled'):
+            sales_rollup.record_order(o)
+        db.session.commit()
+    incremental = rollup_rows(app)
+    with app.app_context():
+        sales_rollup.rebuild()
+    assert incremental == rollup_rows(app)
+
+    with app.app_context():
+        paid = Order.query.filter_by(status='paid').one()
+        sales_rollup.record_order(paid, -1)
+        db.session.commit()
+        assert sales_rollup.totals() == (1, 40)
+        assert [(n, int(u)) for n, u in sales_rollup.top_products()] == [('Salt', 2), ('Mango', 1)]
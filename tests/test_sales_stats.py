@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import CartItem, Order, OrderItem, Product, ProductSalesStats, User
+from app.utils import sales_rollup, sales_stats
+
+
+def seed(app):
+    with app.app_context():
+        u = User(email='stats-shopper@example.com', password_hash=generate_password_hash('pass'), name='S')
+        kale = Product(name='Kale', slug='kale', price=30, stock=100)
+        eggs = Product(name='Eggs', slug='eggs', price=15, stock=100)
+        db.session.add_all([u, kale, eggs])
+        db.session.commit()
+        return u.id, kale.id, eggs.id
+
+
+def stats(app, pid):
+    with app.app_context():
+        s = db.session.get(ProductSalesStats, pid)
+        return (s.units_total, s.units_7d, s.units_30d) if s else None
+
+
+def test_checkout_and_cancel_update_counters_incrementally(client, app):
+    uid, kale_id, eggs_id = seed(app)
+    client.post('/auth/login', data={'email': 'stats-shopper@example.com', 'password': 'pass'}, follow_redirects=True)
+    for qty in (2, 3):
+        with app.app_context():
+            db.session.add(CartItem(user_id=uid, product_id=kale_id, quantity=qty))
+            db.session.add(CartItem(user_id=uid, product_id=eggs_id, quantity=1))
+            db.session.commit()
+        client.post('/orders/checkout', data={'payment_method': 'cod', 'fulfillment': 'pickup'})
+    assert stats(app, kale_id) == (5, 5, 5)
+    assert stats(app, eggs_id) == (2, 2, 2)
+    with app.app_context():
+        assert sales_stats.top_product_ids(2) == [kale_id, eggs_id]
+        last = Order.query.order_by(Order.id.desc()).first().id
+    client.get(f'/orders/{last}/cancel')
+    assert stats(app, kale_id) == (2, 2, 2)
+    assert stats(app, eggs_id) == (1, 1, 1)
+    home = client.get('/').get_data(as_text=True)
+    assert 'Kale' in home
+
+
+def test_windows_age_out_and_rebuild_matches(app):
+    uid, kale_id, eggs_id = seed(app)
+    now = datetime.utcnow()
+    with app.app_context():
+        for days_ago, pid, qty in ((1, kale_id, 1), (10, eggs_id, 4), (40, kale_id, 6)):
+            o = Order(user_id=uid, status='delivered', total_amount=0, created_at=now - timedelta(days=days_ago))
+            db.session.add(o)
+            db.session.flush()
+            db.session.add(OrderItem(order_id=o.id, product_id=pid, product_name='x', quantity=qty, unit_price=10))
+        db.session.commit()
+        sales_rollup.rebuild()
+        sales_stats.rebuild(now)
+    assert stats(app, kale_id) == (7, 1, 1)
+    assert stats(app, eggs_id) == (4, 0, 4)
+    with app.app_context():
+        assert sales_stats.top_product_ids(1, window='30d') == [eggs_id]
+        assert sales_stats.top_product_ids(1, window='7d') == [kale_id]
+        assert sales_stats.top_product_ids(1) == [kale_id]
+        sales_stats.refresh_windows(now + timedelta(days=20))
+    assert stats(app, eggs_id) == (4, 0, 0)
@@ -0,0 +1,58 @@
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Product, User
+from app.utils import search
+
+
+def seed(app):
+    with app.app_context():
+        db.session.add_all([
+            Product(name='Fresh Tomatoes', slug='tomatoes', price=50, stock=5, description='Ripe red tomatoes'),
+            Product(name='Tomato Sauce', slug='tomato-sauce', price=120, stock=5, description='Bottled'),
+            Product(name='Bananas', slug='bananas', price=30, stock=5, description='Sweet and ripe'),
+            Product(name='Strawberries', slug='strawberries', price=200, stock=5, description='Punnet'),
+            Product(name='Ripe Avocados', slug='avocados', price=40, stock=5, description='Hass'),
+        ])
+        db.session.commit()
+        return {p.slug: p.id for p in Product.query.all()}
+
+
+def test_stemming_and_typo_tolerance(app):
+    ids = seed(app)
+    for backend in ('sqlite', 'memory'):
+        app.config['SEARCH_BACKEND'] = backend
+        with app.app_context():
+            assert set(search.search_product_ids('tomatos')) == {ids['tomatoes'], ids['tomato-sauce']}, backend
+            assert search.search_product_ids('bananna') == [ids['bananas']], backend
+            assert search.search_product_ids('strawberry') == [ids['strawberries']], backend
+            # name matches outrank description-only matches
+            assert search.search_product_ids('ripe')[0] == ids['avocados'], backend
+            assert search.search_product_ids('tom', prefix_last=True), backend
+
+
+def test_admin_edit_updates_index(client, app):
+    ids = seed(app)
+    with app.app_context():
+        db.session.add(User(email='search-admin@example.com', password_hash=generate_password_hash('pass'), name='Admin', is_admin=True))
+        db.session.commit()
+        assert search.search_product_ids('mango') == []
+    client.post('/auth/login', data={'email': 'search-admin@example.com', 'password': 'pass'}, follow_redirects=True)
+    client.post(f"/admin/products/{ids['bananas']}/edit", data={'name': 'Mango Bananas', 'price': '30', 'stock': '5'})
+    with app.app_context():
+        assert search.search_product_ids('mango') == [ids['bananas']]
+    html = client.get('/search?q=mangoes').get_data(as_text=True)
+    assert 'Mango Bananas' in html
+    assert 'Tomato Sauce' not in html
+
+
+def test_database_backends_correct_against_names_only(app, monkeypatch):
+    ids = seed(app)
+    app.config['SEARCH_BACKEND'] = 'sqlite'
+    builds = []
+    monkeypatch.setattr(search._InvertedIndex, 'build', lambda self, rows: builds.append(rows))
+    with app.app_context():
+        assert search.search_product_ids('bananna') == [ids['bananas']]
+        assert search.normalize_query('avacados ripe') == ['avocado', 'ripe']
+        # "bottled" only appears in a description, so it is not a correction target
+        assert search.normalize_query('botled', prefix_last=False) == ['botled']
+    assert builds == []
@@ -0,0 +1,63 @@
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import CartItem, Category, Product, User, WishlistItem
+
+
+def create_user(app):
+    with app.app_context():
+        u = User(email='shared-user@example.com', password_hash=generate_password_hash('pass'), name='Shopper')
+        db.session.add(u)
+        db.session.commit()
+        return u.id
+
+
+def test_shared_cache_is_opt_in(client, app):
+    assert app.config['SHARED_PAGE_CACHE'] is False
+    with app.app_context():
+        db.session.add(Category(name='Roots', slug='roots'))
+        db.session.commit()
+    assert 'data-shared-page="1"' not in client.get('/category/roots').get_data(as_text=True)
+
+
+def test_logged_in_user_hits_anonymous_cache_entry(client, app):
+    app.config['SHARED_PAGE_CACHE'] = True
+    with app.app_context():
+        c = Category(name='Greens', slug='greens')
+        db.session.add(c)
+        db.session.flush()
+        db.session.add(Product(name='Kale', slug='kale', price=5.0, stock=3, category_id=c.id))
+        db.session.commit()
+    html = client.get('/category/greens').get_data(as_text=True)
+    assert 'data-shared-page="1"' in html
+    assert 'data-auth-only hidden' in html
+    # Rename quietly: a logged-in visitor must get the same cached body
+    with app.app_context():
+        p = Product.query.filter_by(slug='kale').first()
+        p.name = 'Kale Renamed'
+        db.session.commit()
+    create_user(app)
+    client.post('/auth/login', data={'email': 'shared-user@example.com', 'password': 'pass'}, follow_redirects=True)
+    html = client.get('/category/greens').get_data(as_text=True)
+    assert 'Kale Renamed' not in html
+    assert 'Logout' not in html
+
+
+def test_session_endpoint_returns_user_fragments(client, app):
+    uid = create_user(app)
+    with app.app_context():
+        p = Product(name='Beans', slug='beans', price=7.0, stock=10)
+        db.session.add(p)
+        db.session.flush()
+        db.session.add(CartItem(user_id=uid, product_id=p.id, quantity=3))
+        db.session.add(WishlistItem(user_id=uid, product_id=p.id))
+        db.session.commit()
+        pid = p.id
+    anon = client.get('/api/session')
+    assert anon.headers['Cache-Control'] == 'private, no-store'
+    assert anon.get_json()['authenticated'] is False
+    client.post('/auth/login', data={'email': 'shared-user@example.com', 'password': 'pass'}, follow_redirects=True)
+    data = client.get('/api/session').get_json()
+    assert data['authenticated'] is True
+    assert data['cart_count'] == 3
+    assert data['wishlist'] == [pid]
+    assert 'Logout' in data['nav_html']
@@ -0,0 +1,63 @@
+from app.extensions import db
+from app.models import Order, OrderItem, Product, User
+from app.utils import suggest
+from app.utils.search import index_product
+
+
+def test_suggestions_ranked_by_units_sold(client, app):
+    with app.app_context():
+        u = User(email='suggest@example.com', password_hash='x', name='S')
+        a = Product(name='Tomato Paste', slug='tomato-paste', price=80, stock=5)
+        b = Product(name='Fresh Tomatoes', slug='fresh-tomatoes', price=50, stock=5)
+        c = Product(name='Sukuma', slug='sukuma-wiki', price=20, stock=5)
+        db.session.add_all([u, a, b, c])
+        db.session.flush()
+        o = Order(user_id=u.id, total_amount=500)
+        db.session.add(o)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=o.id, product_id=b.id, product_name=b.name, quantity=7, unit_price=50))
+        db.session.commit()
+        b_id = b.id
+    data = client.get('/api/suggest?q=tom').get_json()
+    assert [i['name'] for i in data['items']] == ['Fresh Tomatoes', 'Tomato Paste']
+    # slug words are indexed too
+    assert client.get('/api/search/suggest?q=wik').get_json() == [{'name': 'Sukuma', 'slug': 'sukuma-wiki'}]
+    assert client.get('/api/suggest?q=fresh tom').get_json()['items'][0]['id'] == b_id
+
+
+def test_incremental_update_without_rebuild(app):
+    with app.app_context():
+        p = Product(name='Avocado', slug='avocado', price=40, stock=5)
+        db.session.add(p)
+        db.session.commit()
+        assert [n for _i, n, _s in suggest.suggest('avo')] == ['Avocado']
+        built_at = suggest.get_index().built_at
+        p.name, p.slug = 'Mango', 'mango'
+        db.session.commit()
+        index_product(p)
+        assert suggest.suggest('avo') == []
+        assert [n for _i, n, _s in suggest.suggest('man')] == ['Mango']
+        assert suggest.get_index().built_at == built_at
+
+
+def test_other_workers_writes_replayed_from_change_log(app):
+    from app.utils import cache_tags
+    from app.utils.search import SEARCH_INDEX
+    app.config['SUGGEST_CHECK_SECONDS'] = 60
+    with app.app_context():
+        p = Product(name='Avocado', slug='avocado', price=40, stock=5)
+        db.session.add(p)
+        db.session.commit()
+        assert [n for _i, n, _s in suggest.suggest('avo')] == ['Avocado']
+        built_at = suggest.get_index().built_at
+        # Another worker renames it and adds a product: rows change and the tag is bumped
+        p.name, p.slug = 'Mango', 'mango'
+        db.session.add(Product(name='Avocado Oil', slug='avocado-oil', price=90, stock=5))
+        db.session.commit()
+        cache_tags.invalidate(SEARCH_INDEX)
+        # Within the check interval the index is not consulted against the cache
+        assert [n for _i, n, _s in suggest.suggest('avo')] == ['Avocado']
+        suggest.get_index().checked_at = 0
+        assert [n for _i, n, _s in suggest.suggest('avo')] == ['Avocado Oil']
+        assert [n for _i, n, _s in suggest.suggest('man')] == ['Mango']
+        assert suggest.get_index().built_at == built_at